@@ -5,7 +5,7 @@ import time
 from time import sleep
 from scipy import linspace
 from datetime import date
-import visa
+from instruments_py27 import visa_registry
 
 import numpy as np
 from qm.QuantumMachinesManager import QuantumMachinesManager
@@ -147,11 +147,9 @@ def findMinQ(I0, Q0, currRange, numPoints, qm, SA, plotRes=False):
 if True:
 
     # setup
-    rm = visa.ResourceManager()
-    res_list = rm.list_resources()
-    MG = rm.open_resource("GPIB0::7::INSTR")
+    MG = visa_registry.open_resource("GPIB0::7::INSTR")
     setupMG(MG, LOFreq, LOAmp)
-    SA = rm.open_resource("GPIB0::24::INSTR")
+    SA = visa_registry.open_resource("GPIB0::24::INSTR")
     qm = open_qm()
 
     getWithIQ([0.0, 0.0], qm, SA)  # send a sequence in order to have a trigger before setting SA marker to max
@@ -1,16 +1,17 @@
-"""Use shrinking 1d I,Q scans to find minimum in I,Q plane
+"""Use shrinking 1d I,Q scans (or a quadratic model) to find minimum in I,Q plane
 Written by Naftali 1/18 , uses functions from Yoni's IQMixerMap"""
 
 import time
-from time import sleep
-from scipy import linspace
-from qm.QuantumMachinesManager import QuantumMachinesManager
-from qm.qua import *
+import numpy as np
+from numpy import linspace
+from calibration.quadratic_fit import dbm_to_mw, grid_points, fit_paraboloid, paraboloid_minimum
+from instruments_py27 import tracing
 
 
 class IQ_min_finder:
 
     def open_qm(self, I_port, Q_port):
+        from qm.QuantumMachinesManager import QuantumMachinesManager
         qmManager = QuantumMachinesManager(host="192.168.137.15")
 
         return qmManager.open_qm({
@@ -61,15 +62,23 @@ class IQ_min_finder:
             }
         })
 
-    def __init__(self, SA, verbose=False, I_port=1, Q_port=2):
+    def __init__(self, SA, verbose=False, I_port=1, Q_port=2, qm=None):
+        """If qm is given (e.g. a simulated one) it is used as is, and it should already run a program
+        playing elements "RR1" and "RR2". Otherwise a qm is opened and such a program is started"""
 
         self.I_FIG_NUM = 1
         self.Q_FIG_NUM = 2
 
         self.verbose = verbose
         self.SA = SA
+        self.num_reads = 0  # number of SA reads
+        if qm is not None:
+            self.qm = tracing.trace_qm(qm)
+            return
+
         # setup qm
-        self.qm = self.open_qm(I_port, Q_port)
+        from qm.qua import program, infinite_loop_, play
+        self.qm = tracing.trace_qm(self.open_qm(I_port, Q_port))
 
         with program() as prog:
             with infinite_loop_():
@@ -84,9 +93,10 @@ class IQ_min_finder:
             print("Setting I=%f, Q=%f" % (IQ[0], IQ[1]))
         self.qm.set_dc_offset_by_qe("RR1", "port", float(IQ[0]))
         self.qm.set_dc_offset_by_qe("RR2", "port", float(IQ[1]))
-        sleep(0.1)
+        self.SA.wait_for_sweep(0.1)
 
         t = self.SA.get_marker()
+        self.num_reads += 1
 
         if self.verbose:
             print("Transmitted power is %f dBm" % t)
@@ -144,6 +154,7 @@ class IQ_min_finder:
         currMin = 100.0  # minimal transmission, start with a high value
         currRange = range  # range to scan around the minima
         numPoints = 16  # number of points
+        self.num_reads = 0
         start = time.time()
         while currMin > minimum and currRange >= 16. / 2 ** 16:
             minTI, I0 = self.findMinI(I0, Q0, currRange, numPoints, plotFigs)  # scan I
@@ -152,7 +163,11 @@ class IQ_min_finder:
             currRange = currRange / 2
         end = time.time()
 
-        print("Elapsed time is %f seconds" % (end - start))
+        print("Elapsed time is %f seconds, %d SA reads" % (end - start, self.num_reads))
+        if self.SA.synchronized:
+            print(self.SA.sync_report())
+        if tracing.tracer.enabled:
+            print(tracing.tracer.summary())
 
         if plotFigs:
             self.pyplot.figure(self.I_FIG_NUM)
@@ -168,3 +183,43 @@ class IQ_min_finder:
             self.pyplot.show()
 
         return (I0, Q0, currMin)
+
+    def find_IQ_min_quadratic(self, I0, Q0, range, lo_freq, minimum=-90.0, num_refinements=2, shrink_factor=4.0):
+        """Fit a paraboloid to the transmitted power (in linear units) measured on a 3x3 grid of side range around
+        (I0, Q0), and move to its minimum. Then refine num_refinements times with a grid shrunk by shrink_factor
+        around the fitted minimum, stopping early when the power is below minimum [dBm].
+        returns (I0, Q0, power at (I0, Q0) [dBm])"""
+
+        print(
+            "Starting calibration. Make sure spectrum analyzer averaging is off and sweep type rules are \"best speed\"!")
+
+        self.getWithIQ([0.0, 0.0])  # send a sequence in order to have a trigger before setting SA marker to max
+        self.SA.setup_spectrum_analyzer(center_freq=lo_freq, span=1.0, BW=100.0, points=1)
+        self.SA.set_marker_max()
+        self.num_reads = 0
+        currRange = range
+        start = time.time()
+        for round_num in np.arange(num_refinements + 1):
+            I_vec, Q_vec = grid_points(I0, Q0, currRange)
+            power = np.array([self.getWithIQ([I, Q]) for I, Q in zip(I_vec, Q_vec)])
+            fit_min = paraboloid_minimum(fit_paraboloid(I_vec, Q_vec, dbm_to_mw(power)))
+            if fit_min is None:
+                # no minimum in the fit (e.g. only noise) - continue from the best measured point
+                I0, Q0 = I_vec[power.argmin()], Q_vec[power.argmin()]
+            else:
+                I0 = float(np.clip(fit_min[0], -0.5, 0.5 - 2 ** -16))
+                Q0 = float(np.clip(fit_min[1], -0.5, 0.5 - 2 ** -16))
+            currMin = self.getWithIQ([I0, Q0])
+            print("Round %d: Range = %f, I0 = %f, Q0 = %f, currMin = %f " % (round_num, currRange, I0, Q0, currMin))
+            if currMin <= minimum:
+                break
+            currRange = currRange / shrink_factor
+        end = time.time()
+
+        print("Elapsed time is %f seconds, %d SA reads" % (end - start, self.num_reads))
+        if self.SA.synchronized:
+            print(self.SA.sync_report())
+        if tracing.tracer.enabled:
+            print(tracing.tracer.summary())
+
+        return (I0, Q0, currMin)
@@ -171,10 +171,11 @@ class ConfigGenerator:
             # ]
             print("config_generator.add_mixed_control_pulse: Warning: trigger_length and trigger_delay are not used!")
 
-    def add_single_control_pulse(self, pulse_name, length, waveform):
+    def add_single_control_pulse(self, pulse_name, length, waveform, digital_marker=None):
         """Add a control pulse for a single output element
         length is in ns.
         waveform is the waveform name
+        digital_marker is the name of a digital waveform played with the pulse (see add_digital_waveform) or None
         """
 
         if not "pulses" in self.qm_config:
@@ -184,6 +185,34 @@ class ConfigGenerator:
             raise Exception("ConfigGenerator.add_single_control_pulse: pulse %s already exists" % pulse_name)
         self.qm_config["pulses"][pulse_name] = {"operation": "control", "length": length,
                                                 "waveforms": {"single": waveform}}
+        if digital_marker is not None:
+            self.qm_config["pulses"][pulse_name]["digital_marker"] = digital_marker
+
+    def add_digital_waveform(self, waveform_name, samples):
+        """Add a digital waveform from samples - a list of (value, duration [ns]), duration 0 means until the end
+        of the pulse. e.g. [(1, 100), (0, 0)] is a 100 ns trigger at the start of the pulse.
+        """
+
+        if not "digital_waveforms" in self.qm_config:
+            self.qm_config["digital_waveforms"] = {}
+
+        if waveform_name in self.qm_config["digital_waveforms"]:
+            raise Exception("ConfigGenerator.add_digital_waveform: waveform %s already exists" % waveform_name)
+        self.qm_config["digital_waveforms"][waveform_name] = {"samples": samples}
+
+    def add_digital_input(self, element_name, port, delay=0, buffer=0, input_name="marker"):
+        """Route the digital markers of the pulses of an element to digital output port (of con1).
+        delay and buffer are in ns.
+        """
+
+        element = self.qm_config["elements"][element_name]
+        if not "digitalInputs" in element:
+            element["digitalInputs"] = {}
+
+        if input_name in element["digitalInputs"]:
+            raise Exception("ConfigGenerator.add_digital_input: digital input %s for element %s already exists" % (
+                input_name, element_name))
+        element["digitalInputs"][input_name] = {"port": ("con1", port), "delay": delay, "buffer": buffer}
 
     def add_operation(self, element_name, operation_name, pulse_name):
         """Add an operation linked to a specific pulse to a given element
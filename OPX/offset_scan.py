@@ -0,0 +1,190 @@
+"""Scan the I,Q DC offsets of an IQ mixer inside a single QUA program.
+The mixer output is down-converted back into the OPX inputs (the loopback of two_SB_sample.py), and the LO leakage
+is measured by demodulating the inputs at zero IF. The whole scan runs in real time on the OPX - no SA reads and
+no Python round trips per point.
+Note: at zero IF the demodulated leakage adds to the DC offsets of the OPX inputs, so the input offsets of the
+ConfigGenerator (input_offsets) should be calibrated first (as in measure_IQ_noise.py)."""
+
+import numpy as np
+from qm.qua import *
+from OPX.qm_results import values
+from calibration.quadratic_fit import grid_points, fit_paraboloid, paraboloid_minimum
+
+OPERATION = "offset_scan_readout"
+MAX_OFFSET = 0.5 - 2 ** -16
+
+
+def add_offset_scan_element(cg, element_name, lo_freq, I_channel, Q_channel, output_channels, mixer_name,
+                            time_of_flight, integration_length=2000, smearing=0):
+    """Add a zero IF readout element with a zero amplitude measurement pulse and constant integration weights
+    to the ConfigGenerator cg.
+    output_channels is a dict {"out_I": channel, "out_Q": channel}, integration_length is in ns.
+    Prerequisites: A mixer "mixer_name"."""
+
+    cg.add_mixed_readout_element(element_name, lo_freq, lo_freq, I_channel, Q_channel, output_channels,
+                                 mixer_name, time_of_flight, smearing)
+    zero_waveform = "%s_zero" % element_name
+    cos_weight = "%s_cos" % element_name
+    cg.add_constant_waveform(zero_waveform, 0.0)
+    cg.add_integration_weight(cos_weight, [1.0] * (integration_length // 4), [0.0] * (integration_length // 4))
+    cg.add_mixed_measurement_pulse("%s_pulse" % element_name, integration_length, [zero_waveform, zero_waveform],
+                                   {"cos": cos_weight})
+    cg.add_operation(element_name, OPERATION, "%s_pulse" % element_name)
+
+
+def _measure_point(element, out_I, out_Q, acc_I, acc_Q, avg, num_averages):
+    """QUA: measure the demodulated inputs num_averages times and leave the sums in acc_I, acc_Q"""
+    assign(acc_I, 0.0)
+    assign(acc_Q, 0.0)
+    with for_(avg, 0, avg < num_averages, avg + 1):
+        measure(OPERATION, element, None, ("cos", "out_I", out_I), ("cos", "out_Q", out_Q))
+        assign(acc_I, acc_I + out_I)
+        assign(acc_Q, acc_Q + out_Q)
+
+
+def build_grid_scan_program(element, I_values, Q_values, settle_time=25, num_averages=1):
+    """A program which steps the offsets of element through the grid I_values x Q_values (Q is the inner loop),
+    waits settle_time (*4 ns) at each point and saves the demodulated inputs as "out_I", "out_Q"."""
+
+    with program() as prog:
+        I_vec = declare(fixed, value=[float(v) for v in I_values])
+        Q_vec = declare(fixed, value=[float(v) for v in Q_values])
+        i = declare(int)
+        j = declare(int)
+        avg = declare(int)
+        out_I = declare(fixed)
+        out_Q = declare(fixed)
+        acc_I = declare(fixed)
+        acc_Q = declare(fixed)
+
+        with for_(i, 0, i < len(I_values), i + 1):
+            set_dc_offset(element, "I", I_vec[i])
+            with for_(j, 0, j < len(Q_values), j + 1):
+                set_dc_offset(element, "Q", Q_vec[j])
+                wait(settle_time, element)
+                _measure_point(element, out_I, out_Q, acc_I, acc_Q, avg, num_averages)
+                save(acc_I, "out_I")
+                save(acc_Q, "out_Q")
+
+    return prog
+
+
+def build_adaptive_scan_program(element, I0, Q0, scan_range, num_points=16, num_rounds=12, settle_time=25,
+                                num_averages=1):
+    """A program running the shrinking 1d I,Q scans of IQ_min_finder.find_IQ_min in real time.
+    Each round scans num_points of I then of Q around the current minimum and halves the range.
+    The minimized quantity is |out_I|+|out_Q| (squares of the demodulated values underflow the fixed point format).
+    The minimum after each round is saved as "I0", "Q0", "metric"."""
+
+    with program() as prog:
+        I_min = declare(fixed, value=float(I0))
+        Q_min = declare(fixed, value=float(Q0))
+        currRange = declare(fixed, value=float(scan_range))
+        step = declare(fixed)
+        x = declare(fixed)
+        x_set = declare(fixed)  # x clipped to the DAC range
+        best = declare(fixed)
+        best_x = declare(fixed)
+        metric = declare(fixed)
+        r = declare(int)
+        k = declare(int)
+        avg = declare(int)
+        out_I = declare(fixed)
+        out_Q = declare(fixed)
+        acc_I = declare(fixed)
+        acc_Q = declare(fixed)
+
+        def scan_axis(scanned, other, scanned_input, other_input):
+            assign(step, currRange * (1.0 / (num_points - 1)))
+            assign(x, scanned - currRange * 0.5)
+            assign(best, 7.0)  # larger than any metric
+            assign(best_x, scanned)
+            set_dc_offset(element, other_input, other)
+            with for_(k, 0, k < num_points, k + 1):
+                assign(x_set, x)
+                with if_(x_set < -0.5):
+                    assign(x_set, -0.5)
+                with if_(x_set > MAX_OFFSET):
+                    assign(x_set, MAX_OFFSET)
+                set_dc_offset(element, scanned_input, x_set)
+                wait(settle_time, element)
+                _measure_point(element, out_I, out_Q, acc_I, acc_Q, avg, num_averages)
+                assign(metric, Math.abs(acc_I) + Math.abs(acc_Q))
+                with if_(metric < best):
+                    assign(best, metric)
+                    assign(best_x, x_set)
+                assign(x, x + step)
+            assign(scanned, best_x)
+
+        with for_(r, 0, r < num_rounds, r + 1):
+            scan_axis(I_min, Q_min, "I", "Q")
+            scan_axis(Q_min, I_min, "Q", "I")
+            assign(currRange, currRange * 0.5)
+            save(I_min, "I0")
+            save(Q_min, "Q0")
+            save(best, "metric")
+
+        set_dc_offset(element, "I", I_min)
+        set_dc_offset(element, "Q", Q_min)
+
+    return prog
+
+
+def _variable(results, name):
+    """Values of a saved variable as a numpy array"""
+    return values(getattr(results.variable_results, name))
+
+
+class HardwareOffsetScanner:
+    """Finds the LO leakage minimum using offset scans which run entirely on the OPX.
+    qm must be opened with a config prepared by add_offset_scan_element"""
+
+    def __init__(self, qm, element, settle_time=25, num_averages=1):
+        self.qm = qm
+        self.element = element
+        self.settle_time = settle_time
+        self.num_averages = num_averages
+        self.num_jobs = 0
+
+    def _run(self, prog):
+        job = self.qm.execute(prog, duration_limit=0, data_limit=0)
+        job.wait_for_all_results()
+        self.num_jobs += 1
+        return job.get_results()
+
+    def scan_grid(self, I_values, Q_values):
+        """Measure the leakage on the grid I_values x Q_values in one job.
+        returns the complex demodulated leakage, shape (len(I_values), len(Q_values))"""
+        results = self._run(build_grid_scan_program(self.element, I_values, Q_values, self.settle_time,
+                                                    self.num_averages))
+        leakage = _variable(results, "out_I") + 1j * _variable(results, "out_Q")
+        return leakage.reshape(len(I_values), len(Q_values))
+
+    def find_min_quadratic(self, I0, Q0, scan_range, points_per_axis=5, num_rounds=3, shrink_factor=4.0):
+        """Scan a grid, fit a paraboloid to |leakage|**2 and move to its minimum, num_rounds times with a grid
+        shrunk by shrink_factor each round. returns (I0, Q0, |leakage| at the minimum)"""
+        for _ in range(num_rounds):
+            I_vec, Q_vec = grid_points(I0, Q0, scan_range, points_per_axis)
+            I_values = I_vec[:points_per_axis]
+            Q_values = Q_vec[::points_per_axis]
+            power = np.abs(self.scan_grid(I_values, Q_values)) ** 2
+            # grid_points orders Q as the outer axis, scan_grid returns I as the outer axis
+            fit_min = paraboloid_minimum(fit_paraboloid(I_vec, Q_vec, power.T.flatten()))
+            if fit_min is None:
+                idx_I, idx_Q = np.unravel_index(power.argmin(), power.shape)
+                I0, Q0 = I_values[idx_I], Q_values[idx_Q]
+            else:
+                I0 = float(np.clip(fit_min[0], -0.5, MAX_OFFSET))
+                Q0 = float(np.clip(fit_min[1], -0.5, MAX_OFFSET))
+            scan_range = scan_range / shrink_factor
+        leakage = self.scan_grid([I0], [Q0])[0, 0]
+        self.qm.set_output_dc_offset_by_element(self.element, "I", I0)
+        self.qm.set_output_dc_offset_by_element(self.element, "Q", Q0)
+        return I0, Q0, np.abs(leakage)
+
+    def find_min_adaptive(self, I0, Q0, scan_range, num_points=16, num_rounds=12):
+        """Run the shrinking 1d scans in a single job.
+        returns (I0, Q0, metric) after each round as arrays"""
+        results = self._run(build_adaptive_scan_program(self.element, I0, Q0, scan_range, num_points, num_rounds,
+                                                        self.settle_time, self.num_averages))
+        return _variable(results, "I0"), _variable(results, "Q0"), _variable(results, "metric")
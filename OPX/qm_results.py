@@ -0,0 +1,105 @@
+"""Convert QM job results (raw ADC streams and saved variables) to numpy arrays.
+Results which already are numpy arrays (e.g. the fetched data of result handles, or any object exposing the numpy
+array interface) are used as they are: float64 pairs are viewed as a structured array without a copy.
+The results of job.get_results() are sequences of Python (timestamp, value) pairs, which have to be read one by one
+either way. Unpacking them with np.array(list(zip(*stream))[1]) builds transposed tuples of all the samples first;
+here the pairs are read straight into a float64 buffer, about twice as fast (see benchmarks/bench_qm_results.py)."""
+
+from itertools import chain
+from time import sleep
+import numpy as np
+
+RESULT_DTYPE = np.dtype([("timestamp", "<f8"), ("value", "<f8")])
+
+
+def to_array(stream):
+    """A raw ADC stream or saved variable as a structured array with fields "timestamp" and "value".
+    stream is a sequence of (timestamp, value) pairs, an (N, 2) numpy array or a structured numpy array (or an
+    object convertible to one without iterating it, i.e. with __array__ or __array_interface__).
+    float64 numpy inputs are returned as views (no copy); sequences of pairs are copied"""
+    if not isinstance(stream, np.ndarray) and (hasattr(stream, "__array__") or
+                                               hasattr(stream, "__array_interface__")):
+        stream = np.asarray(stream)
+    if isinstance(stream, np.ndarray):
+        if stream.dtype == RESULT_DTYPE:
+            return stream
+        if stream.dtype.names is not None:
+            # the fetched results of result handles: a "value" field and optionally a "timestamp" field
+            names = stream.dtype.names
+            out = np.empty(len(stream), RESULT_DTYPE)
+            out["timestamp"] = stream["timestamp"] if "timestamp" in names else np.nan
+            out["value"] = stream["value"] if "value" in names else stream[names[-1]]
+            return out
+        pairs = np.ascontiguousarray(stream, dtype=np.float64)
+    else:
+        try:
+            count = 2 * len(stream)
+        except TypeError:
+            count = -1
+        pairs = np.fromiter(chain.from_iterable(stream), dtype=np.float64, count=count)
+    if pairs.size % 2:
+        raise Exception("to_array: stream is not made of (timestamp, value) pairs")
+    return pairs.reshape(-1, 2).view(RESULT_DTYPE)[:, 0]
+
+
+def values(stream, length=None):
+    """The values of stream (the first length of them) as a view"""
+    return to_array(stream)["value"][:length]
+
+
+def timestamps(stream, length=None):
+    """The timestamps of stream (the first length of them) as a view"""
+    return to_array(stream)["timestamp"][:length]
+
+
+class QMResults:
+    """Wraps the results of job.get_results(). Each stream is converted once and cached, so repeated
+    accesses (e.g. the timestamps and values of input1) don't parse it again"""
+
+    def __init__(self, results):
+        self.results = results
+        self._arrays = {}
+
+    def _array(self, kind, name):
+        key = (kind, name)
+        if key not in self._arrays:
+            self._arrays[key] = to_array(getattr(getattr(self.results, kind), name))
+        return self._arrays[key]
+
+    def raw(self, input_number, length=None):
+        """Samples of the raw ADC stream of input input_number (1 or 2) as a structured array"""
+        return self._array("raw_results", "input%d" % input_number)[:length]
+
+    def raw_values(self, input_number, length=None):
+        return self.raw(input_number, length)["value"]
+
+    def raw_timestamps(self, input_number, length=None):
+        return self.raw(input_number, length)["timestamp"]
+
+    def variable(self, name):
+        """Saved variable name as a structured array"""
+        return self._array("variable_results", name)
+
+    def variable_values(self, *names):
+        """Values of the saved variables names. returns one array for a single name, otherwise a list"""
+        arrays = [self.variable(name)["value"] for name in names]
+        return arrays[0] if len(arrays) == 1 else arrays
+
+
+def stream_variables(job, names, chunk_size=10000, poll_interval=0.5):
+    """Generator of the values of the saved variables names, in chunks of up to chunk_size, while job is running.
+    Uses the result handles of the job (job.result_handles.get(name).count_so_far() and fetch(slice)).
+    Each chunk is a list with an array for each name, all of the same length"""
+    handles = [job.result_handles.get(name) for name in names]
+    fetched = 0
+    while True:
+        processing = job.result_handles.is_processing()
+        available = min(handle.count_so_far() for handle in handles)
+        if available > fetched and (available - fetched >= chunk_size or not processing):
+            stop = min(available, fetched + chunk_size)
+            yield [values(handle.fetch(slice(fetched, stop))) for handle in handles]
+            fetched = stop
+        elif not processing:
+            return
+        else:
+            sleep(poll_interval)
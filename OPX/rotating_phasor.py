@@ -0,0 +1,115 @@
+"""Measure the IQ response of a mixer in a single zero span sweep of the SA.
+The OPX plays a phasor I=amp*cos(theta), Q=amp*sin(theta) rotating once per period as arbitrary waveforms on the
+I,Q elements (on top of their DC offsets), back to back in an infinite loop. The SA sits at the LO frequency in zero
+span, so its trace is the transmitted power vs. time, which is mapped back to theta.
+Every rotation starts with a short blank (I=Q=0, only the DC offsets) which shows up as a notch in the trace and
+marks theta=0 - this takes care of the trigger latency and the delay of the RBW filter.
+The RBW has to be wide enough to follow the rotation (a few MHz for a period of tens of us), and the marker of the
+I pulse can trigger the SA (external trigger input) at the start of a rotation."""
+
+import numpy as np
+from qm.qua import *
+
+OPERATION = "phasor"
+
+
+def phasor_waveforms(amp, period, blank=1000):
+    """Samples [1 ns] of one rotation - I=amp*cos(theta), Q=amp*sin(theta), theta going from 0 to 2*pi between
+    blank and period, and zero during the first blank ns. period and blank are in ns, period must be a multiple of 4.
+    returns (I_samples, Q_samples) as lists"""
+    if period % 4 != 0:
+        raise Exception("rotating_phasor.phasor_waveforms: period must be a multiple of 4 ns")
+    if not 0 <= blank < period:
+        raise Exception("rotating_phasor.phasor_waveforms: blank must be shorter than period")
+    theta = phase_of_time(np.arange(period, dtype=float), period, blank)
+    I = np.where(np.isnan(theta), 0.0, amp * np.cos(np.nan_to_num(theta)))
+    Q = np.where(np.isnan(theta), 0.0, amp * np.sin(np.nan_to_num(theta)))
+    return I.tolist(), Q.tolist()
+
+
+def add_phasor_pulses(cg, I_element, Q_element, amp, period=16000, blank=1000, trigger_port=None,
+                      trigger_length=100):
+    """Add the operation "phasor" - one rotation with amplitude amp - to the single input elements I_element,
+    Q_element of the ConfigGenerator cg. period and blank are in ns (see phasor_waveforms).
+    If trigger_port is not None, the I pulse also outputs a trigger_length ns marker on digital output trigger_port
+    at the start of every rotation.
+    Prerequisites: Single input elements "I_element", "Q_element" at zero IF."""
+
+    I_samples, Q_samples = phasor_waveforms(amp, period, blank)
+    cg.add_arbitrary_waveform("%s_phasor_wf" % I_element, I_samples)
+    cg.add_arbitrary_waveform("%s_phasor_wf" % Q_element, Q_samples)
+    marker = None
+    if trigger_port is not None:
+        marker = "%s_phasor_trigger" % I_element
+        cg.add_digital_waveform(marker, [(1, trigger_length), (0, 0)])
+        cg.add_digital_input(I_element, trigger_port)
+    cg.add_single_control_pulse("%s_phasor_pulse" % I_element, period, "%s_phasor_wf" % I_element, marker)
+    cg.add_single_control_pulse("%s_phasor_pulse" % Q_element, period, "%s_phasor_wf" % Q_element)
+    cg.add_operation(I_element, OPERATION, "%s_phasor_pulse" % I_element)
+    cg.add_operation(Q_element, OPERATION, "%s_phasor_pulse" % Q_element)
+
+
+def build_phasor_program(I_element, Q_element):
+    """A program which rotates the phasor continuously (both pulses have the same length so they stay aligned)"""
+    with program() as prog:
+        with infinite_loop_():
+            play(OPERATION, I_element)
+            play(OPERATION, Q_element)
+    return prog
+
+
+def setup_capture(sa, lo_freq, period, num_rotations=10, BW=3e6, points=10001, trigger=None):
+    """Setup the N9010A_SA sa for a zero span capture of num_rotations rotations at lo_freq [MHz].
+    period is in ns, BW in Hz, trigger is the SA trigger source (e.g. "EXT1") or None for free run"""
+    sa.setup_zero_span(center_freq=lo_freq, BW=BW, sweep_time=num_rotations * period * 1e-9, points=points)
+    sa.set_trigger(trigger if trigger is not None else "IMM")
+
+
+def end_capture(sa):
+    """Back to a free running SA with the automatic (calibrated) sweep time after setup_capture"""
+    sa.set_trigger("IMM")
+    sa.set_sweep_time(None)
+
+
+def phase_of_time(t, period, blank=1000, time_offset=0.0):
+    """The phasor angle theta at times t (same units as period, blank).
+    time_offset is the time at which a rotation (i.e. its blank) starts. theta is nan during the blanks"""
+    t_rot = np.mod(np.asarray(t, dtype=float) - time_offset, period)
+    theta = 2 * np.pi * (t_rot - blank) / (period - blank)
+    theta[t_rot < blank] = np.nan
+    return theta
+
+
+def find_time_offset(times, power, period, blank=1000):
+    """Find the start of a rotation in a trace from the blank notch.
+    The trace is folded modulo period and the window of length blank with the least mean power is the blank.
+    times, period and blank in the same units, power in dBm. returns the time offset (within one period)"""
+    times = np.asarray(times, dtype=float)
+    dt = times[1] - times[0]
+    num_bins = max(int(round(period / dt)), 1)
+    window = max(int(round(blank / dt)), 1)
+    bins = (np.floor(np.mod(times, period) / period * num_bins).astype(int)) % num_bins
+    linear = 10 ** (np.asarray(power, dtype=float) / 10.0)
+    profile = np.bincount(bins, linear, num_bins) / np.maximum(np.bincount(bins, minlength=num_bins), 1)
+    # circular moving sum over the window
+    cumulative = np.concatenate([[0.0], np.cumsum(np.concatenate([profile, profile[:window]]))])
+    window_sum = cumulative[window:window + num_bins] - cumulative[:num_bins]
+    return window_sum.argmin() * period / float(num_bins)
+
+
+def trace_to_response(times, power, period, blank=1000, time_offset=None, margin=None):
+    """Map a zero span trace (times [s], power [dBm]) of the rotating phasor to the IQ response.
+    period and blank are in ns. time_offset [ns] is the start of a rotation in the trace - found from the blank
+    notch if None. margin [ns] is dropped after each blank to skip the RBW filter transient (default blank / 2).
+    returns (theta, power) sorted by theta, ready for e.g. ellipse_fit.fit_ellipse"""
+    times = np.asarray(times, dtype=float) * 1e9
+    power = np.asarray(power, dtype=float)
+    if time_offset is None:
+        time_offset = find_time_offset(times, power, period, blank)
+    if margin is None:
+        margin = blank / 2.0
+    theta = phase_of_time(times, period, blank, time_offset)
+    # phase_of_time with a wider blank marks the transient after the blank as nan
+    valid = ~np.isnan(phase_of_time(times, period, blank + margin, time_offset))
+    order = np.argsort(theta[valid])
+    return theta[valid][order], power[valid][order]
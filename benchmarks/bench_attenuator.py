@@ -0,0 +1,46 @@
+"""Compare an attenuation sweep with a process spawned per command (like LDA64Test.exe) and with a persistent session.
+The spawned process is the Python interpreter doing nothing, so the numbers are a lower bound for LDA64Test.exe,
+which also enumerates the USB devices on every call.
+Run from the repository root: python -m benchmarks.bench_attenuator
+"""
+
+import sys
+import time
+import numpy as np
+from instruments_py27.digital_attenuator import LDA, LDAExecutableBackend, LDASimulatedBackend
+
+ATTENUATIONS = np.arange(0.0, 30.0, 0.5)
+DEVICE_LATENCY = 1e-3  # s, simulated USB command time, paid by both paths
+
+
+class SpawnPerCommandBackend(LDAExecutableBackend):
+    """Spawn a process per command and then apply the command to a simulated device"""
+
+    def __init__(self, device):
+        LDAExecutableBackend.__init__(self)
+        self.device = device
+
+    def command(self, device_number, attenuation):
+        return [sys.executable, "-c", "pass"]
+
+    def set_attenuation(self, device_number, attenuation):
+        LDAExecutableBackend.set_attenuation(self, device_number, attenuation)
+        self.device.set_attenuation(device_number, attenuation)
+
+
+def sweep(backend):
+    lda = LDA(1, backend=backend)
+    start = time.time()
+    for attenuation in ATTENUATIONS:
+        lda.set_attenuation(attenuation)
+    return time.time() - start
+
+
+if __name__ == "__main__":
+    t_spawn = sweep(SpawnPerCommandBackend(LDASimulatedBackend(latency=DEVICE_LATENCY)))
+    t_session = sweep(LDASimulatedBackend(latency=DEVICE_LATENCY))
+    n = len(ATTENUATIONS)
+    print("%d attenuation steps" % n)
+    print("process per command: %8.3f s (%7.2f ms/step)" % (t_spawn, t_spawn / n * 1e3))
+    print("persistent session:  %8.3f s (%7.2f ms/step)" % (t_session, t_session / n * 1e3))
+    print("speedup: %.1f" % (t_spawn / t_session))
@@ -0,0 +1,68 @@
+"""Compare sequential Nelder-Mead (scipy, as in IQ_fmin_measure_drifts_v3.py) with the quadratic batch search of
+calibration.batch_optimizer measured by a PipelinedEvaluator, on the simulated bench with a synchronized SA.
+Reports evaluations, simulated time and the leakage at the result.
+Run from the repository root: python -m benchmarks.bench_batch_optimizer
+"""
+
+import numpy as np
+from scipy import optimize
+from calibration.batch_optimizer import PipelinedEvaluator, QuadraticBatchSearch
+from simulation.iq_mixer_bench import SimulatedBench
+from benchmarks.bench_lo_nulling import CONFIG, LO_FREQ
+
+SETTLE_TIME = 0.02  # s
+READ_LATENCY = 0.02  # s, marker query round trip
+
+
+def make_bench(seed):
+    bench = SimulatedBench(latencies={"sa_query": READ_LATENCY}, seed=seed)
+    bench.open_mg().setup_MG(LO_FREQ, 0.0)
+    qm = bench.open_qm(CONFIG)
+    SA = bench.open_sa(synchronized=True)
+    SA.setup_spectrum_analyzer(center_freq=LO_FREQ, span=10, BW=100, points=1)
+    SA.setup_averaging(True, 3)
+    SA.set_marker_max()
+
+    def set_point(IQ):
+        qm.set_output_dc_offset_by_element("RR1", "single", float(IQ[0]))
+        qm.set_output_dc_offset_by_element("RR2", "single", float(IQ[1]))
+
+    def acquire():
+        SA.restart_averaging()
+        SA.wait_for_sweep(1.0)
+
+    return bench, set_point, acquire, SA.get_marker
+
+
+def run_sequential(seed):
+    bench, set_point, acquire, read = make_bench(seed)
+
+    def measure(IQ):
+        set_point(IQ)
+        bench.clock.sleep(SETTLE_TIME)
+        acquire()
+        return read()
+
+    ret = optimize.minimize(measure, x0=[0.0, 0.0], method="Nelder-Mead",
+                            options={"xatol": 1e-4, "fatol": 2,
+                                     "initial_simplex": np.array([[-0.02, 0.02], [0.02, 0.02], [0, -0.02]])})
+    return bench, ret
+
+
+def run_batch(seed, overlap):
+    bench, set_point, acquire, read = make_bench(seed)
+    evaluator = PipelinedEvaluator(set_point, acquire, read, SETTLE_TIME, overlap,
+                                   timer=lambda: bench.clock.elapsed, sleeper=bench.clock.sleep)
+    ret = QuadraticBatchSearch(evaluator).minimize([0.0, 0.0], scan_range=0.48, num_rounds=3)
+    return bench, ret
+
+
+if __name__ == "__main__":
+    print("%26s %6s %12s %12s %16s" % ("method", "seed", "evaluations", "time [s]", "leakage [dBm]"))
+    for seed in range(3):
+        for name, run in [("Nelder-Mead", run_sequential),
+                          ("quadratic, not pipelined", lambda s: run_batch(s, False)),
+                          ("quadratic, pipelined", lambda s: run_batch(s, True))]:
+            bench, ret = run(seed)
+            leakage = bench.mixer.to_dbm(bench.mixer.lo_leakage(ret.x[0], ret.x[1]))
+            print("%26s %6d %12d %12.2f %16.2f" % (name, seed, ret.nfev, bench.clock.elapsed, leakage))
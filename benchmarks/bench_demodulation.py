@@ -0,0 +1,50 @@
+"""Compare single-bin demodulation (calibration.demodulation) with the FFT path of
+test_two_SB_amp_and_phase.test_amplitude_and_phase for 22000 sample captures.
+Run from the repository root: python -m benchmarks.bench_demodulation
+"""
+
+import timeit
+import numpy as np
+from calibration.demodulation import sideband_coefficients
+
+PULSE_LENGTH = 22000
+IF_FREQ = 20e6
+NUM_CAPTURES = [1, 20, 200]
+M_i = np.array([[1.02, 0.05], [-0.03, 0.97]])
+
+
+def fft_path(I, Q, if_freq):
+    """The analysis of test_amplitude_and_phase, for one capture"""
+    freqs = np.fft.fftfreq(PULSE_LENGTH, 1e-9)
+    I_ = I - np.mean(I)
+    Q_ = Q - np.mean(Q)
+    s = I_ - 1j * Q_
+    s = s - np.mean(s)
+    f_s = np.fft.fft(s)
+    IQ2 = M_i @ np.array([I_, Q_])
+    f_s2 = np.fft.fft(IQ2[0, :] - 1j * IQ2[1, :])
+    idx_p = np.abs(freqs - if_freq).argmin()
+    idx_n = np.abs(freqs + if_freq).argmin()
+    return f_s[idx_p], f_s[idx_n], f_s2[idx_p], f_s2[idx_n]
+
+
+def make_captures(num_captures):
+    t = np.arange(PULSE_LENGTH) * 1e-9
+    phase = np.random.rand(num_captures, 1) * 2 * np.pi
+    I = np.round(200 * np.cos(2 * np.pi * IF_FREQ * t + phase) + 5 * np.random.randn(num_captures, PULSE_LENGTH))
+    Q = np.round(180 * np.sin(2 * np.pi * IF_FREQ * t + phase + 0.1) + 5 * np.random.randn(num_captures, PULSE_LENGTH))
+    return I, Q
+
+
+if __name__ == "__main__":
+    print("%10s %12s %12s %8s %12s" % ("captures", "FFT [ms]", "demod [ms]", "speedup", "max rel err"))
+    for num_captures in NUM_CAPTURES:
+        I, Q = make_captures(num_captures)
+        sideband_coefficients(I[:1], Q[:1], [IF_FREQ], M_i)  # build the phasor table outside the timing
+        t_fft = min(timeit.repeat(lambda: [fft_path(I[k], Q[k], IF_FREQ) for k in range(num_captures)],
+                                  number=1, repeat=3))
+        t_demod = min(timeit.repeat(lambda: sideband_coefficients(I, Q, [IF_FREQ], M_i), number=1, repeat=3))
+        reference = np.array([fft_path(I[k], Q[k], IF_FREQ) for k in range(num_captures)])
+        result = sideband_coefficients(I, Q, [IF_FREQ], M_i)[:, 0, :]
+        error = np.max(np.abs(result - reference) / np.abs(reference).max())
+        print("%10d %12.2f %12.2f %8.1f %12.2e" % (num_captures, t_fft * 1e3, t_demod * 1e3, t_fft / t_demod, error))
@@ -0,0 +1,53 @@
+"""Compare the six special angles method of calibMatrixFind_model.py / IQmixer_response.py with the least squares
+ellipse fit of calibration.ellipse_fit, on simulated responses with 1% voltage noise and a residual DC offset.
+Reports bias and spread of g=g_Q/g_I and phi over many noisy responses, and the fit time per response.
+Run from the repository root: python -m benchmarks.bench_ellipse_fit
+"""
+
+import timeit
+import numpy as np
+from calibration.ellipse_fit import fit_ellipse
+
+G_I, G_Q, PHI = 0.9, 0.75, 0.16
+AMP = 0.01
+DELTA = np.array([3e-4, -2e-4])  # residual offset
+NOISE = 0.01
+NUM_RESPONSES = 2000
+SIX_ANGLES = np.array([0, np.pi, np.pi / 2, 3 * np.pi / 2, np.pi / 4, 7 * np.pi / 4])
+
+
+def response(theta, num_responses, rng):
+    M = np.array([[G_I ** 2, G_I * G_Q * np.sin(PHI)], [G_I * G_Q * np.sin(PHI), G_Q ** 2]]) / AMP ** 2
+    u = AMP * np.stack([np.cos(theta), np.sin(theta)]) + DELTA[:, None]
+    volt = np.sqrt(np.einsum("in,ij,jn->n", u, M, u))
+    return volt * (1 + NOISE * rng.randn(num_responses, len(theta)))
+
+
+def six_angles(volt_m):
+    """The extraction of calibMatrixFind_model.py"""
+    g_I = np.mean([volt_m[:, 0], volt_m[:, 1]], axis=0)
+    g_Q = np.mean([volt_m[:, 2], volt_m[:, 3]], axis=0)
+    x = volt_m[:, 4] ** 2 - volt_m[:, 5] ** 2
+    phi = np.arcsin(np.clip(x / (2 * g_I * g_Q), -1, 1))
+    return g_Q / g_I, phi
+
+
+if __name__ == "__main__":
+    rng = np.random.RandomState(0)
+    print("true g=%.5f phi=%.5f" % (G_Q / G_I, PHI))
+    print("%22s %8s %12s %12s %12s %12s %14s" % ("method", "points", "g bias", "g std", "phi bias", "phi std",
+                                                "time [us]"))
+    volt = response(SIX_ANGLES, NUM_RESPONSES, rng)
+    g, phi = six_angles(volt)
+    t = min(timeit.repeat(lambda: six_angles(volt[:1]), number=100, repeat=3)) / 100
+    print("%22s %8d %12.2e %12.2e %12.2e %12.2e %14.1f" % ("six angles", 6, np.mean(g) - G_Q / G_I, np.std(g),
+                                                          np.mean(phi) - PHI, np.std(phi), t * 1e6))
+    for num_points in [8, 12, 24, 101]:
+        theta = np.linspace(0, 2 * np.pi, num_points, endpoint=False)
+        volt = response(theta, NUM_RESPONSES, rng)
+        fit = fit_ellipse(theta, volt, AMP)
+        t = min(timeit.repeat(lambda: fit_ellipse(theta, volt[0], AMP), number=100, repeat=3)) / 100
+        print("%22s %8d %12.2e %12.2e %12.2e %12.2e %14.1f" % ("ellipse fit", num_points,
+                                                              np.mean(fit["g"]) - G_Q / G_I, np.std(fit["g"]),
+                                                              np.mean(fit["phi"]) - PHI, np.std(fit["phi"]),
+                                                              t * 1e6))
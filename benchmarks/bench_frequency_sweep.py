@@ -0,0 +1,138 @@
+"""Calibrate a grid of LO frequencies and IFs with calibration.frequency_sweep on the simulated bench, with warm
+starts from the nearest calibrated point and with a cold start at every point.
+The simulated mixer's leakage null and imbalance drift with the LO frequency. Offsets and (g, phi) are found with
+Nelder-Mead with a fixed budget of evaluations (under SA noise it rarely meets its tolerances); a warm start begins
+with a small simplex around the neighbour's result.
+Reports evaluations, simulated instrument time and the median image / leakage after calibration (the first point
+is a cold start in both runs).
+Run from the repository root: python -m benchmarks.bench_frequency_sweep
+"""
+
+import numpy as np
+from scipy import optimize
+from calibration.frequency_sweep import CalibrationSweep
+from calibration.mixer_model import model_corr_mat
+from simulation.iq_mixer_bench import SimulatedBench
+
+LO_FREQS = np.arange(4.8e9, 5.2e9 + 1, 50e6)
+IF_FREQS = [-60e6, -20e6, 20e6, 60e6]
+COLD_SIMPLEX = {"offsets": 0.1, "imbalance": 0.2}
+WARM_SIMPLEX = {"offsets": 0.005, "imbalance": 0.02}
+MAX_EVALUATIONS = 40  # per calibration
+
+
+class DispersiveBench(SimulatedBench):
+    """A bench whose mixer parameters depend on the LO frequency"""
+
+    def spectrum(self):
+        if self.mg is not None:
+            x = (self.mg.freq - 5000.0) / 200.0
+            self.mixer.I_null = 0.0213 + 0.01 * x
+            self.mixer.Q_null = -0.0147 + 0.006 * x ** 2
+            self.mixer.g_Q = 0.86 + 0.04 * x
+            self.mixer.phi = 0.16 - 0.05 * x
+        return SimulatedBench.spectrum(self)
+
+
+def config(lo_freq):
+    return {
+        "version": 1,
+        "controllers": {"con1": {"type": "opx1", "analog_outputs": {1: {"offset": 0.0}, 2: {"offset": 0.0}}}},
+        "elements": {
+            "mixer": {"mixInputs": {"I": ("con1", 1), "Q": ("con1", 2), "lo_frequency": lo_freq, "mixer": "mixer"},
+                      "intermediate_frequency": IF_FREQS[0], "operations": {"tone": "tone_pulse"}}
+        },
+        "pulses": {"tone_pulse": {"operation": "control", "length": 1000, "waveforms": {"I": "const", "Q": "zero"}}},
+        "waveforms": {"const": {"type": "constant", "sample": 0.2}, "zero": {"type": "constant", "sample": 0.0}},
+        "mixers": {"mixer": [{"intermediate_frequency": if_freq, "lo_frequency": lo_freq,
+                              "correction": [1.0, 0.0, 0.0, 1.0]} for if_freq in IF_FREQS]}
+    }
+
+
+def simplex(x0, size):
+    return np.array([x0, [x0[0] + size, x0[1]], [x0[0], x0[1] + size]])
+
+
+def run(warm_start):
+    bench = DispersiveBench(seed=0)
+    mg = bench.open_mg()
+    sa = bench.open_sa(synchronized=True)
+    state = {"evaluations": 0}
+    tone = object()  # the program playing the tone (simulated programs are opaque)
+    no_tone = object()
+
+    def measure(center_freq):
+        sa.setup_spectrum_analyzer(center_freq=center_freq / 1e6, span=10, BW=100, points=1)
+        sa.set_marker_max()
+        state["evaluations"] += 1
+        return sa.get_marker()
+
+    def set_lo(lo_freq):
+        mg.setup_MG(lo_freq / 1e6, 0.0)
+        state["qm"] = bench.open_qm(config(lo_freq))
+        state["qm"].register_program(tone, [("mixer", "tone", 1.0)])
+
+    def set_offsets(IQ):
+        state["qm"].set_output_dc_offset_by_element("mixer", "I", float(IQ[0]))
+        state["qm"].set_output_dc_offset_by_element("mixer", "Q", float(IQ[1]))
+
+    def calibrate_offsets(lo_freq, guess):
+        state["qm"].execute(no_tone)
+        x0 = guess if warm_start and guess is not None else (0.0, 0.0)
+        size = WARM_SIMPLEX if warm_start and guess is not None else COLD_SIMPLEX
+
+        def leakage(IQ):
+            set_offsets(IQ)
+            return measure(lo_freq)
+
+        ret = optimize.minimize(leakage, x0, method="Nelder-Mead",
+                                options={"xatol": 1e-4, "fatol": 1.0, "maxfev": MAX_EVALUATIONS,
+                                         "initial_simplex": simplex(x0, size["offsets"])})
+        return ret.x
+
+    def calibrate_imbalance(lo_freq, if_freq, offsets, guess):
+        qm = state["qm"]
+        set_offsets(offsets)
+        qm.set_intermediate_frequency("mixer", if_freq)
+        qm.execute(tone)
+        x0 = guess if warm_start and guess is not None else (1.0, 0.0)
+        size = WARM_SIMPLEX if warm_start and guess is not None else COLD_SIMPLEX
+
+        def image(corr_params):
+            qm.set_mixer_correction("mixer", int(if_freq), int(lo_freq), tuple(model_corr_mat(*corr_params).flatten()))
+            return measure(lo_freq - if_freq)
+
+        ret = optimize.minimize(image, x0, method="Nelder-Mead",
+                                options={"xatol": 1e-4, "fatol": 1.0, "maxfev": MAX_EVALUATIONS,
+                                         "initial_simplex": simplex(x0, size["imbalance"])})
+        return ret.x
+
+    sweep = CalibrationSweep(LO_FREQS, IF_FREQS, set_lo, calibrate_offsets, calibrate_imbalance, verbose=False,
+                             timer=lambda: bench.clock.elapsed)
+    corrections = sweep.run()
+
+    # the image and leakage over the grid after calibration (noise free)
+    image = []
+    leakage = []
+    for (lo_freq, if_freq), correction in corrections.items():
+        mg.setup_MG(lo_freq / 1e6, 0.0)
+        bench.spectrum()  # update the mixer parameters
+        pos, neg = bench.mixer.sidebands(0.2, correction)
+        image.append(bench.mixer.to_dbm(neg) - bench.mixer.to_dbm(pos))
+        leakage.append(bench.mixer.to_dbm(bench.mixer.lo_leakage(*sweep.offsets[lo_freq])))
+    return state["evaluations"], bench.clock.elapsed, np.median(image), np.median(leakage), sweep
+
+
+def main():
+    print("%d LO frequencies x %d IFs" % (len(LO_FREQS), len(IF_FREQS)))
+    print("%12s %12s %16s %18s %20s" % ("start", "evaluations", "simulated [s]", "median image [dBc]",
+                                        "median leakage [dBm]"))
+    for warm_start in [False, True]:
+        evaluations, elapsed, image, leakage, sweep = run(warm_start)
+        print("%12s %12d %16.1f %18.1f %20.1f" % ("warm" if warm_start else "cold", evaluations, elapsed, image,
+                                                  leakage))
+    print(sweep.report())
+
+
+if __name__ == "__main__":
+    main()
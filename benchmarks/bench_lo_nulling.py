@@ -0,0 +1,40 @@
+"""Compare LO leakage nulling strategies of IQ_min_finder on the simulated bench:
+shrinking 1d scans (find_IQ_min) and the quadratic model (find_IQ_min_quadratic).
+Reports SA reads, simulated instrument time and the reached leakage.
+Run from the repository root: python -m benchmarks.bench_lo_nulling
+"""
+
+from OPX.IQ_find_min import IQ_min_finder
+from simulation.iq_mixer_bench import SimulatedBench
+
+LO_FREQ = 5000.0  # MHz
+CONFIG = {
+    "version": 1,
+    "controllers": {"con1": {"type": "opx1", "analog_outputs": {1: {"offset": 0.0}, 2: {"offset": 0.0}}}},
+    "elements": {
+        "RR1": {"singleInput": {"port": ("con1", 1)}, "intermediate_frequency": 0.0},
+        "RR2": {"singleInput": {"port": ("con1", 2)}, "intermediate_frequency": 0.0}
+    }
+}
+
+
+def run(strategy, synchronized):
+    bench = SimulatedBench(seed=0)
+    bench.open_mg().setup_MG(LO_FREQ, 0.0)
+    finder = IQ_min_finder(bench.open_sa(synchronized=synchronized), qm=bench.open_qm(CONFIG))
+    if strategy == "scan":
+        I0, Q0, power = finder.find_IQ_min(0.0, 0.0, 0.48, LO_FREQ)
+    else:
+        I0, Q0, power = finder.find_IQ_min_quadratic(0.0, 0.0, 0.48, LO_FREQ)
+    return finder.num_reads, bench.clock.elapsed, I0, Q0, power
+
+
+if __name__ == "__main__":
+    results = []
+    for synchronized in [False, True]:
+        for strategy in ["scan", "quadratic"]:
+            results.append((strategy, synchronized) + run(strategy, synchronized))
+    print("")
+    print("%10s %6s %8s %12s %10s %10s %12s" % ("strategy", "sync", "reads", "time [s]", "I0", "Q0", "power [dBm]"))
+    for r in results:
+        print("%10s %6s %8d %12.2f %10.5f %10.5f %12.2f" % r)
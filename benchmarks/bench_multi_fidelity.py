@@ -0,0 +1,65 @@
+"""Compare Nelder-Mead LO leakage nulling with a fixed SA setting (as in IQ_fmin_measure_drifts_v3.py) and with the
+multi-fidelity stages of calibration.multi_fidelity, on the simulated bench.
+Both run the same simplex restarts; the fixed schedule uses the final SA setting in every stage.
+Reports evaluations, simulated SA time and the leakage at the result of each seed, and the mean time and the mean,
+median and worst leakage of each schedule, so the speedup is seen next to the quality of the null.
+Run from the repository root: python -m benchmarks.bench_multi_fidelity
+"""
+
+import numpy as np
+from calibration.multi_fidelity import MultiFidelityMinimizer, DEFAULT_STAGES
+from simulation.iq_mixer_bench import SimulatedBench
+from benchmarks.bench_lo_nulling import CONFIG, LO_FREQ
+
+# the same simplex restarts, all with the final (most accurate) SA setting
+FIXED_STAGES = [dict(stage, BW=DEFAULT_STAGES[-1]["BW"], num_averages=DEFAULT_STAGES[-1]["num_averages"],
+                     wait_time=DEFAULT_STAGES[-1]["wait_time"]) for stage in DEFAULT_STAGES]
+NUM_SEEDS = 16
+
+
+def run(stages, synchronized, seed):
+    bench = SimulatedBench(seed=seed)
+    bench.open_mg().setup_MG(LO_FREQ, 0.0)
+    qm = bench.open_qm(CONFIG)
+    SA = bench.open_sa(synchronized=synchronized)
+    SA.setup_spectrum_analyzer(center_freq=LO_FREQ, span=10, points=1)
+    SA.set_marker_max()
+
+    def measure(IQ, wait_time):
+        qm.set_output_dc_offset_by_element("RR1", "single", float(IQ[0]))
+        qm.set_output_dc_offset_by_element("RR2", "single", float(IQ[1]))
+        SA.restart_averaging()
+        SA.wait_for_sweep(wait_time)
+        return SA.get_marker()
+
+    minimizer = MultiFidelityMinimizer(SA, measure, stages, timer=lambda: bench.clock.elapsed)
+    start = bench.clock.elapsed
+    ret = minimizer.minimize([0.0, 0.0])
+    elapsed = bench.clock.elapsed - start
+    leakage = bench.mixer.to_dbm(bench.mixer.lo_leakage(ret.x[0], ret.x[1]))
+    return minimizer, elapsed, leakage
+
+
+if __name__ == "__main__":
+    summary = []
+    print("%14s %6s %12s %12s %16s" % ("schedule", "sync", "evaluations", "time [s]", "leakage [dBm]"))
+    for synchronized in [False, True]:
+        for name, stages in [("fixed", FIXED_STAGES), ("multi-fidelity", DEFAULT_STAGES)]:
+            times, leakages = [], []
+            for seed in range(NUM_SEEDS):
+                minimizer, elapsed, leakage = run(stages, synchronized, seed)
+                evaluations = sum(r["evaluations"] for r in minimizer.stage_reports)
+                print("%14s %6s %12d %12.1f %16.2f" % (name, synchronized, evaluations, elapsed, leakage))
+                times.append(elapsed)
+                leakages.append(leakage)
+            summary.append((name, synchronized, np.mean(times), np.mean(leakages), np.median(leakages),
+                            np.max(leakages)))
+    print("")
+    print("%14s %6s %15s %19s %21s %20s" % ("schedule", "sync", "mean time [s]", "mean leakage [dBm]",
+                                            "median leakage [dBm]", "worst leakage [dBm]"))
+    for row in summary:
+        print("%14s %6s %15.1f %19.2f %21.2f %20.2f" % row)
+    print("")
+    for name, stages in [("fixed", FIXED_STAGES), ("multi-fidelity", DEFAULT_STAGES)]:
+        print("%s, not synchronized:" % name)
+        print(run(stages, False, 0)[0].report())
@@ -0,0 +1,46 @@
+"""Compare unpacking QM results with np.array(list(zip(*stream))[1]) and with OPX.qm_results.
+The streams are lists of (timestamp, value) pairs like the ones in job.get_results().
+Run from the repository root: python -m benchmarks.bench_qm_results [sizes...]
+"""
+
+import sys
+import timeit
+import numpy as np
+from OPX.qm_results import RESULT_DTYPE, to_array, values
+
+SIZES = [10 ** 5, 10 ** 6, 10 ** 7]
+
+
+def make_stream(size):
+    ts = np.arange(size, dtype=float)
+    adc = np.round(2048 * np.random.rand(size)) / 4096
+    return list(zip(ts.tolist(), adc.tolist()))
+
+
+def unpack_zip(stream):
+    return np.array(list(zip(*stream))[1])
+
+
+if __name__ == "__main__":
+    sizes = [int(float(s)) for s in sys.argv[1:]] or SIZES
+    print("%10s %12s %12s %8s %16s %16s" % ("samples", "zip [ms]", "adapter [ms]", "speedup", "zip [MS/s]",
+                                           "adapter [MS/s]"))
+    for size in sizes:
+        stream = make_stream(size)
+        repeat = 3 if size <= 10 ** 6 else 1
+        t_zip = min(timeit.repeat(lambda: unpack_zip(stream), number=1, repeat=repeat))
+        t_adapter = min(timeit.repeat(lambda: values(stream), number=1, repeat=repeat))
+        assert np.array_equal(unpack_zip(stream), values(stream))
+        print("%10d %12.1f %12.1f %8.1f %16.1f %16.1f" % (size, t_zip * 1e3, t_adapter * 1e3, t_zip / t_adapter,
+                                                          size / t_zip / 1e6, size / t_adapter / 1e6))
+        del stream
+
+    # results which already are numpy arrays are viewed, not copied - the Python pairs above are always copied
+    pairs = np.random.rand(10 ** 6, 2)
+    t_view = min(timeit.repeat(lambda: to_array(pairs)["value"], number=100, repeat=3)) / 100
+    print("numpy (N, 2) input, 10^6 samples: %.1f us, shares memory: %s" %
+          (t_view * 1e6, np.shares_memory(to_array(pairs), pairs)))
+    fetched = pairs.view(RESULT_DTYPE)[:, 0]  # like the fetched data of a result handle
+    t_fetched = min(timeit.repeat(lambda: to_array(fetched)["value"], number=100, repeat=3)) / 100
+    print("numpy structured input, 10^6 samples: %.1f us, shares memory: %s" %
+          (t_fetched * 1e6, np.shares_memory(to_array(fetched), pairs)))
@@ -0,0 +1,73 @@
+"""Three calibration clients sharing one N9010A through instruments_py27.sa_broker, against the SCPI emulator of
+simulation.scpi_emulator (real sweep times). Every client iteration settles the OPX and the MG (a sleep) and then
+reads the marker at the client's LO frequency - two of the clients calibrate channel pairs on the same LO, so
+their requests can be batched.
+Compares the clients run one after another, each owning the SA, with the clients run concurrently through the broker.
+Run from the repository root: python -m benchmarks.bench_sa_broker
+"""
+
+import threading
+import time
+from instruments_py27.spectrum_analyzer import N9010A_SA
+from instruments_py27.sa_broker import SABroker, BrokeredSA
+from instruments_py27 import visa_registry
+from simulation.iq_mixer_bench import SimulatedBench
+from simulation.scpi_emulator import N9010AEmulator
+from benchmarks.bench_lo_nulling import CONFIG, LO_FREQ
+
+SETTLE_TIME = 0.1  # s, OPX and MG settling of every iteration
+NUM_ITERATIONS = 20
+CLIENTS = [("mixer A ch 1-2", LO_FREQ, 0), ("mixer A ch 3-4", LO_FREQ, 0), ("mixer B", LO_FREQ + 200.0, 1)]
+
+
+def calibrate(sa, lo_freq):
+    sa.setup_spectrum_analyzer(center_freq=lo_freq, span=10, BW=100, points=1)
+    sa.set_marker_max()
+    for _ in range(NUM_ITERATIONS):
+        time.sleep(SETTLE_TIME)
+        sa.get_marker()
+
+
+def one_after_another(address):
+    sa = N9010A_SA(address, synchronized=True)
+    start = time.time()
+    for name, lo_freq, priority in CLIENTS:
+        calibrate(sa, lo_freq)
+    return time.time() - start
+
+
+def shared(address):
+    broker = SABroker(N9010A_SA(address, synchronized=True), ("localhost", 0))
+    broker.start()
+    clients = [BrokeredSA(broker.address, name=name, priority=priority) for name, lo_freq, priority in CLIENTS]
+    threads = [threading.Thread(target=calibrate, args=(sa, lo_freq)) for sa, (name, lo_freq, priority) in
+               zip(clients, CLIENTS)]
+    start = time.time()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.time() - start
+    for sa in clients:
+        sa.close()
+    broker.close()
+    return elapsed, broker.report()
+
+
+def main():
+    bench = SimulatedBench(seed=0)
+    bench.open_qm(CONFIG)
+    emulator = N9010AEmulator(bench, latency=0.0005, real_sweep_time=True, seed=1)
+    address = emulator.start()
+    print("%d clients x %d iterations, %.0f ms settling per iteration" % (len(CLIENTS), NUM_ITERATIONS,
+                                                                         SETTLE_TIME * 1e3))
+    print("one after another, each owning the SA: %.2f s" % one_after_another(address))
+    visa_registry.close_all()
+    elapsed, report = shared(address)
+    print("concurrently through the broker:       %.2f s" % elapsed)
+    print(report)
+    emulator.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""Drive the instruments_py27 drivers over raw sockets against the SCPI emulators of simulation.scpi_emulator,
+all backed by one simulated bench, and report round trips per second of the SA marker reads for several reply
+latencies, with and without jitter, and the time the MG drivers' caches save on repeated settings.
+Run from the repository root: python -m benchmarks.bench_scpi_emulator
+"""
+
+import time
+import numpy as np
+from instruments_py27.spectrum_analyzer import N9010A_SA
+from instruments_py27.E8241A import E8241A_MG
+from instruments_py27.anritsu import Anritsu_MG
+from instruments_py27.M9347A import M9347A_MG
+from instruments_py27 import visa_registry
+from simulation.iq_mixer_bench import SimulatedBench
+from simulation.scpi_emulator import N9010AEmulator, E8241AEmulator, AnritsuEmulator, M9347AEmulator
+from benchmarks.bench_lo_nulling import CONFIG, LO_FREQ
+
+NUM_READS = 200
+LATENCIES = [(0.0, 0.0), (0.0005, 0.0), (0.002, 0.0), (0.002, 0.001)]  # (latency, jitter) [s]
+
+
+def marker_reads_per_second(latency, jitter):
+    bench = SimulatedBench(seed=0)
+    bench.open_qm(CONFIG)
+    mg_emulator = E8241AEmulator(bench)
+    sa_emulator = N9010AEmulator(bench, latency, jitter, real_sweep_time=False, seed=1)
+    mg = E8241A_MG(mg_emulator.start())
+    sa = N9010A_SA(sa_emulator.start(), synchronized=True)
+    mg.setup_MG(LO_FREQ, 0.0)
+    sa.setup_spectrum_analyzer(center_freq=LO_FREQ, span=10, BW=100, points=1)
+    sa.set_marker_max()
+    start = time.time()
+    power = [sa.get_marker() for _ in range(NUM_READS)]
+    rate = NUM_READS / (time.time() - start)
+    visa_registry.close_all()
+    mg_emulator.close()
+    sa_emulator.close()
+    return rate, np.mean(power), sa_emulator.report()
+
+
+def cached_retunes(MG_class, emulator_class, address_suffix=None):
+    """Time of 6 setups cycling through 2 frequencies, with the driver's cache on and off"""
+    times = []
+    for use_cache in [True, False]:
+        emulator = emulator_class()
+        address = emulator.start()
+        mg = MG_class(address if address_suffix is None else (address, address_suffix))
+        mg.use_cache = use_cache
+        start = time.time()
+        for freq in [5000.0, 5000.0, 5100.0, 5100.0, 5100.0, 5000.0]:
+            mg.setup_MG(freq, 0.0)
+        times.append(time.time() - start)
+        visa_registry.close_all()
+        emulator.close()
+    return times
+
+
+def main():
+    print("synchronized marker reads of N9010A_SA over a raw socket, LO leakage of the simulated mixer")
+    print("%12s %12s %14s %16s" % ("latency [ms]", "jitter [ms]", "reads/second", "mean power [dBm]"))
+    for latency, jitter in LATENCIES:
+        rate, power, report = marker_reads_per_second(latency, jitter)
+        print("%12.1f %12.1f %14.0f %16.2f" % (latency * 1e3, jitter * 1e3, rate, power))
+    print(report)
+
+    print("6 MG setups over 2 frequencies (each write is followed by the driver's 100 ms settle)")
+    print("%10s %14s %14s" % ("MG", "cache on [s]", "cache off [s]"))
+    for name, MG_class, emulator_class, suffix in [("E8241A", E8241A_MG, E8241AEmulator, None),
+                                                   ("Anritsu", Anritsu_MG, AnritsuEmulator, None),
+                                                   ("M9347A", M9347A_MG, M9347AEmulator, 1)]:
+        on, off = cached_retunes(MG_class, emulator_class, suffix)
+        print("%10s %14.2f %14.2f" % (name, on, off))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+"""Round trips of the raw socket SCPI transport (instruments_py27.scpi_socket) against a minimal local SA emulator
+which delays every packet it receives by a one way network latency and every sweep by a sweep time.
+Compares independent queries sent one by one and pipelined, and synchronized marker reads of N9010A_SA with a
+separate marker query and with the marker query sent together with the sweep (as get_marker does now).
+Also checks that binary trace blocks (whose payload contains newlines) are demultiplexed correctly.
+Run from the repository root: python -m benchmarks.bench_scpi_socket
+"""
+
+import socket
+import threading
+import time
+import numpy as np
+from instruments_py27.spectrum_analyzer import N9010A_SA
+from instruments_py27.ieee488 import build_definite_length_block, parse_definite_length_block
+
+LATENCY = 0.001  # one way, s
+SWEEP_TIME = 0.002  # s
+NUM_POINTS = 100
+TRACE = np.frombuffer(b"\n\n\x20\x3d" * 1001, dtype="<f4")  # REAL,32 values whose bytes include newlines
+
+
+class MiniSA:
+    """Just enough of an N9010A to answer the queries of this benchmark"""
+
+    def __init__(self):
+        self.server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.server.bind(("127.0.0.1", 0))
+        self.server.listen(1)
+        self.port = self.server.getsockname()[1]
+        thread = threading.Thread(target=self._serve)
+        thread.daemon = True
+        thread.start()
+
+    def _answer(self, command):
+        command = command.strip().upper()
+        if command.startswith(":INIT:IMM"):
+            time.sleep(SWEEP_TIME)
+            return None
+        if command == "*OPC?":
+            return b"1"
+        if command.startswith(":CALC:MARK:Y?"):
+            return b"-85.25"
+        if command.startswith(":FREQ:STAR?"):
+            return b"4.9999995E+09"
+        if command.startswith(":FREQ:STOP?"):
+            return b"5.0000005E+09"
+        if command.startswith(":SWE:POIN?"):
+            return str(len(TRACE)).encode()
+        if command.startswith(":TRAC:DATA?"):
+            return build_definite_length_block(TRACE.tobytes())[:-1]
+        if command.endswith("?"):
+            return b"0"
+        return None
+
+    def _serve(self):
+        connection, _ = self.server.accept()
+        connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        received = b""
+        while True:
+            data = connection.recv(65536)
+            if not data:
+                return
+            time.sleep(LATENCY)  # the packet's trip to the instrument
+            received += data
+            replies = []
+            while b"\n" in received:
+                line, received = received.split(b"\n", 1)
+                answers = [self._answer(command) for command in line.decode().split(";")]
+                answers = [answer for answer in answers if answer is not None]
+                if answers:
+                    replies.append(b";".join(answers) + b"\n")
+            if replies:
+                time.sleep(LATENCY)  # the trip back
+                connection.sendall(b"".join(replies))
+
+
+def timed(function):
+    start = time.time()
+    function()
+    return (time.time() - start) / NUM_POINTS * 1e3
+
+
+def main():
+    emulator = MiniSA()
+    address = "TCPIP0::127.0.0.1::%d::SOCKET" % emulator.port
+    SA = N9010A_SA(address, set_best_speed=False, synchronized=True, binary_data=True)
+    transport = SA.SA
+    queries = [":FREQ:STAR?", ":FREQ:STOP?", ":SWE:POIN?", ":CALC:MARK:Y?"]
+
+    print("one way latency %.1f ms, sweep time %.1f ms" % (LATENCY * 1e3, SWEEP_TIME * 1e3))
+    print("%45s %12s" % ("", "ms/point"))
+    print("%45s %12.2f" % ("4 queries one by one", timed(
+        lambda: [[transport.query(q) for q in queries] for _ in range(NUM_POINTS)])))
+    print("%45s %12.2f" % ("4 queries pipelined", timed(
+        lambda: [transport.queries(queries) for _ in range(NUM_POINTS)])))
+
+    def separate_marker_query():
+        SA._single_sweep()
+        return float(SA.SA.query(":CALC:MARK:Y?;"))
+
+    print("%45s %12.2f" % ("synchronized marker read, separate query", timed(
+        lambda: [separate_marker_query() for _ in range(NUM_POINTS)])))
+    print("%45s %12.2f" % ("synchronized marker read, with the sweep", timed(
+        lambda: [SA.get_marker() for _ in range(NUM_POINTS)])))
+
+    # a binary block pipelined between two ASCII replies
+    before = transport.query_async(":SWE:POIN?")
+    transport.write(":TRAC:DATA? TRACE1")
+    block = transport.read_raw()
+    after = transport.query(":CALC:MARK:Y?")
+    trace = parse_definite_length_block(block, "<f4")
+    print("binary block demultiplexed correctly: %s" % (before.result() == str(len(TRACE)) and
+                                                       np.array_equal(trace, TRACE) and after == "-85.25"))
+    print("trace through get_trace: %s" % np.array_equal(SA.get_trace()[:, 1], TRACE))
+    print("%d sends, %d replies" % (transport.num_sends, transport.num_replies))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+"""Sweep the LO frequency (MG and SA center together), the SA RBW and the LO power on the simulated bench with
+instruments_py27.sweep, nested as written in a script (power, LO frequency, RBW, raster order) and with the nesting
+and snake order chosen by the cost model.
+Reports the simulated instrument time of the whole sweep and its estimate.
+Run from the repository root: python -m benchmarks.bench_sweep
+"""
+
+import numpy as np
+from instruments_py27.sweep import Sweep, SweepAxis
+from simulation.iq_mixer_bench import SimulatedBench
+from benchmarks.bench_lo_nulling import CONFIG
+
+LO_FREQS = np.arange(4900.0, 5100.0 + 1, 25.0)  # MHz
+BWS = [10.0, 100.0, 1000.0]  # Hz
+LO_POWERS = [-5.0, 0.0, 5.0]  # dBm
+
+
+def run(nesting, snake):
+    bench = SimulatedBench(seed=0)
+    mg = bench.open_mg()
+    sa = bench.open_sa(synchronized=False)  # fixed waits - a reconfiguration takes SETUP_WAIT
+    bench.open_qm(CONFIG)
+    sa.setup_spectrum_analyzer(span=10, points=1)
+    axes = [
+        SweepAxis([(mg, "freq"), (sa, "center_freq")], LO_FREQS, cost=mg.SETTLE_TIME + sa.SETUP_WAIT, name="LO"),
+        SweepAxis((sa, "BW"), BWS, cost=sa.SETUP_WAIT),
+        SweepAxis((mg, "power"), LO_POWERS, cost=mg.SETTLE_TIME)
+    ]
+    mg.set_on(True)
+    sweep = Sweep(axes, snake=snake, nesting=nesting, timer=lambda: bench.clock.elapsed)
+    start = bench.clock.elapsed
+
+    def measure():
+        sa.wait_for_sweep(0.05)
+        return sa.get_marker()
+
+    results = sweep.run(measure)
+    return bench.clock.elapsed - start, sweep.estimate_cost(), results, sweep
+
+
+def main():
+    print("%d LO frequencies x %d RBWs x %d LO powers" % (len(LO_FREQS), len(BWS), len(LO_POWERS)))
+    print("%30s %16s %14s" % ("order", "simulated [s]", "estimate [s]"))
+    for label, nesting, snake in [("as written (power, LO, BW)", [2, 0, 1], False), ("cost model", None, True)]:
+        elapsed, estimate, results, sweep = run(nesting, snake)
+        print("%30s %16.1f %14.1f" % (label, elapsed, estimate))
+    print(sweep.report())
+    print("results shape: %s" % (results.shape,))
+
+
+if __name__ == "__main__":
+    main()
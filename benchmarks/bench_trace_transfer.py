@@ -0,0 +1,43 @@
+"""Compare decoding of N9010A_SA traces in ASCII (CALC:DATA?) and binary REAL,32 (TRAC:DATA?) formats.
+Measures payload size and decoding time for the data as it arrives from the instrument.
+Run from the repository root: python -m benchmarks.bench_trace_transfer
+"""
+
+import timeit
+import numpy as np
+from instruments_py27.ieee488 import build_definite_length_block, parse_definite_length_block
+
+POINTS = [1001, 10001, 40001]
+REPEATS = 20
+
+
+def make_payloads(points):
+    """Make the ASCII and binary payloads the SA sends for a trace with the given number of points"""
+    freq = np.linspace(4999.995e6, 5000.005e6, points)
+    power = -90.0 + 5 * np.random.randn(points)
+    ascii_payload = (",".join("%.8e,%.8e" % fp for fp in zip(freq, power)) + "\n").encode()
+    binary_payload = build_definite_length_block(power.astype("<f4").tobytes())
+    return ascii_payload, binary_payload, (freq[0], freq[-1], points)
+
+
+def decode_ascii(payload):
+    text = payload.decode()
+    return np.array(text.split(","), dtype=float).reshape(-1, 2)
+
+
+def decode_binary(payload, axis):
+    power = parse_definite_length_block(payload, "<f4")
+    data = np.empty((len(power), 2))
+    data[:, 0] = np.linspace(*axis)
+    data[:, 1] = power
+    return data
+
+
+if __name__ == "__main__":
+    print("%8s %12s %12s %12s %12s %8s" % ("points", "ASCII [B]", "binary [B]", "ASCII [ms]", "binary [ms]", "speedup"))
+    for points in POINTS:
+        ascii_payload, binary_payload, axis = make_payloads(points)
+        t_ascii = min(timeit.repeat(lambda: decode_ascii(ascii_payload), number=1, repeat=REPEATS))
+        t_binary = min(timeit.repeat(lambda: decode_binary(binary_payload, axis), number=1, repeat=REPEATS))
+        print("%8d %12d %12d %12.3f %12.3f %8.1f" % (points, len(ascii_payload), len(binary_payload),
+                                                      t_ascii * 1e3, t_binary * 1e3, t_ascii / t_binary))
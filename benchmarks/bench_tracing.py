@@ -0,0 +1,75 @@
+"""Profile of IQ_min_finder.find_IQ_min with instruments_py27.tracing, with N9010A_SA and E8241A_MG talking SCPI to
+the emulators of simulation.scpi_emulator and the simulated QM of the bench, and the cost of tracing: synchronized
+marker reads per second with tracing disabled (the drivers use their sessions directly) and enabled.
+Run from the repository root: python -m benchmarks.bench_tracing
+"""
+
+import os
+import tempfile
+import time
+from OPX.IQ_find_min import IQ_min_finder
+from instruments_py27 import tracing, visa_registry
+from instruments_py27.spectrum_analyzer import N9010A_SA
+from instruments_py27.E8241A import E8241A_MG
+from simulation.iq_mixer_bench import SimulatedBench
+from simulation.scpi_emulator import N9010AEmulator, E8241AEmulator
+from benchmarks.bench_lo_nulling import CONFIG, LO_FREQ
+
+NUM_READS = 2000
+
+
+def open_bench(latency):
+    bench = SimulatedBench(seed=0)
+    emulators = [E8241AEmulator(bench), N9010AEmulator(bench, latency, real_sweep_time=False, seed=1)]
+    mg = E8241A_MG(emulators[0].start())
+    sa = N9010A_SA(emulators[1].start(), synchronized=True)
+    return bench, emulators, mg, sa
+
+
+def close_bench(emulators):
+    visa_registry.close_all()
+    for emulator in emulators:
+        emulator.close()
+
+
+def profile():
+    tracing.enable()
+    bench, emulators, mg, sa = open_bench(0.0005)
+    mg.setup_MG(LO_FREQ, 0.0)
+    finder = IQ_min_finder(sa, qm=bench.open_qm(CONFIG))
+    finder.find_IQ_min(0.0, 0.0, 0.48, LO_FREQ)  # prints the summary
+    close_bench(emulators)
+    tracing.disable()
+    path = os.path.join(tempfile.mkdtemp(), "trace.json")
+    tracing.tracer.export_json(path)
+    tracing.tracer.export_csv(path[:-4] + "csv")
+    print("exported %s (%d bytes) and %s" % (path, os.path.getsize(path), path[:-4] + "csv"))
+
+
+def marker_reads_per_second(trace):
+    if trace:
+        tracing.enable()
+    bench, emulators, mg, sa = open_bench(0.0)
+    bench.open_qm(CONFIG)
+    sa.setup_spectrum_analyzer(center_freq=LO_FREQ, span=10, BW=100, points=1)
+    start = time.time()
+    for _ in range(NUM_READS):
+        sa.get_marker()
+    rate = NUM_READS / (time.time() - start)
+    session_type = type(sa.SA).__name__
+    close_bench(emulators)
+    tracing.disable()
+    return rate, session_type
+
+
+def main():
+    profile()
+    print("")
+    print("%10s %14s %14s" % ("tracing", "reads/second", "session"))
+    for trace in [False, True, False, True]:
+        rate, session_type = marker_reads_per_second(trace)
+        print("%10s %14.0f %14s" % ("enabled" if trace else "disabled", rate, session_type))
+
+
+if __name__ == "__main__":
+    main()
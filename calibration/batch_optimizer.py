@@ -0,0 +1,104 @@
+"""Batch optimization of hardware measurements with pipelined evaluation.
+QuadraticBatchSearch is a batch surrogate model for the LO leakage: it measures a whole grid at once, fits a
+paraboloid (calibration.quadratic_fit) and moves the grid to its minimum.
+PipelinedEvaluator measures a batch of points with set -> settle deadline -> acquire -> read. When the acquired
+measurement is frozen (e.g. a synchronized SA sweep, whose trace doesn't change until the next sweep), the next point
+of the batch is set before the current one is read, so the settling overlaps the read and the bookkeeping."""
+
+from time import time, sleep
+import numpy as np
+from scipy.optimize import OptimizeResult
+from calibration.quadratic_fit import dbm_to_mw, grid_points, fit_paraboloid, paraboloid_minimum
+
+
+class PipelinedEvaluator:
+    """Evaluates batches of points.
+    set_point(x) sets the hardware to x (e.g. the DC offsets), acquire() takes the measurement (e.g. restart
+    averaging and wait for a sweep) and read() returns its value (e.g. the SA marker).
+    settle_time [s] is the time to wait between set_point and acquire.
+    overlap=True sets the next point before reading the current one - only valid if the acquired measurement
+    doesn't change when the hardware does (a synchronized SA, N9010A_SA(synchronized=True)).
+    timer and sleeper may be replaced by a simulated clock"""
+
+    def __init__(self, set_point, acquire, read, settle_time=0.0, overlap=True, timer=time, sleeper=sleep):
+        self.set_point = set_point
+        self.acquire = acquire
+        self.read = read
+        self.settle_time = settle_time
+        self.overlap = overlap
+        self.timer = timer
+        self.sleeper = sleeper
+        self.num_evaluations = 0
+        self.num_batches = 0
+        self.settle_wait = 0.0  # time actually spent waiting for settling [s]
+        self.overlapped_time = 0.0  # settling time hidden behind reads [s]
+
+    def _wait_until(self, deadline):
+        remaining = deadline - self.timer()
+        if remaining > 0:
+            self.sleeper(remaining)
+            self.settle_wait += remaining
+        self.overlapped_time += self.settle_time - max(remaining, 0.0)
+
+    def __call__(self, points):
+        """Measure all points (a sequence of vectors). returns an array of the values"""
+        points = [np.asarray(p, dtype=float) for p in points]
+        values = np.zeros(len(points))
+        if not points:
+            return values
+        self.set_point(points[0])
+        deadline = self.timer() + self.settle_time
+        for i in range(len(points)):
+            self._wait_until(deadline)
+            self.acquire()
+            if self.overlap and i + 1 < len(points):
+                self.set_point(points[i + 1])
+                deadline = self.timer() + self.settle_time
+                values[i] = self.read()
+            else:
+                values[i] = self.read()
+                if i + 1 < len(points):
+                    self.set_point(points[i + 1])
+                    deadline = self.timer() + self.settle_time
+        self.num_evaluations += len(points)
+        self.num_batches += 1
+        return values
+
+    def report(self):
+        return "PipelinedEvaluator: %d evaluations in %d batches, %.2f s settling waited, %.2f s overlapped with reads" % (
+            self.num_evaluations, self.num_batches, self.settle_wait, self.overlapped_time)
+
+
+class QuadraticBatchSearch:
+    """LO leakage minimization over (I, Q) with a paraboloid fitted to batches of grid points.
+    evaluate_batch(points) returns the power [dBm] at a list of points"""
+
+    def __init__(self, evaluate_batch, points_per_axis=3):
+        self.evaluate_batch = evaluate_batch
+        self.points_per_axis = points_per_axis
+
+    def minimize(self, x0, scan_range=0.48, num_rounds=3, shrink_factor=4.0, minimum=None):
+        """Measure a grid of side scan_range around x0, move to the minimum of the fitted paraboloid and repeat
+        num_rounds times with a grid shrunk by shrink_factor. The center of each grid is the previous minimum, so
+        its measurement doubles as the check of the previous round, and the search stops early when it is
+        below minimum [dBm]. returns a scipy OptimizeResult"""
+        I0, Q0 = float(x0[0]), float(x0[1])
+        nfev = 0
+        power_0 = None
+        for nit in range(num_rounds + 1):
+            I_vec, Q_vec = grid_points(I0, Q0, scan_range, self.points_per_axis)
+            power = self.evaluate_batch(list(zip(I_vec, Q_vec)))
+            nfev += len(power)
+            power_0 = power[len(power) // 2]  # the center of the grid
+            if nit == num_rounds or (minimum is not None and power_0 <= minimum):
+                break
+            fit_min = paraboloid_minimum(fit_paraboloid(I_vec, Q_vec, dbm_to_mw(power)))
+            if fit_min is None:
+                # no minimum in the fit (e.g. only noise) - continue from the best measured point
+                I0, Q0 = I_vec[power.argmin()], Q_vec[power.argmin()]
+            else:
+                I0 = float(np.clip(fit_min[0], -0.5, 0.5 - 2 ** -16))
+                Q0 = float(np.clip(fit_min[1], -0.5, 0.5 - 2 ** -16))
+            scan_range = scan_range / shrink_factor
+        return OptimizeResult(x=np.array([I0, Q0]), fun=power_0, nit=nit, nfev=nfev, success=True,
+                              message="Completed %d rounds." % nit)
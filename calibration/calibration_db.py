@@ -0,0 +1,173 @@
+"""A persistent store of IQ mixer calibrations (I,Q offsets and the (g, phi) imbalance model) keyed by
+(mixer, LO frequency, LO power, IF), with nearest neighbour and interpolated lookup.
+The store is an sqlite file. Every calibration is kept with its timestamp, and lookups use the latest value of each
+field per key (so a calibration of only some fields, e.g. g and phi, keeps the earlier values of the others)."""
+
+import sqlite3
+import time
+import numpy as np
+from scipy.interpolate import LinearNDInterpolator
+from scipy.spatial import cKDTree
+from calibration.mixer_model import model_corr_mat
+
+FIELDS = ["I_offset", "Q_offset", "g", "phi"]
+
+
+class CalibrationDB:
+    """Calibration store. mixer is a name for the mixer / channel pair, e.g. "mixer1_I3_Q1".
+    Frequencies are in Hz, LO power in dBm"""
+
+    # scales [Hz] used to compare distances in LO and IF frequency for nearest neighbour lookup
+    LO_SCALE = 100e6
+    IF_SCALE = 10e6
+
+    def __init__(self, path):
+        self.connection = sqlite3.connect(path)
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS calibrations (mixer TEXT, lo_freq REAL, lo_power REAL, if_freq REAL, "
+            "I_offset REAL, Q_offset REAL, g REAL, phi REAL, timestamp REAL)")
+        self.connection.execute(
+            "CREATE INDEX IF NOT EXISTS calibrations_key ON calibrations (mixer, lo_power, lo_freq, if_freq)")
+        self.connection.commit()
+        self._tables = {}  # (mixer, lo_power):table of latest calibrations with its interpolators
+
+    def close(self):
+        self.connection.close()
+
+    def add(self, mixer, lo_freq, if_freq, lo_power=0.0, I_offset=None, Q_offset=None, g=None, phi=None,
+            timestamp=None):
+        """Store a calibration. Fields which were not calibrated can be left None"""
+        self.connection.execute(
+            "INSERT INTO calibrations VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (mixer, float(lo_freq), float(lo_power), float(if_freq), I_offset, Q_offset, g, phi,
+             time.time() if timestamp is None else timestamp))
+        self.connection.commit()
+        self._tables.pop((mixer, float(lo_power)), None)
+
+    def lo_powers(self, mixer):
+        """LO powers [dBm] with calibrations of the given mixer"""
+        return [row[0] for row in self.connection.execute(
+            "SELECT DISTINCT lo_power FROM calibrations WHERE mixer = ?", (mixer,))]
+
+    def history(self, mixer, lo_freq, if_freq, lo_power=0.0):
+        """All calibrations of a key as a list of (timestamp, I_offset, Q_offset, g, phi), oldest first"""
+        return list(self.connection.execute(
+            "SELECT timestamp, I_offset, Q_offset, g, phi FROM calibrations "
+            "WHERE mixer = ? AND lo_power = ? AND lo_freq = ? AND if_freq = ? ORDER BY timestamp",
+            (mixer, float(lo_power), float(lo_freq), float(if_freq))))
+
+    def _table(self, mixer, lo_power):
+        """Latest value of each field per (lo_freq, if_freq) of a mixer at a LO power, with the timestamps of the
+        calibrations they come from and lazily built interpolators"""
+        key = (mixer, float(lo_power))
+        if key not in self._tables:
+            latest = ("(SELECT %s FROM calibrations c WHERE c.mixer = p.mixer AND c.lo_power = p.lo_power AND "
+                      "c.lo_freq = p.lo_freq AND c.if_freq = p.if_freq AND c.%s IS NOT NULL "
+                      "ORDER BY c.timestamp DESC LIMIT 1)")
+            columns = [latest % (field, field) for field in FIELDS] + [latest % ("timestamp", field)
+                                                                       for field in FIELDS]
+            rows = self.connection.execute(
+                "SELECT p.lo_freq, p.if_freq, %s FROM (SELECT DISTINCT mixer, lo_power, lo_freq, if_freq "
+                "FROM calibrations WHERE mixer = ? AND lo_power = ?) p" % ", ".join(columns), key).fetchall()
+            if not rows:
+                raise Exception("CalibrationDB: no calibrations for mixer %s at LO power %f" % key)
+            data = np.array([[np.nan if v is None else v for v in row] for row in rows], dtype=float)
+            num_fields = len(FIELDS)
+            self._tables[key] = {"points": data[:, 0:2], "values": data[:, 2:2 + num_fields],
+                                 "timestamps": data[:, 2 + num_fields:], "interpolators": {}}
+        return self._tables[key]
+
+    def _nearest_lo_power(self, mixer, lo_power):
+        powers = self.lo_powers(mixer)
+        if not powers:
+            raise Exception("CalibrationDB: no calibrations for mixer %s" % mixer)
+        if lo_power is None:
+            return powers[0]
+        return min(powers, key=lambda p: abs(p - lo_power))
+
+    def _interpolator(self, table, field_idx):
+        """An interpolator f(lo_freq, if_freq) for one field, using only the points where it was calibrated"""
+        if field_idx not in table["interpolators"]:
+            valid = ~np.isnan(table["values"][:, field_idx])
+            points = table["points"][valid]
+            values = table["values"][valid, field_idx]
+            scale = np.array([self.LO_SCALE, self.IF_SCALE])
+            if len(values) == 0:
+                interpolator = None
+            else:
+                origin = points.mean(axis=0) / scale
+                singular_values, directions = np.linalg.svd(points / scale - origin)[1:]
+                if len(singular_values) < 2 or singular_values[1] <= 1e-9 * singular_values[0]:
+                    # the points are on a line (a single IF, a single LO or any other line), which has no
+                    # triangulation - interpolate along the line, at the projection of the requested point on it
+                    x = np.dot(points / scale - origin, directions[0])
+                    order = np.argsort(x)
+                    x, y = x[order], values[order]
+
+                    def interpolator(lo, if_, x=x, y=y, origin=origin, direction=directions[0], scale=scale):
+                        return np.interp(np.dot(np.array([lo, if_]) / scale - origin, direction), x, y)
+                else:
+                    linear = LinearNDInterpolator(points / scale, values)
+                    tree = cKDTree(points / scale)
+
+                    def interpolator(lo, if_, linear=linear, tree=tree, values=values, scale=scale):
+                        value = linear(np.array([lo, if_]) / scale)[0]
+                        if np.isnan(value):  # outside the convex hull of the calibrated points
+                            value = values[tree.query(np.array([lo, if_]) / scale)[1]]
+                        return value
+            table["interpolators"][field_idx] = interpolator
+        return table["interpolators"][field_idx]
+
+    def lookup(self, mixer, lo_freq, if_freq, lo_power=None, method="linear"):
+        """Get a calibration for any LO frequency and IF.
+        method="nearest" returns the nearest calibrated point, method="linear" interpolates between calibrated
+        points (and returns the nearest point outside them). lo_power=None or a power which was not calibrated
+        uses the nearest calibrated LO power.
+        returns a dict with I_offset, Q_offset, g, phi (None for fields never calibrated), lo_power and, for
+        method="nearest", "points" and "timestamps": dicts of field:(lo_freq, if_freq) and field:timestamp of the
+        calibration each field comes from (fields may come from different points)"""
+
+        lo_power = self._nearest_lo_power(mixer, lo_power)
+        table = self._table(mixer, lo_power)
+        ret = {"lo_power": lo_power}
+        if method == "nearest":
+            scale = np.array([self.LO_SCALE, self.IF_SCALE])
+            ret["points"] = {}
+            ret["timestamps"] = {}
+            for idx, field in enumerate(FIELDS):
+                valid = np.flatnonzero(~np.isnan(table["values"][:, idx]))
+                if len(valid) == 0:
+                    ret[field] = None
+                    continue
+                distance = np.sum(((table["points"][valid] - [lo_freq, if_freq]) / scale) ** 2, axis=1)
+                nearest = valid[distance.argmin()]
+                ret[field] = float(table["values"][nearest, idx])
+                ret["points"][field] = tuple(table["points"][nearest].tolist())
+                ret["timestamps"][field] = float(table["timestamps"][nearest, idx])
+        elif method == "linear":
+            for idx, field in enumerate(FIELDS):
+                interpolator = self._interpolator(table, idx)
+                ret[field] = None if interpolator is None else float(interpolator(lo_freq, if_freq))
+        else:
+            raise Exception("CalibrationDB.lookup: unknown method %s" % method)
+        return ret
+
+    def correction_matrix(self, mixer, lo_freq, if_freq, lo_power=None, method="linear"):
+        """The correction matrix [V_00, V_01, V_10, V_11] for the given LO frequency and IF"""
+        cal = self.lookup(mixer, lo_freq, if_freq, lo_power, method)
+        missing = [field for field in ["g", "phi"] if cal[field] is None]
+        if missing:
+            raise Exception("CalibrationDB.correction_matrix: no %s calibration of mixer %s at LO power %f, so no "
+                            "correction matrix for LO %f MHz, IF %f MHz" % (
+                                " and ".join(missing), mixer, cal["lo_power"], lo_freq / 1e6, if_freq / 1e6))
+        return model_corr_mat(cal["g"], cal["phi"]).flatten().tolist()
+
+    def corrections_dict(self, mixer, lo_if_pairs, lo_power=None, method="linear"):
+        """Corrections for ConfigGenerator.add_mixer: {(lo_freq, if_freq): [V_00, V_01, V_10, V_11]}"""
+        return {(lo_freq, if_freq): self.correction_matrix(mixer, lo_freq, if_freq, lo_power, method)
+                for (lo_freq, if_freq) in lo_if_pairs}
+
+    def set_mixer_correction(self, qm, qm_mixer_name, mixer, lo_freq, if_freq, lo_power=None, method="linear"):
+        """Set the correction matrix of a mixer in a running quantum machine from the store"""
+        qm.set_mixer_correction(qm_mixer_name, int(if_freq), int(lo_freq),
+                                tuple(self.correction_matrix(mixer, lo_freq, if_freq, lo_power, method)))
@@ -0,0 +1,148 @@
+"""Binary file format for raw ADC captures, read back with np.memmap.
+Layout: the magic string, a little-endian uint32 with the length of the JSON header, the header (padded with spaces
+so the data starts at a multiple of 64 bytes) and then the captures as an array of shape
+(num_captures, num_channels, samples). The number of captures follows from the file size, so captures can be
+appended to an existing file.
+The header holds dtype, channels (e.g. {"I": 2, "Q": 1} - channel name to OPX input), samples and the metadata
+(lo_freq, if_freq, pulse_length, timestamp and anything else passed to CaptureWriter). All the captures of a file
+share the metadata, so appending captures with other metadata is refused.
+Usage as a converter of ASCII captures (I.txt, Q.txt): python -m calibration.capture_file I.txt Q.txt out.iqcap"""
+
+import json
+import os
+import sys
+import struct
+from datetime import datetime
+import numpy as np
+
+MAGIC = b"IQCAP\x001\n"
+ALIGNMENT = 64
+DTYPES = {"int16": "<i2", "float32": "<f4"}
+
+
+def _read_header(f):
+    if f.read(len(MAGIC)) != MAGIC:
+        raise Exception("capture_file: %s is not a capture file" % f.name)
+    header_len = struct.unpack("<I", f.read(4))[0]
+    header = json.loads(f.read(header_len).decode())
+    header["data_offset"] = len(MAGIC) + 4 + header_len
+    return header
+
+
+class CaptureWriter:
+    """Records captures to a new capture file (or appends to an existing one with the same format and metadata).
+    channels is a dict of channel name -> OPX input number, dtype is "int16" (ADC counts) or "float32"."""
+
+    def __init__(self, path, samples, channels=None, dtype="int16", lo_freq=None, if_freq=None, pulse_length=None,
+                 **metadata):
+        if dtype not in DTYPES:
+            raise Exception("CaptureWriter: dtype must be one of %s" % list(DTYPES))
+        self.path = path
+        self.channels = channels if channels is not None else {"I": 2, "Q": 1}
+        self.samples = samples
+        self.dtype = np.dtype(DTYPES[dtype])
+        if os.path.exists(path) and os.path.getsize(path) > 0:
+            with open(path, "rb") as f:
+                header = _read_header(f)
+            if header["dtype"] != dtype or header["samples"] != samples or header["channels"] != self.channels:
+                raise Exception("CaptureWriter: %s exists with a different format" % path)
+            metadata.update(lo_freq=lo_freq, if_freq=if_freq, pulse_length=pulse_length)
+            for name, value in sorted(metadata.items()):
+                value = json.loads(json.dumps(value))  # as it would be stored
+                if header.get(name) != value:
+                    raise Exception("CaptureWriter: %s holds captures with %s=%s, not %s - use another file" %
+                                    (path, name, header.get(name), value))
+            self.file = open(path, "ab")
+        else:
+            header = {"version": 1, "dtype": dtype, "channels": self.channels, "samples": samples,
+                      "lo_freq": lo_freq, "if_freq": if_freq, "pulse_length": pulse_length,
+                      "timestamp": datetime.now().isoformat()}
+            header.update(metadata)
+            encoded = json.dumps(header).encode()
+            padding = -(len(MAGIC) + 4 + len(encoded)) % ALIGNMENT
+            encoded += b" " * padding
+            self.file = open(path, "wb")
+            self.file.write(MAGIC + struct.pack("<I", len(encoded)) + encoded)
+
+    def append(self, captures):
+        """Append a capture of shape (num_channels, samples) or several, shape (n, num_channels, samples).
+        The order of the channels is that of the channels dict"""
+        captures = np.asarray(captures)
+        if captures.shape[-2:] != (len(self.channels), self.samples):
+            raise Exception("CaptureWriter.append: expected captures of shape (%d, %d), got %s" %
+                            (len(self.channels), self.samples, captures.shape))
+        if self.dtype.kind == "i":
+            if not np.array_equal(captures, np.round(captures)):
+                raise Exception("CaptureWriter.append: int16 captures must hold integer ADC counts")
+            if np.abs(captures).max() > np.iinfo(self.dtype).max:
+                raise Exception("CaptureWriter.append: values out of the int16 range")
+        self.file.write(captures.astype(self.dtype).tobytes())
+
+    def close(self):
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+class CaptureFile:
+    """A capture file opened for reading. data is a read only np.memmap of shape (num_captures, num_channels,
+    samples), so only the parts of the file which are used are read from disk."""
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as f:
+            self.metadata = _read_header(f)
+        self.channels = self.metadata["channels"]
+        self.samples = self.metadata["samples"]
+        self.dtype = np.dtype(DTYPES[self.metadata["dtype"]])
+        capture_size = len(self.channels) * self.samples * self.dtype.itemsize
+        num_captures = (os.path.getsize(path) - self.metadata["data_offset"]) // capture_size
+        if num_captures == 0:
+            self.data = np.zeros((0, len(self.channels), self.samples), dtype=self.dtype)
+        else:
+            self.data = np.memmap(path, dtype=self.dtype, mode="r", offset=self.metadata["data_offset"],
+                                  shape=(num_captures, len(self.channels), self.samples))
+
+    def __len__(self):
+        return self.data.shape[0]
+
+    def __getitem__(self, index):
+        return self.data[index]
+
+    def channel(self, name):
+        """Samples of channel name in all captures, shape (num_captures, samples) (a view of the memmap)"""
+        return self.data[:, list(self.channels).index(name), :]
+
+    def batches(self, batch_size=100, channels=("I", "Q")):
+        """Generator of the captures in batches of batch_size, as a list of arrays of shape (n, samples) for each
+        of channels. Only one batch at a time is read into memory"""
+        idx = [list(self.channels).index(name) for name in channels]
+        for start in range(0, len(self), batch_size):
+            batch = np.asarray(self.data[start:start + batch_size], dtype=float)
+            yield [batch[:, i, :] for i in idx]
+
+
+def convert_txt(I_path, Q_path, out_path, dtype="int16", channels=None, **metadata):
+    """Convert a capture saved as ASCII files (one sample per line, as in I.txt, Q.txt) to a capture file.
+    A file with several columns is taken as one capture per column."""
+    I = np.loadtxt(I_path, ndmin=2).T
+    Q = np.loadtxt(Q_path, ndmin=2).T
+    if I.shape != Q.shape:
+        raise Exception("convert_txt: %s and %s have different shapes" % (I_path, Q_path))
+    with CaptureWriter(out_path, I.shape[1], channels, dtype, **metadata) as writer:
+        writer.append(np.stack([I, Q], axis=1))
+    return CaptureFile(out_path)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 4:
+        print("usage: python -m calibration.capture_file I.txt Q.txt out.iqcap")
+        sys.exit(1)
+    capture = convert_txt(*sys.argv[1:])
+    print("%s: %d captures of %d samples, %d bytes (ASCII: %d bytes)" %
+          (capture.path, len(capture), capture.samples, os.path.getsize(capture.path),
+           os.path.getsize(sys.argv[1]) + os.path.getsize(sys.argv[2])))
@@ -0,0 +1,45 @@
+"""Demodulation of raw ADC captures at a few frequencies (single DFT bins) instead of full FFTs.
+Coefficients have the same normalization as np.fft.fft, and with snap_to_bins=True they are exactly the FFT bins
+selected by np.abs(np.fft.fftfreq(N, dt) - f).argmin()."""
+
+from functools import lru_cache
+import numpy as np
+
+
+@lru_cache(maxsize=32)
+def phasor_table(pulse_length, freqs, dt=1e-9, snap_to_bins=True):
+    """Table exp(-2j*pi*f*t) of shape (pulse_length, len(freqs)), cached per (pulse_length, freqs, dt).
+    freqs must be a tuple. If snap_to_bins is True the frequencies are rounded to the nearest FFT bin"""
+    f = np.array(freqs, dtype=float)
+    if snap_to_bins:
+        f = np.round(f * pulse_length * dt) / (pulse_length * dt)
+    table = np.exp(-2j * np.pi * np.outer(np.arange(pulse_length) * dt, f))
+    table.flags.writeable = False
+    return table
+
+
+def demodulate(captures, freqs, dt=1e-9, snap_to_bins=True):
+    """Fourier coefficients of captures at freqs [Hz].
+    captures has shape (..., pulse_length) (a batch of captures), the result has shape (..., len(freqs))"""
+    captures = np.asarray(captures)
+    table = phasor_table(captures.shape[-1], tuple(float(f) for f in np.atleast_1d(freqs)), dt, snap_to_bins)
+    return captures @ table
+
+
+def sideband_coefficients(I, Q, if_freqs, M_i, dt=1e-9):
+    """Fourier coefficients of the positive and negative sidebands of captures I, Q (shape (..., pulse_length)),
+    for s = I - 1j*Q, before and after applying the demodulation calibration matrix M_i to (I, Q).
+    returns an array of shape (..., len(if_freqs), 4) with (c_p, c_n, c_p_cal, c_n_cal) for each IF"""
+    I = np.asarray(I, dtype=float)
+    Q = np.asarray(Q, dtype=float)
+    I = I - np.mean(I, axis=-1, keepdims=True)
+    Q = Q - np.mean(Q, axis=-1, keepdims=True)
+    if_freqs = np.atleast_1d(if_freqs)
+    freqs = np.concatenate([if_freqs, -if_freqs])
+    # demodulation is linear, so the calibrated coefficients follow from the demodulated I and Q
+    d_I = demodulate(I, freqs, dt)
+    d_Q = demodulate(Q, freqs, dt)
+    f_s = d_I - 1j * d_Q
+    f_s2 = (M_i[0][0] * d_I + M_i[0][1] * d_Q) - 1j * (M_i[1][0] * d_I + M_i[1][1] * d_Q)
+    K = len(if_freqs)
+    return np.stack([f_s[..., :K], f_s[..., K:], f_s2[..., :K], f_s2[..., K:]], axis=-1)
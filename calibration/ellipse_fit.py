@@ -0,0 +1,100 @@
+"""Least squares fit of the IQ mixer response to a DC phasor (I, Q) = offset + amp*(cos(theta), sin(theta)).
+The output voltage follows v**2 = A*cos**2 + B*sin**2 + C*sin(2*theta) + D*cos + E*sin + F, which is linear in the
+coefficients, so all the angular points are used in one linear fit (instead of the six special angles).
+With the model of calibMatrixFind_model.py (gains absorbing amp):
+    g_I = sqrt(A), g_Q = sqrt(B), phi = arcsin(C/(g_I*g_Q))
+and the residual offset (offset - null) is delta = amp*G^-1*[D, E]/2 with G = [[A, C], [C, B]].
+Since cos**2 + sin**2 = 1, F can't be separated from A and B by the fit. It is the leakage of the residual offset,
+F = [D, E]*G^-1*[D, E]/4, and is solved for self consistently (a noise floor would bias g_I, g_Q slightly)."""
+
+import numpy as np
+
+PARAMETERS = ["g_I", "g_Q", "phi", "delta_I", "delta_Q"]
+F_ITERATIONS = 8
+
+
+def design_matrix(theta):
+    """Columns cos**2, sin**2, sin(2*theta), cos, sin of the angles theta"""
+    theta = np.asarray(theta, dtype=float)
+    c, s = np.cos(theta), np.sin(theta)
+    return np.column_stack([c ** 2, s ** 2, np.sin(2 * theta), c, s])
+
+
+def full_coefficients(fitted):
+    """The coefficients A..F (shape (6,) or (6, n)) from the fitted A+F, B+F, C, D, E"""
+    A_F, B_F, C, D, E = fitted
+    F = np.zeros_like(np.asarray(C, dtype=float))
+    for _ in range(F_ITERATIONS):
+        A, B = A_F - F, B_F - F
+        det = A * B - C ** 2
+        F = (B * D ** 2 - 2 * C * D * E + A * E ** 2) / (4 * det)
+    return np.array([A_F - F, B_F - F, C, D, E, F])
+
+
+def coefficients_to_parameters(coefficients, amp=1.0):
+    """Model parameters from the coefficients A..F (shape (6,) or (6, n)). returns an array (5,) or (5, n) of
+    g_I, g_Q, phi, delta_I, delta_Q"""
+    A, B, C, D, E, F = coefficients
+    g_I = np.sqrt(np.abs(A))
+    g_Q = np.sqrt(np.abs(B))
+    phi = np.arcsin(np.clip(C / (g_I * g_Q), -1.0, 1.0))
+    det = A * B - C ** 2
+    delta_I = amp * (B * D - C * E) / (2 * det)
+    delta_Q = amp * (A * E - C * D) / (2 * det)
+    return np.array([g_I, g_Q, phi, delta_I, delta_Q])
+
+
+def fit_ellipse(theta, volt, amp=1.0):
+    """Fit the response volt (voltages, shape (N,) or a batch of responses (M, N)) measured at angles theta (N,).
+    amp is the phasor amplitude (in the units of the offsets) used for the residual offset.
+    returns a dict with g_I, g_Q, phi, delta_I, delta_Q, their standard errors (keys with an "_err" suffix),
+    g (=g_Q/g_I, the scaling of model_corr_mat), the coefficients A..F and the rms residual of v**2"""
+    X = design_matrix(theta)
+    V2 = np.asarray(volt, dtype=float).T ** 2  # (N,) or (N, M)
+    fitted, _, rank, _ = np.linalg.lstsq(X, V2, rcond=None)
+    if rank < X.shape[1]:
+        raise Exception("fit_ellipse: at least 5 distinct angles are needed")
+    residuals = V2 - X @ fitted
+    dof = max(X.shape[0] - X.shape[1], 1)
+    sigma2 = np.sum(residuals ** 2, axis=0) / dof
+    fitted_cov = np.linalg.inv(X.T @ X)  # times sigma2
+
+    def parameters(c):
+        return coefficients_to_parameters(full_coefficients(c), amp)
+
+    # propagate the errors of the fitted coefficients with a numerical jacobian
+    params = parameters(fitted)
+    jacobian = []
+    for k in range(X.shape[1]):
+        step = 1e-6 * np.maximum(np.abs(fitted[k]), 1e-12)
+        plus, minus = np.array(fitted, dtype=float), np.array(fitted, dtype=float)
+        plus[k] += step
+        minus[k] -= step
+        jacobian.append((parameters(plus) - parameters(minus)) / (2 * step))
+    jacobian = np.stack(jacobian, axis=1)  # (5, 5) or (5, 5, M)
+    if jacobian.ndim == 2:
+        params_var = sigma2 * np.einsum("ik,kl,il->i", jacobian, fitted_cov, jacobian)
+    else:
+        params_var = sigma2 * np.einsum("ikm,kl,ilm->im", jacobian, fitted_cov, jacobian)
+
+    ret = {"coefficients": full_coefficients(fitted), "residual_rms": np.sqrt(sigma2)}
+    for name, value, var in zip(PARAMETERS, params, params_var):
+        ret[name] = value
+        ret[name + "_err"] = np.sqrt(var)
+    ret["g"] = ret["g_Q"] / ret["g_I"]
+    ret["g_err"] = ret["g"] * np.sqrt((ret["g_I_err"] / ret["g_I"]) ** 2 + (ret["g_Q_err"] / ret["g_Q"]) ** 2)
+    return ret
+
+
+def model_volt(theta, fit):
+    """The fitted response at angles theta"""
+    theta = np.asarray(theta, dtype=float)
+    A, B, C, D, E, F = fit["coefficients"]
+    c, s = np.cos(theta), np.sin(theta)
+    v2 = A * c ** 2 + B * s ** 2 + C * np.sin(2 * theta) + D * c + E * s + F
+    return np.sqrt(np.clip(v2, 0.0, None))
+
+
+def format_fit(fit):
+    """One line summary of a (single response) fit"""
+    return ", ".join("%s=%.5g+-%.2g" % (name, fit[name], fit[name + "_err"]) for name in PARAMETERS + ["g"])
@@ -0,0 +1,87 @@
+"""Memoization of hardware measurements for optimizers and scans.
+Nelder-Mead and shrinking scans often ask for points which differ by less than the hardware resolution, i.e. for
+the same hardware state. QuantizedEvaluationCache quantizes the point to the hardware resolution and serves
+repeated points from the cache. Entries older than max_age are evicted, so slow drifts don't poison the cache."""
+
+from collections import OrderedDict
+from time import time
+import numpy as np
+from calibration.mixer_model import model_corr_mat
+
+DC_OFFSET_LSB = 2 ** -16  # resolution of the OPX DC offsets [V]
+CORRECTION_LSB = 2 ** -16  # resolution of the elements of the OPX mixer correction matrices
+
+
+def quantize(x, lsb):
+    """The point x as a tuple of integer multiples of lsb"""
+    return tuple(int(v) for v in np.round(np.asarray(x, dtype=float).flatten() / lsb))
+
+
+def dc_offset_key(IQ):
+    """Cache key of a point (I, Q) of DC offsets"""
+    return quantize(IQ, DC_OFFSET_LSB)
+
+
+def correction_key(corr_params):
+    """Cache key of a point (g, phi) - the correction matrix it sets, at the resolution of the hardware"""
+    return quantize(model_corr_mat(*corr_params), CORRECTION_LSB)
+
+
+class QuantizedEvaluationCache:
+    """Wraps measure(x, *args, **kwargs) with a cache keyed by key(x) (dc_offset_key by default).
+    The extra arguments are not part of the key - they are assumed to be the same in all calls.
+    Cached values are used for at most max_age seconds (None - no limit).
+    timer is the clock used for the ages (a simulated clock can be given)"""
+
+    def __init__(self, measure, key=dc_offset_key, max_age=30.0, timer=time):
+        self.measure = measure
+        self.key = key
+        self.max_age = max_age
+        self.timer = timer
+        self._entries = OrderedDict()  # key: (time, value), oldest first
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.measure_time = 0.0  # time spent in measure [s]
+
+    def __call__(self, x, *args, **kwargs):
+        now = self.timer()
+        self.evict(now)
+        k = self.key(x)
+        if k in self._entries:
+            self.hits += 1
+            return self._entries[k][1]
+        self.misses += 1
+        value = self.measure(x, *args, **kwargs)
+        end = self.timer()
+        self.measure_time += end - now
+        self._entries[k] = (end, value)
+        return value
+
+    def evict(self, now=None):
+        """Remove the entries older than max_age"""
+        if self.max_age is None:
+            return
+        if now is None:
+            now = self.timer()
+        while self._entries:
+            k, (t, value) = next(iter(self._entries.items()))
+            if now - t <= self.max_age:
+                break
+            del self._entries[k]
+            self.evictions += 1
+
+    def clear(self):
+        """Remove all entries (e.g. after changing the setup)"""
+        self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def report(self):
+        """Summary of the hardware reads saved by the cache"""
+        calls = self.hits + self.misses
+        mean_time = self.measure_time / self.misses if self.misses else 0.0
+        return "QuantizedEvaluationCache: %d calls, %d hardware reads, %d saved (%.1f%%, ~%.1f s), %d evicted" % (
+            calls, self.misses, self.hits, 100.0 * self.hits / calls if calls else 0.0, self.hits * mean_time,
+            self.evictions)
@@ -0,0 +1,168 @@
+"""Calibrate an IQ mixer over a grid of LO frequencies and IFs.
+The LO leakage (I,Q DC offsets) depends only on the LO, so it is calibrated once per LO, and the (g, phi) imbalance
+is calibrated at every (LO, IF) point. The LO is the outer loop (retuning the MG, and on the OPX reopening a quantum
+machine for the new LO, is the expensive step) and the LOs are visited in monotonic order. The IFs are visited in
+a snake order so consecutive points are always neighbours, and every calibration starts from the nearest point
+already calibrated.
+Progress is checkpointed to a JSON file after every point, so an interrupted sweep resumes where it stopped."""
+
+import json
+import os
+from time import time
+import numpy as np
+from calibration.mixer_model import model_corr_mat
+
+# scales [Hz] used to compare distances in LO and IF frequency when looking for the nearest calibrated point
+LO_SCALE = 100e6
+IF_SCALE = 10e6
+
+
+def sweep_order(lo_freqs, if_freqs, start_lo=None):
+    """Order of the (lo_freq, if_freq) points: LO in the outer loop, sorted and starting from the end nearest to
+    start_lo (the current LO, if known), IFs in a snake order (ascending, then descending for the next LO...)"""
+    lo_freqs = sorted(lo_freqs)
+    if start_lo is not None and abs(lo_freqs[-1] - start_lo) < abs(lo_freqs[0] - start_lo):
+        lo_freqs = lo_freqs[::-1]
+    if_freqs = sorted(if_freqs)
+    order = []
+    for idx, lo_freq in enumerate(lo_freqs):
+        for if_freq in (if_freqs if idx % 2 == 0 else if_freqs[::-1]):
+            order.append((lo_freq, if_freq))
+    return order
+
+
+def _key(*freqs):
+    """JSON key of a LO frequency or a (lo_freq, if_freq) point"""
+    return ",".join("%r" % float(f) for f in freqs)
+
+
+class CalibrationSweep:
+    """Calibration of a mixer over the grid lo_freqs x if_freqs [Hz].
+    The hardware is driven by callbacks:
+        set_lo(lo_freq) - retune the LO (and whatever depends on it, e.g. reopen the quantum machine)
+        calibrate_offsets(lo_freq, guess) - returns the (I_offset, Q_offset) nulling the LO leakage
+        calibrate_imbalance(lo_freq, if_freq, offsets, guess) - returns (g, phi) nulling the image sideband
+    guess is the result at the nearest calibrated point or None if there is none yet (a cold start).
+    If checkpoint_path is given the results are saved there after every point and loaded when the sweep starts.
+    If db (a CalibrationDB) is given every point is also stored in it as mixer_name at lo_power.
+    timer is the clock used for the time report (a simulated clock can be given)."""
+
+    def __init__(self, lo_freqs, if_freqs, set_lo, calibrate_offsets, calibrate_imbalance, checkpoint_path=None,
+                 db=None, mixer_name=None, lo_power=0.0, verbose=True, timer=time):
+        if db is not None and mixer_name is None:
+            raise Exception("CalibrationSweep: a mixer_name is needed to store calibrations in a CalibrationDB")
+        self.lo_freqs = [float(f) for f in lo_freqs]
+        self.if_freqs = [float(f) for f in if_freqs]
+        self.set_lo = set_lo
+        self.calibrate_offsets = calibrate_offsets
+        self.calibrate_imbalance = calibrate_imbalance
+        self.checkpoint_path = checkpoint_path
+        self.db = db
+        self.mixer_name = mixer_name
+        self.lo_power = lo_power
+        self.verbose = verbose
+        self.timer = timer
+        self.offsets = {}  # lo_freq:(I_offset, Q_offset)
+        self.imbalance = {}  # (lo_freq, if_freq):(g, phi)
+        self.times = {"set_lo": 0.0, "offsets": 0.0, "imbalance": 0.0}
+        self.num_retunes = 0
+        self.num_resumed = 0
+        if checkpoint_path is not None and os.path.exists(checkpoint_path):
+            self.load_checkpoint()
+
+    def load_checkpoint(self):
+        """Load the results saved in the checkpoint file. It must be a checkpoint of the same grid"""
+        with open(self.checkpoint_path) as f:
+            checkpoint = json.load(f)
+        for name in ["lo_freqs", "if_freqs"]:
+            if sorted(checkpoint[name]) != sorted(getattr(self, name)):
+                raise Exception("CalibrationSweep.load_checkpoint: %s is a checkpoint of %s=%s, not %s - use another "
+                                "checkpoint file" % (self.checkpoint_path, name, checkpoint[name],
+                                                     getattr(self, name)))
+        for key, offsets in checkpoint["offsets"].items():
+            self.offsets[float(key)] = tuple(offsets)
+        for key, imbalance in checkpoint["imbalance"].items():
+            lo_freq, if_freq = [float(f) for f in key.split(",")]
+            self.imbalance[(lo_freq, if_freq)] = tuple(imbalance)
+        self.num_resumed = len(self.imbalance)
+        if self.verbose:
+            print("CalibrationSweep: resuming from %s with %d calibrated points" % (self.checkpoint_path,
+                                                                                   self.num_resumed))
+
+    def save_checkpoint(self):
+        """Save the results to the checkpoint file (written to a temporary file first, so an interruption never
+        leaves a partial checkpoint)"""
+        checkpoint = {
+            "lo_freqs": self.lo_freqs,
+            "if_freqs": self.if_freqs,
+            "offsets": {_key(lo_freq): list(v) for lo_freq, v in self.offsets.items()},
+            "imbalance": {_key(*point): list(v) for point, v in self.imbalance.items()}
+        }
+        tmp_path = self.checkpoint_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(checkpoint, f, indent=1)
+        os.replace(tmp_path, self.checkpoint_path)
+
+    def _nearest_offsets(self, lo_freq):
+        if not self.offsets:
+            return None
+        return self.offsets[min(self.offsets.keys(), key=lambda f: abs(f - lo_freq))]
+
+    def _nearest_imbalance(self, lo_freq, if_freq):
+        if not self.imbalance:
+            return None
+        points = list(self.imbalance.keys())
+        distance = [((lo - lo_freq) / LO_SCALE) ** 2 + ((if_ - if_freq) / IF_SCALE) ** 2 for lo, if_ in points]
+        return self.imbalance[points[int(np.argmin(distance))]]
+
+    def _timed(self, stage, function, *args):
+        start = self.timer()
+        ret = function(*args)
+        self.times[stage] += self.timer() - start
+        return ret
+
+    def run(self, start_lo=None):
+        """Calibrate all the points which are not calibrated yet.
+        start_lo is the current LO frequency [Hz], if known, to start from the nearer end of the grid.
+        returns the corrections dict (see corrections_dict)"""
+        current_lo = None
+        for lo_freq, if_freq in sweep_order(self.lo_freqs, self.if_freqs, start_lo):
+            if (lo_freq, if_freq) in self.imbalance:
+                continue
+            if lo_freq != current_lo:
+                self._timed("set_lo", self.set_lo, lo_freq)
+                current_lo = lo_freq
+                self.num_retunes += 1
+            if lo_freq not in self.offsets:
+                offsets = self._timed("offsets", self.calibrate_offsets, lo_freq, self._nearest_offsets(lo_freq))
+                self.offsets[lo_freq] = tuple(float(v) for v in offsets)
+                if self.verbose:
+                    print("LO %f MHz: I_offset=%f, Q_offset=%f" % ((lo_freq / 1e6,) + self.offsets[lo_freq]))
+                if self.checkpoint_path is not None:
+                    self.save_checkpoint()
+            imbalance = self._timed("imbalance", self.calibrate_imbalance, lo_freq, if_freq, self.offsets[lo_freq],
+                                    self._nearest_imbalance(lo_freq, if_freq))
+            self.imbalance[(lo_freq, if_freq)] = tuple(float(v) for v in imbalance)
+            if self.verbose:
+                print("LO %f MHz, IF %f MHz: g=%f, phi=%f" % ((lo_freq / 1e6, if_freq / 1e6) +
+                                                              self.imbalance[(lo_freq, if_freq)]))
+            if self.db is not None:
+                I_offset, Q_offset = self.offsets[lo_freq]
+                g, phi = self.imbalance[(lo_freq, if_freq)]
+                self.db.add(self.mixer_name, lo_freq, if_freq, self.lo_power, I_offset, Q_offset, g, phi)
+            if self.checkpoint_path is not None:
+                self.save_checkpoint()
+        return self.corrections_dict()
+
+    def corrections_dict(self):
+        """Corrections of the calibrated points for ConfigGenerator.add_mixer:
+        {(lo_freq, if_freq): [V_00, V_01, V_10, V_11]}"""
+        return {point: model_corr_mat(g, phi).flatten().tolist() for point, (g, phi) in self.imbalance.items()}
+
+    def report(self):
+        """Get a summary of the sweep"""
+        lines = ["CalibrationSweep: %d of %d points calibrated (%d resumed from a checkpoint), %d LO retunes" % (
+            len(self.imbalance), len(self.lo_freqs) * len(self.if_freqs), self.num_resumed, self.num_retunes)]
+        for stage in ["set_lo", "offsets", "imbalance"]:
+            lines.append("%10s: %f seconds" % (stage, self.times[stage]))
+        return "\n".join(lines)
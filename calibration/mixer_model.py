@@ -0,0 +1,12 @@
+"""Model of IQ mixer gain and phase imbalance (see Naftali's OneNote documentation)"""
+
+import numpy as np
+
+
+def model_corr_mat(g, phi):
+    """Correction matrix for a relative gain g and phase imbalance phi [rad]"""
+    scaling_m = np.array([[g, 0], [0, 1]])
+    rot_m = (1 / (np.cos(phi / 2) ** 2 - np.sin(phi / 2) ** 2)) * np.array(
+        [[np.cos(phi / 2), -np.sin(phi / 2)], [-np.sin(phi / 2), np.cos(phi / 2)]])
+
+    return scaling_m @ rot_m
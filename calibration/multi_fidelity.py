@@ -0,0 +1,110 @@
+"""Nelder-Mead minimization of an SA reading in stages of increasing measurement fidelity.
+Early stages only need to locate the basin, so they use a wide RBW and no averaging (fast, noisy sweeps); later
+stages restart the simplex around the best point with a smaller simplex, narrower RBW and more averages.
+A stage with the same SA setting as the previous one keeps the previous result if it ends with a higher reading.
+Each stage reconfigures the SA through N9010A_SA.setup_spectrum_analyzer and setup_averaging."""
+
+from time import time
+import numpy as np
+from scipy import optimize
+
+# BW [Hz], number of averages, fixed wait per reading [s] (when the SA is not synchronized), initial simplex size,
+# the Nelder-Mead tolerances and optionally the maximum number of evaluations (maxfev) of each stage.
+# Near the null the leakage changes by a few dB within xatol and the readings approach the noise floor, so the final
+# setting is used by two stages: the first often stops on a simplex flattened by noise, and the second polishes the
+# result with a smaller simplex and tighter tolerances (keeping the first result if it doesn't improve on it)
+DEFAULT_STAGES = [
+    {"BW": 3000, "num_averages": 1, "wait_time": 0.1, "simplex_size": 0.04, "xatol": 2e-3, "fatol": 3.0},
+    {"BW": 300, "num_averages": 1, "wait_time": 0.3, "simplex_size": 8e-3, "xatol": 5e-4, "fatol": 2.0},
+    {"BW": 100, "num_averages": 3, "wait_time": 1.0, "simplex_size": 1e-3, "xatol": 1e-4, "fatol": 1.0, "maxfev": 100},
+    {"BW": 100, "num_averages": 3, "wait_time": 1.0, "simplex_size": 2e-4, "xatol": 2e-5, "fatol": 0.5, "maxfev": 60},
+]
+
+
+def initial_simplex(x0, size):
+    """A simplex of n+1 points with edges of length size along the axes, centered on x0"""
+    x0 = np.asarray(x0, dtype=float)
+    simplex = np.vstack([x0, x0 + size * np.eye(len(x0))])
+    return simplex - (simplex.mean(axis=0) - x0)
+
+
+class MultiFidelityMinimizer:
+    """Minimizes measure(x, wait_time), an SA reading (dBm), in the stages stages (see DEFAULT_STAGES).
+    bounds is an optional (low, high) clip applied to each simplex (e.g. the DAC range for I,Q offsets).
+    timer is the clock used for the time report (a simulated clock can be given).
+    on_stage(stage) is called after the SA is configured for each stage (e.g. to clear a cache of measurements)"""
+
+    def __init__(self, SA, measure, stages=None, bounds=(-0.5, 0.5 - 2 ** -16), verbose=False, timer=time,
+                 on_stage=None):
+        self.SA = SA
+        self.measure = measure
+        self.stages = stages if stages is not None else DEFAULT_STAGES
+        self.bounds = bounds
+        self.verbose = verbose
+        self.timer = timer
+        self.on_stage = on_stage
+        self.stage_reports = []
+
+    def configure_sa(self, stage):
+        """Set the RBW and averaging of stage (values which are already set are not written)"""
+        self.SA.setup_spectrum_analyzer(BW=stage["BW"])
+        # averaging stays on, so restart_averaging in the measurement doesn't change the trace type
+        self.SA.setup_averaging(True, stage["num_averages"])
+
+    def minimize(self, x0):
+        """Run all the stages starting from x0. returns the scipy result of the last stage"""
+        x = np.asarray(x0, dtype=float)
+        self.stage_reports = []
+        ret = None
+        for k, stage in enumerate(self.stages):
+            start = self.timer()
+            self.configure_sa(stage)
+            if self.on_stage is not None:
+                self.on_stage(stage)
+            report = {"stage": k, "BW": stage["BW"], "num_averages": stage["num_averages"], "evaluations": 0,
+                      "sa_time": 0.0}
+
+            def evaluate(point):
+                t = self.timer()
+                value = self.measure(point, stage["wait_time"])
+                report["sa_time"] += self.timer() - t
+                report["evaluations"] += 1
+                return value
+
+            simplex = initial_simplex(x, stage["simplex_size"])
+            if self.bounds is not None:
+                simplex = np.clip(simplex, *self.bounds)
+            options = {"xatol": stage["xatol"], "fatol": stage["fatol"], "initial_simplex": simplex}
+            if "maxfev" in stage:
+                options["maxfev"] = stage["maxfev"]
+            stage_ret = optimize.minimize(evaluate, x0=x, method="Nelder-Mead", options=options)
+            if ret is not None and stage_ret.fun > ret.fun and self._same_setting(self.stages[k - 1], stage):
+                # the simplex is centered on x, so x isn't one of its vertices - keep it if the stage didn't improve
+                stage_ret = ret
+            ret = stage_ret
+            x = ret.x
+            report["total_time"] = self.timer() - start
+            report["x"] = x.copy()
+            report["value"] = ret.fun
+            self.stage_reports.append(report)
+            if self.verbose:
+                print(self.format_stage(report))
+        return ret
+
+    @staticmethod
+    def _same_setting(stage, other):
+        """True if readings of the two stages are comparable (same SA setting)"""
+        return all(stage[key] == other[key] for key in ["BW", "num_averages", "wait_time"])
+
+    @staticmethod
+    def format_stage(report):
+        return "stage %d: BW=%g Hz, %d averages, %d evaluations, SA time %.1f s (total %.1f s), min %.2f dBm at %s" % (
+            report["stage"], report["BW"], report["num_averages"], report["evaluations"], report["sa_time"],
+            report["total_time"], report["value"], np.array2string(report["x"], precision=6))
+
+    def report(self):
+        """A summary of the time spent in each stage"""
+        lines = [self.format_stage(r) for r in self.stage_reports]
+        lines.append("total: %d evaluations, SA time %.1f s" % (sum(r["evaluations"] for r in self.stage_reports),
+                                                                sum(r["sa_time"] for r in self.stage_reports)))
+        return "\n".join(lines)
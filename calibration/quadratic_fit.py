@@ -0,0 +1,53 @@
+"""Least squares fit of a paraboloid p(I,Q) = c0 + c1*I + c2*Q + c3*I**2 + c4*I*Q + c5*Q**2 and its minimum.
+In linear power units the LO leakage |g_I*(I-I_null) + 1j*g_Q*exp(1j*phi)*(Q-Q_null)|**2 (plus a noise floor)
+is exactly such a paraboloid, so a few measurements are enough to locate the null."""
+
+import numpy as np
+
+
+def dbm_to_mw(power):
+    """Convert power in dBm to mW"""
+    return 10 ** (np.asarray(power) / 10.0)
+
+
+def grid_points(I0, Q0, scan_range, points_per_axis=3):
+    """Points of a square grid of points_per_axis**2 points with a side of scan_range around (I0,Q0),
+    clipped to the DAC range [-0.5, 0.5-2**-16]. returns arrays I, Q"""
+    I_vec = np.clip(np.linspace(I0 - scan_range / 2, I0 + scan_range / 2, points_per_axis), -0.5, 0.5 - 2 ** -16)
+    Q_vec = np.clip(np.linspace(Q0 - scan_range / 2, Q0 + scan_range / 2, points_per_axis), -0.5, 0.5 - 2 ** -16)
+    I, Q = np.meshgrid(I_vec, Q_vec)
+    return I.flatten(), Q.flatten()
+
+
+def fit_paraboloid(I, Q, power):
+    """Fit a paraboloid to power (linear units) measured at points I, Q.
+    returns the coefficients c0..c5 (in the original coordinates)"""
+    I = np.asarray(I, dtype=float)
+    Q = np.asarray(Q, dtype=float)
+    # center and scale the coordinates for a well conditioned fit
+    I_c, Q_c = np.mean(I), np.mean(Q)
+    scale = max(np.ptp(I), np.ptp(Q), 1e-12)
+    x = (I - I_c) / scale
+    y = (Q - Q_c) / scale
+    A = np.column_stack([np.ones_like(x), x, y, x ** 2, x * y, y ** 2])
+    c = np.linalg.lstsq(A, np.asarray(power, dtype=float), rcond=None)[0]
+    # back to the original coordinates
+    a0, a1, a2, a3, a4, a5 = c[0], c[1] / scale, c[2] / scale, c[3] / scale ** 2, c[4] / scale ** 2, c[5] / scale ** 2
+    return np.array([
+        a0 - a1 * I_c - a2 * Q_c + a3 * I_c ** 2 + a4 * I_c * Q_c + a5 * Q_c ** 2,
+        a1 - 2 * a3 * I_c - a4 * Q_c,
+        a2 - 2 * a5 * Q_c - a4 * I_c,
+        a3,
+        a4,
+        a5
+    ])
+
+
+def paraboloid_minimum(coefficients):
+    """Get the minimum (I, Q, p) of a fitted paraboloid, or None if it has no minimum (not positive definite)"""
+    c0, c1, c2, c3, c4, c5 = coefficients
+    hessian = np.array([[2 * c3, c4], [c4, 2 * c5]])
+    if c3 <= 0 or np.linalg.det(hessian) <= 0:
+        return None
+    I, Q = np.linalg.solve(hessian, [-c1, -c2])
+    return I, Q, c0 + c1 * I + c2 * Q + c3 * I ** 2 + c4 * I * Q + c5 * Q ** 2
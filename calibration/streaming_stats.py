@@ -0,0 +1,106 @@
+"""Bounded memory statistics of long measurement streams.
+StreamingCovariance keeps the running mean and covariance of vectors (Welford's algorithm, updated a batch at a time
+with the pairwise combination of Chan et al.), Histogram2D keeps counts on a fixed grid. Both use memory independent
+of the number of samples, so they can be updated with chunks of results while a job is running."""
+
+import numpy as np
+
+
+class StreamingCovariance:
+    """Running mean and covariance of vectors of length dim"""
+
+    def __init__(self, dim, labels=None):
+        self.dim = dim
+        self.labels = labels if labels is not None else [str(i) for i in range(dim)]
+        if len(self.labels) != dim:
+            raise Exception("StreamingCovariance: expected %d labels, got %d" % (dim, len(self.labels)))
+        self.count = 0
+        self._mean = np.zeros(dim)
+        self._M2 = np.zeros((dim, dim))  # sum of outer products of deviations from the mean
+
+    def update(self, batch):
+        """Add a batch of samples, shape (n, dim)"""
+        batch = np.asarray(batch, dtype=float).reshape(-1, self.dim)
+        n_b = batch.shape[0]
+        if n_b == 0:
+            return
+        mean_b = batch.mean(axis=0)
+        centered = batch - mean_b
+        M2_b = centered.T @ centered
+        n = self.count + n_b
+        delta = mean_b - self._mean
+        self._mean = self._mean + delta * (n_b / n)
+        self._M2 = self._M2 + M2_b + np.outer(delta, delta) * (self.count * n_b / n)
+        self.count = n
+
+    def merge(self, other):
+        """Combine with the statistics of another StreamingCovariance (e.g. of another job)"""
+        if other.count == 0:
+            return
+        n = self.count + other.count
+        delta = other._mean - self._mean
+        self._mean = self._mean + delta * (other.count / n)
+        self._M2 = self._M2 + other._M2 + np.outer(delta, delta) * (self.count * other.count / n)
+        self.count = n
+
+    @property
+    def mean(self):
+        return self._mean.copy()
+
+    @property
+    def cov(self):
+        """Sample covariance matrix (ddof=1)"""
+        if self.count < 2:
+            return np.full((self.dim, self.dim), np.nan)
+        return self._M2 / (self.count - 1)
+
+    @property
+    def std(self):
+        return np.sqrt(np.diag(self.cov))
+
+    @property
+    def corr(self):
+        """Correlation matrix"""
+        std = self.std
+        return self.cov / np.outer(std, std)
+
+    def report(self):
+        """A table of the means, standard deviations and correlations"""
+        lines = ["%8s %12s %12s" % ("", "mean", "std") + "".join("%8s" % l for l in self.labels)]
+        corr = self.corr
+        for i, label in enumerate(self.labels):
+            lines.append("%8s %12.4e %12.4e" % (label, self._mean[i], self.std[i]) +
+                         "".join("%8.3f" % c for c in corr[i]))
+        lines.append("%d samples" % self.count)
+        return "\n".join(lines)
+
+
+class Histogram2D:
+    """Counts of (x, y) samples on a fixed grid of bins x bins over x_range x y_range.
+    Samples outside the grid are counted in outside"""
+
+    def __init__(self, x_range, y_range, bins=100):
+        self.x_edges = np.linspace(x_range[0], x_range[1], bins + 1)
+        self.y_edges = np.linspace(y_range[0], y_range[1], bins + 1)
+        self.counts = np.zeros((bins, bins), dtype=np.int64)
+        self.outside = 0
+
+    @classmethod
+    def from_sample(cls, x, y, bins=100, num_std=6.0):
+        """A histogram spanning num_std standard deviations around the mean of a first sample of x, y"""
+        x = np.asarray(x, dtype=float)
+        y = np.asarray(y, dtype=float)
+        x_w = num_std * max(np.std(x), 1e-12)
+        y_w = num_std * max(np.std(y), 1e-12)
+        return cls((np.mean(x) - x_w, np.mean(x) + x_w), (np.mean(y) - y_w, np.mean(y) + y_w), bins)
+
+    def update(self, x, y):
+        counts, _, _ = np.histogram2d(x, y, bins=[self.x_edges, self.y_edges])
+        counts = counts.astype(np.int64)
+        self.counts += counts
+        self.outside += len(x) - int(counts.sum())
+
+    @property
+    def extent(self):
+        """(x_min, x_max, y_min, y_max) for plt.imshow"""
+        return self.x_edges[0], self.x_edges[-1], self.y_edges[0], self.y_edges[-1]
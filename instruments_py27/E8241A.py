@@ -1,5 +1,5 @@
-from time import sleep
-import visa
+from .tracing import sleep
+from . import visa_registry
 from .instrument import Instrument
 
 
@@ -8,8 +8,8 @@ class E8241A_MG(Instrument):
 
     def __init__(self, address):
         """Initizalize the instrument, using a given VISA address"""
-        rm = visa.ResourceManager()
-        self.MG = rm.open_resource(address)
+        Instrument.__init__(self)
+        self.MG = visa_registry.open_resource(address)
         self.update_functions = {
             "freq": lambda f: self.setup_MG(freq=f, set_on=False),
             "power": lambda p: self.setup_MG(power=p, set_on=False),
@@ -20,23 +20,29 @@ class E8241A_MG(Instrument):
         """Set the MG to a given frequency (in MHz) and power (in dBm). If one of them is None don't set it.
         if set_on is True set power on"""
 
-        if freq is not None:
+        if freq is not None and not self.is_cached("freq", freq):
             self.MG.write('FREQ %fe6' % freq)
             sleep(0.100)
-        if power is not None:
+            self.cache_property("freq", freq)
+        if power is not None and not self.is_cached("power", power):
             self.MG.write('POW:AMPL %f' % power)
             sleep(0.100)
-        if set_on:
+            self.cache_property("power", power)
+        if set_on and not self.is_cached("on", True):
             self.MG.write("OUTP 1")
             sleep(0.100)
+            self.cache_property("on", True)
 
     def set_on(self, on=True):
         """Set MG on/off"""
+        if self.is_cached("on", on):
+            return
         if on:
             self.MG.write("OUTP 1")
         else:
             self.MG.write("OUTP 0")
         sleep(0.100)
+        self.cache_property("on", on)
 
     def update_property(self, property, value):
         """Update the given property of the instrument to the given value"""
@@ -1,26 +1,143 @@
 from .instrument import Instrument
 import subprocess
-from os.path import join
-import inspect
+from os.path import join, exists
+from .tracing import sleep
+import ctypes
+import os
 
 
-class LDA:
-    """"A class for controlling LabBrick digital attenuator"""
-    LDA_FILES_FOLDER = r"X:\CodeVault\PythonLibs\instruments_py27\LDA_files"
+LDA_FILES_FOLDER = r"X:\CodeVault\PythonLibs\instruments_py27\LDA_files"
+
+
+class LDAExecutableBackend:
+    """Set attenuation by running LDA64Test.exe for every command (a process spawn and USB enumeration per call)"""
     LDA_PROGRAM_NAME = r"LDA64Test.exe"
 
-    def __init__(self, device_number):
+    def __init__(self, files_folder=LDA_FILES_FOLDER):
+        self.files_folder = files_folder
+
+    def command(self, device_number, attenuation):
+        """The command line for setting the attenuation of a device"""
+        return [join(self.files_folder, self.LDA_PROGRAM_NAME), "-d", "%d" % device_number, "1", "-b", "-a",
+                "%f" % attenuation]
+
+    def set_attenuation(self, device_number, attenuation):
+        subprocess.call(self.command(device_number, attenuation))
+
+    def close(self):
+        pass
+
+
+class LDADllBackend:
+    """A persistent in-process session using the Vaunix VNX_atten64.dll.
+    Devices are enumerated once and stay open until close() is called"""
+    DLL_NAME = r"VNX_atten64.dll"
+    ATTENUATION_UNIT = 0.05  # dB, units of the *HR functions
+
+    def __init__(self, files_folder=LDA_FILES_FOLDER):
+        self.dll = ctypes.CDLL(join(files_folder, self.DLL_NAME))
+        self.dll.fnLDA_SetTestMode(False)
+        num_devices = self.dll.fnLDA_GetNumDevices()
+        device_ids = (ctypes.c_uint * max(num_devices, 1))()
+        self.dll.fnLDA_GetDevInfo(device_ids)
+        self.device_ids = list(device_ids)[:num_devices]
+        self.opened = set()
+
+    def _device_id(self, device_number):
+        """Get the DLL device id of a device (numbered from 1, like LDA64Test.exe), opening it if needed"""
+        if device_number < 1 or device_number > len(self.device_ids):
+            raise Exception("LDADllBackend: device %d not found (%d devices connected)" % (
+                device_number, len(self.device_ids)))
+        device_id = self.device_ids[device_number - 1]
+        if device_id not in self.opened:
+            status = self.dll.fnLDA_InitDevice(device_id)
+            if status != 0:
+                raise Exception("LDADllBackend: failed to open device %d (status 0x%x)" % (device_number, status))
+            self.opened.add(device_id)
+        return device_id
+
+    def set_attenuation(self, device_number, attenuation):
+        device_id = self._device_id(device_number)
+        status = self.dll.fnLDA_SetAttenuationHR(device_id, int(round(attenuation / self.ATTENUATION_UNIT)))
+        if status != 0:
+            raise Exception("LDADllBackend: failed to set attenuation of device %d (status 0x%x)" % (
+                device_number, status))
+
+    def close(self):
+        for device_id in self.opened:
+            self.dll.fnLDA_CloseDevice(device_id)
+        self.opened = set()
+
+
+class LDASimulatedBackend:
+    """Simulated attenuators for testing and benchmarking without the hardware.
+    latency is the time [s] each command takes"""
+
+    def __init__(self, num_devices=2, latency=0.0, max_attenuation=63.0, step=0.25):
+        self.num_devices = num_devices
+        self.latency = latency
+        self.max_attenuation = max_attenuation
+        self.step = step
+        self.attenuation = {}  # device number:attenuation [dB]
+        self.num_commands = 0
+
+    def set_attenuation(self, device_number, attenuation):
+        if device_number < 1 or device_number > self.num_devices:
+            raise Exception("LDASimulatedBackend: device %d not found (%d devices connected)" % (
+                device_number, self.num_devices))
+        if attenuation < 0 or attenuation > self.max_attenuation:
+            raise Exception("LDASimulatedBackend: attenuation %f dB out of range" % attenuation)
+        sleep(self.latency)
+        self.attenuation[device_number] = round(attenuation / self.step) * self.step
+        self.num_commands += 1
+
+    def close(self):
+        pass
+
+
+class LDA(Instrument):
+    """"A class for controlling LabBrick digital attenuator.
+    All instances share one backend session (see get_default_backend) unless a backend is given"""
+    LDA_FILES_FOLDER = LDA_FILES_FOLDER
+
+    _default_backend = None
+
+    def __init__(self, device_number, backend=None):
         """Initizalize the instrument"""
+        Instrument.__init__(self)
         self.device_number = device_number
+        self.backend = backend if backend is not None else self.get_default_backend()
         self.update_functions = {
             "attenuation": lambda a: self.set_attenuation(a)
         }
 
+    @classmethod
+    def get_default_backend(cls):
+        """Get the shared backend, creating it on first use: an in-process DLL session when the DLL can be loaded,
+        otherwise LDA64Test.exe per command"""
+        if cls._default_backend is None:
+            if os.name == "nt" and exists(join(cls.LDA_FILES_FOLDER, LDADllBackend.DLL_NAME)):
+                try:
+                    cls._default_backend = LDADllBackend(cls.LDA_FILES_FOLDER)
+                except OSError:
+                    cls._default_backend = LDAExecutableBackend(cls.LDA_FILES_FOLDER)
+            else:
+                cls._default_backend = LDAExecutableBackend(cls.LDA_FILES_FOLDER)
+        return cls._default_backend
+
+    @classmethod
+    def set_default_backend(cls, backend):
+        """Replace the shared backend (e.g. with LDASimulatedBackend), closing the previous one"""
+        if cls._default_backend is not None and cls._default_backend is not backend:
+            cls._default_backend.close()
+        cls._default_backend = backend
+
     def set_attenuation(self, attenuation):
         """Set attenuation for the device"""
-        subprocess.call(
-            [join(self.LDA_FILES_FOLDER, self.LDA_PROGRAM_NAME), "-d", "%d" % self.device_number, "1", "-b", "-a",
-             "%f" % attenuation])
+        if self.is_cached("attenuation", attenuation):
+            return
+        self.backend.set_attenuation(self.device_number, attenuation)
+        self.cache_property("attenuation", attenuation)
 
     def update_property(self, property, value):
         """Update the given property of the instrument to the given value"""
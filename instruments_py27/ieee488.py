@@ -0,0 +1,42 @@
+"""Helpers for IEEE 488.2 definite length arbitrary block data (#<n><length><payload>)"""
+
+import numpy as np
+
+
+def parse_block_header(data):
+    """Parse the header of a definite length block.
+    returns (header length, payload length) in bytes"""
+    start = data.find(b"#")
+    if start < 0 or len(data) < start + 2:
+        raise Exception("ieee488.parse_block_header: no block header found")
+    num_digits = int(data[start + 1:start + 2])
+    if num_digits == 0:
+        raise Exception("ieee488.parse_block_header: indefinite length blocks are not supported")
+    header_length = start + 2 + num_digits
+    return header_length, int(data[start + 2:header_length])
+
+
+def parse_definite_length_block(data, dtype="<f4"):
+    """Decode a definite length block into a numpy array of the given dtype without copying the payload"""
+    header_length, length = parse_block_header(data)
+    if len(data) < header_length + length:
+        raise Exception("ieee488.parse_definite_length_block: block is truncated (%d of %d bytes)" % (
+            len(data) - header_length, length))
+    dtype = np.dtype(dtype)
+    return np.frombuffer(data, dtype, count=length // dtype.itemsize, offset=header_length)
+
+
+def read_definite_length_block(resource, dtype="<f4"):
+    """Read a definite length block from a resource (after a query command was written) into a numpy array"""
+    data = resource.read_raw()
+    header_length, length = parse_block_header(data)
+    # a termination character inside the binary payload may end the read early
+    while len(data) < header_length + length:
+        data += resource.read_raw()
+    return parse_definite_length_block(data, dtype)
+
+
+def build_definite_length_block(payload):
+    """Wrap bytes in a definite length block header (with a trailing newline)"""
+    length = str(len(payload)).encode()
+    return b"#" + str(len(length)).encode() + length + payload + b"\n"
@@ -1,11 +1,46 @@
 from abc import ABCMeta, abstractmethod
+from collections import OrderedDict
 
 class Instrument:
-    """An abstract class for an instrument"""
+    """An abstract class for an instrument.
+    Keeps a shadow copy of the last value written to each property, so drivers can skip redundant writes
+    (and the settling time that comes with them)"""
 
     __metaclass__ = ABCMeta
 
+    def __init__(self):
+        self.use_cache = True  # set False to always write to the instrument
+        self._shadow = OrderedDict()  # property:last written value, ordered by time of writing (also in py2.7)
+
+    def is_cached(self, property, value):
+        """Return True if value is the last value written to the given property (and caching is on)"""
+        return self.use_cache and property in self._shadow and self._shadow[property] == value
+
+    def cache_property(self, property, value):
+        """Remember that value was written to the given property"""
+        self._shadow.pop(property, None)
+        self._shadow[property] = value
+
+    def get_cached(self, property, default=None):
+        """Get the last value written to the given property, or default if it is unknown"""
+        return self._shadow.get(property, default)
+
+    def invalidate(self, property=None):
+        """Forget the cached value of the given property (all properties if property is None).
+        Use after the instrument was changed behind the driver's back, e.g. from the front panel"""
+        if property is None:
+            self._shadow.clear()
+        else:
+            self._shadow.pop(property, None)
+
+    def resync(self):
+        """Write all cached values to the instrument again (in the original order), ignoring the cache"""
+        state = list(self._shadow.items())
+        self.invalidate()
+        for property, value in state:
+            self.update_property(property, value)
+
     @abstractmethod
     def update_property(self, property, value):
         """Update the given property of the instrument to the given value"""
-        pass
\ No newline at end of file
+        pass
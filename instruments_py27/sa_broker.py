@@ -0,0 +1,330 @@
+"""A broker process which owns the spectrum analyzer and serves marker and trace requests of several calibration
+processes, so they can share one SA (most of a calibration is spent on OPX and MG settling, not on the SA).
+Requests are served in order of priority (lower first) and arrival. Queued requests for the same measurement (same
+center frequency, span, BW, points, averaging and marker) are served together by one measurement.
+Clients connect with multiprocessing.connection - BrokeredSA has the measurement interface of N9010A_SA.
+The broker keeps per client statistics of the time requests wait in the queue and the time they are serviced.
+Run a broker: python -m instruments_py27.sa_broker TCPIP0::192.168.137.177::inst0::INSTR"""
+
+import argparse
+import heapq
+import os
+import threading
+from time import sleep, time
+from multiprocessing.connection import Listener, Client
+from .instrument import Instrument
+
+DEFAULT_ADDRESS = ("localhost", 6000)
+DEFAULT_AUTHKEY = b"sa_broker"
+SA_SETTINGS = ["center_freq", "span", "BW", "points"]
+
+
+class _Request:
+    """A measurement request waiting in the broker's queue"""
+
+    def __init__(self, client, priority, operation, settings, marker, queued):
+        self.client = client
+        self.priority = priority
+        self.operation = operation
+        self.settings = settings
+        self.marker = marker
+        self.key = (operation, tuple(sorted(settings.items())), marker)  # requests with equal keys are batched
+        self.queued = queued
+        self.result = None
+        self.error = None
+        self.done = threading.Event()
+
+
+class ClientStats:
+    """Queue wait and service time [s] of the requests of one client"""
+
+    def __init__(self):
+        self.num_requests = 0
+        self.num_batched = 0  # requests answered by the measurement of another request
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self.total_service = 0.0
+
+    def add(self, wait, service, batched):
+        self.num_requests += 1
+        self.num_batched += batched
+        self.total_wait += wait
+        self.max_wait = max(self.max_wait, wait)
+        self.total_service += service
+
+    def as_dict(self):
+        count = max(self.num_requests, 1)
+        return {"requests": self.num_requests, "batched": self.num_batched, "mean_wait": self.total_wait / count,
+                "max_wait": self.max_wait, "mean_service": self.total_service / count}
+
+
+class SABroker(object):
+    """Serve the measurements of an SA (N9010A_SA or SimulatedSA) to several clients.
+    A single worker thread talks to the SA, so the driver is never used concurrently.
+    The SA must be synchronized: every measurement is then a sweep taken after the request, which is what lets
+    BrokeredSA skip the settling waits (a free running SA could answer from a trace taken before the request)"""
+
+    def __init__(self, sa, address=DEFAULT_ADDRESS, authkey=DEFAULT_AUTHKEY, timer=time):
+        if not sa.synchronized:
+            raise Exception("SABroker: the SA must be synchronized (single sweeps), e.g. N9010A_SA(address, "
+                            "synchronized=True)")
+        self.sa = sa
+        self.address = address
+        self.authkey = authkey
+        self.timer = timer
+        self.stats = {}  # client name: ClientStats
+        self.num_measurements = 0
+        self.listener = None
+        self._queue = []  # heap of (priority, sequence, request)
+        self._sequence = 0
+        self._condition = threading.Condition()
+        self._running = False
+
+    def submit(self, client, operation, settings, marker="max", priority=0):
+        """Queue a request and wait for its result (the connection threads call this for their clients).
+        operation is "marker" (returns the marker value) or "trace" (returns the trace array).
+        settings is a dict of the SA settings (center_freq, span, BW, points, averaging, avg_count) to measure with,
+        and marker "max" or a frequency [MHz]. All of SA_SETTINGS must be given, so a request is never measured with
+        the settings of another client. avg_count is ignored without averaging"""
+        missing = [property for property in SA_SETTINGS if settings.get(property) is None]
+        if missing:
+            raise Exception("SABroker.submit: request of %s without %s - set them with setup_spectrum_analyzer" % (
+                client, ", ".join(missing)))
+        settings = dict(settings)
+        if not settings.get("averaging", False):
+            settings.pop("avg_count", None)  # so requests which differ only in an unused count are batched
+        with self._condition:
+            request = _Request(client, priority, operation, settings, marker, self.timer())
+            heapq.heappush(self._queue, (priority, self._sequence, request))
+            self._sequence += 1
+            self._condition.notify()
+        request.done.wait()
+        if request.error is not None:
+            raise Exception("SABroker.submit: %s" % request.error)
+        return request.result
+
+    def _next_batch(self):
+        """Pop the first request in the queue together with all the queued requests for the same measurement"""
+        with self._condition:
+            while not self._queue and self._running:
+                self._condition.wait(0.1)
+            if not self._queue:
+                return []
+            first = heapq.heappop(self._queue)[2]
+            batch = [first] + [item[2] for item in sorted(self._queue) if item[2].key == first.key]
+            if len(batch) > 1:
+                self._queue = [item for item in self._queue if item[2].key != first.key]
+                heapq.heapify(self._queue)
+        return batch
+
+    def _measure(self, request):
+        settings = request.settings
+        self.sa.setup_spectrum_analyzer(**dict((property, settings[property]) for property in SA_SETTINGS))
+        averaging = settings.get("averaging", False)
+        self.sa.setup_averaging(averaging, settings.get("avg_count", 100))
+        if averaging:
+            self.sa.restart_averaging()  # average only sweeps taken after the request
+        if request.operation == "marker":
+            if request.marker == "max":
+                self.sa.set_marker_max()
+            else:
+                self.sa.set_marker_position(request.marker)
+            return self.sa.get_marker()
+        if request.operation == "trace":
+            return self.sa.get_trace()
+        raise Exception("SABroker._measure: Operation %s is not supported" % request.operation)
+
+    def _work(self):
+        while self._running:
+            batch = self._next_batch()
+            if not batch:
+                continue
+            started = self.timer()
+            try:
+                result, error = self._measure(batch[0]), None
+            except Exception as e:
+                result, error = None, str(e)
+            finished = self.timer()
+            with self._condition:
+                self.num_measurements += 1
+                for i, request in enumerate(batch):
+                    self.stats.setdefault(request.client, ClientStats()).add(started - request.queued,
+                                                                             finished - started, i > 0)
+            for request in batch:
+                request.result = result
+                request.error = error
+                request.done.set()
+
+    def _serve_connection(self, connection):
+        try:
+            while True:
+                try:
+                    message = connection.recv()
+                except EOFError:
+                    return  # the client closed the connection
+                if message["operation"] == "stats":
+                    connection.send({"result": self.client_stats()})
+                    continue
+                try:
+                    result = self.submit(message["client"], message["operation"], message["settings"],
+                                         message["marker"], message["priority"])
+                    connection.send({"result": result})
+                except Exception as e:
+                    connection.send({"error": str(e)})
+        finally:
+            connection.close()
+
+    def _accept(self):
+        while self._running:
+            try:
+                connection = self.listener.accept()
+            except Exception:
+                if not self._running:
+                    return  # closed
+                continue  # e.g. a client with a wrong authkey
+            thread = threading.Thread(target=self._serve_connection, args=(connection,))
+            thread.daemon = True
+            thread.start()
+
+    def start(self):
+        """Start listening and serving in background threads"""
+        self._running = True
+        self.listener = Listener(self.address, authkey=self.authkey)
+        self.address = self.listener.address  # the actual port if port 0 was given
+        for target in [self._work, self._accept]:
+            thread = threading.Thread(target=target)
+            thread.daemon = True
+            thread.start()
+
+    def close(self):
+        self._running = False
+        if self.listener is not None:
+            self.listener.close()
+            self.listener = None
+
+    def client_stats(self):
+        """Get a dict of client name: dict of requests, batched, mean_wait, max_wait, mean_service [s]"""
+        with self._condition:
+            return dict((client, stats.as_dict()) for client, stats in self.stats.items())
+
+    def report(self):
+        """Get a table of the per client statistics"""
+        lines = ["SABroker: %d measurements, %d requests" % (
+            self.num_measurements, sum(stats.num_requests for stats in self.stats.values())),
+            "%16s %9s %9s %15s %14s %18s" % ("client", "requests", "batched", "mean wait [ms]", "max wait [ms]",
+                                            "mean service [ms]")]
+        for client, stats in sorted(self.client_stats().items()):
+            lines.append("%16s %9d %9d %15.2f %14.2f %18.2f" % (
+                client, stats["requests"], stats["batched"], stats["mean_wait"] * 1e3, stats["max_wait"] * 1e3,
+                stats["mean_service"] * 1e3))
+        return "\n".join(lines)
+
+
+class BrokeredSA(Instrument):
+    """A spectrum analyzer shared through an SABroker, with the measurement interface of N9010A_SA.
+    The settings are kept locally and sent with every request, so clients never see each other's settings.
+    center_freq, span, BW and points must be set (setup_spectrum_analyzer) before the first measurement.
+    Every request is answered by a measurement taken after it was received, so there is nothing to wait for between
+    a change of the measured signal and get_marker. Lower priority values are served first"""
+
+    def __init__(self, address=DEFAULT_ADDRESS, authkey=DEFAULT_AUTHKEY, name=None, priority=0):
+        Instrument.__init__(self)
+        self.connection = Client(address, authkey=authkey)
+        self.name = name if name is not None else "%d-%x" % (os.getpid(), id(self))
+        self.priority = priority
+        self.marker = "max"
+        self.update_functions = {
+            "center_freq": lambda f: self.setup_spectrum_analyzer(center_freq=f),
+            "span": lambda s: self.setup_spectrum_analyzer(span=s),
+            "BW": lambda bw: self.setup_spectrum_analyzer(BW=bw),
+            "points": lambda p: self.setup_spectrum_analyzer(points=p),
+            "averaging": lambda on: self.setup_averaging(on),
+            "avg_count": lambda c: self.setup_averaging(True, c)
+        }
+
+    def _request(self, operation):
+        self.connection.send({"operation": operation, "client": self.name, "priority": self.priority,
+                              "settings": dict(self._shadow), "marker": self.marker})
+        reply = self.connection.recv()
+        if "error" in reply:
+            raise Exception("BrokeredSA.%s: %s" % (operation, reply["error"]))
+        return reply["result"]
+
+    def setup_spectrum_analyzer(self, center_freq=None, span=None, BW=None, points=None):
+        """"Set spectrum analyzer span (Hz), center frequency (MHz), IF BW (Hz) and number of points of the
+        following requests. If one of them is None don't set it"""
+        values = {"center_freq": center_freq, "span": span, "BW": BW, "points": points}
+        for property in SA_SETTINGS:
+            if values[property] is not None:
+                self.cache_property(property, values[property])
+
+    def setup_averaging(self, on, avg_count=100):
+        """Set averaging on/off and the number of averages of the following requests"""
+        self.cache_property("averaging", on)
+        if on:
+            self.cache_property("avg_count", avg_count)
+        else:
+            self.invalidate("avg_count")
+
+    def restart_averaging(self):
+        """Nothing to do - the broker restarts averaging for every averaged request"""
+        pass
+
+    def wait_for_sweep(self, fixed_wait):
+        """Nothing to wait for - every request is measured after it is received. Returns 0"""
+        return 0.0
+
+    def set_marker_max(self):
+        """Put the marker at maximum"""
+        self.marker = "max"
+
+    def set_marker_position(self, freq):
+        """Put the marker at the given position [MHz]"""
+        self.marker = freq
+
+    def get_marker(self):
+        """Get the value at the marker"""
+        return self._request("marker")
+
+    def get_trace(self):
+        """Get the trace data as a numpy array of shape (points, 2) with columns frequency, power [dBm]"""
+        return self._request("trace")
+
+    def get_stats(self):
+        """Get the broker's statistics of all clients (see SABroker.client_stats)"""
+        return self._request("stats")
+
+    def close(self):
+        self.connection.close()
+
+    def update_property(self, property, value):
+        """Update the given property of the instrument to the given value"""
+
+        if property not in self.update_functions:
+            raise Exception("BrokeredSA.update_property: Property is not supported")
+
+        self.update_functions[property](value)
+
+
+def main():
+    from .spectrum_analyzer import N9010A_SA
+    parser = argparse.ArgumentParser(description="Share a spectrum analyzer between calibration processes")
+    parser.add_argument("sa_address", help="VISA address of the N9010A")
+    parser.add_argument("--host", default=DEFAULT_ADDRESS[0])
+    parser.add_argument("--port", type=int, default=DEFAULT_ADDRESS[1])
+    parser.add_argument("--binary", action="store_true", help="transfer traces as REAL,32 blocks")
+    args = parser.parse_args()
+    sa = N9010A_SA(args.sa_address, synchronized=True, binary_data=args.binary)
+    broker = SABroker(sa, (args.host, args.port))
+    broker.start()
+    print("SA broker listening at %s:%d" % broker.address)
+    try:
+        while True:
+            sleep(1.0)
+    except KeyboardInterrupt:
+        print(broker.report())
+        broker.close()
+
+
+if __name__ == "__main__":
+    main()
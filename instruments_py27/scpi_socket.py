@@ -0,0 +1,184 @@
+"""SCPI over a raw TCP socket (port 5025 on Keysight / Agilent instruments), as a drop in replacement for the VISA
+sessions used by the drivers (write, query, read, read_raw, timeout in ms, close).
+Unlike VXI-11 (TCPIP::inst0) a raw socket write does not wait for an acknowledgement, so writes cost no round trip.
+Queries can also be pipelined: query_async sends a query and returns at once, and the replies, which the instrument
+sends in order, are matched to their queries as they are read (including IEEE 488.2 binary blocks, whose payload may
+contain newlines). Commands written inside a batch() are sent together in one packet.
+The address format is the VISA one - TCPIP0::<host>::<port>::SOCKET (see visa_registry.open_resource)."""
+
+import socket
+from collections import deque
+from contextlib import contextmanager
+
+DEFAULT_PORT = 5025
+
+
+def parse_socket_address(address):
+    """Split a VISA socket address TCPIP<board>::<host>::<port>::SOCKET into (host, port)"""
+    parts = address.split("::")
+    if len(parts) != 4 or not parts[0].upper().startswith("TCPIP") or parts[3].upper() != "SOCKET":
+        raise Exception("scpi_socket.parse_socket_address: %s is not a TCPIP socket address" % address)
+    return parts[1], int(parts[2])
+
+
+def socket_address(address, port=DEFAULT_PORT):
+    """The raw socket address of the instrument at a TCPIP VISA address, e.g.
+    TCPIP0::192.168.137.177::inst0::INSTR -> TCPIP0::192.168.137.177::5025::SOCKET"""
+    parts = address.split("::")
+    if len(parts) < 2 or not parts[0].upper().startswith("TCPIP"):
+        raise Exception("scpi_socket.socket_address: %s is not a TCPIP address" % address)
+    return "%s::%s::%d::SOCKET" % (parts[0], parts[1], port)
+
+
+class PendingReply:
+    """The reply to a query sent with SCPISocket.query_async"""
+
+    def __init__(self, transport, command):
+        self.transport = transport
+        self.command = command
+        self.raw = None  # the reply message as bytes, including the termination
+        self.done = False
+
+    def result(self):
+        """Wait for the reply. returns the reply text without the termination, or the raw bytes of a binary block
+        (decode with ieee488.parse_definite_length_block)"""
+        if not self.done:
+            self.transport._read_replies(self)
+        if self.raw[:1] == b"#":
+            return self.raw
+        return self.raw.decode().rstrip("\r\n")
+
+
+class SCPISocket(object):
+    """A SCPI session over a raw socket. timeout is in ms (as for VISA sessions) and can be changed at any time"""
+
+    def __init__(self, host, port=DEFAULT_PORT, timeout=2000, chunk_size=65536):
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self.chunk_size = chunk_size
+        self.sock = socket.create_connection((host, port), timeout / 1000.0)
+        self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)  # send small commands at once
+        self._received = b""  # received bytes which are not parsed into messages yet
+        self._pending = deque()  # PendingReply objects waiting for their reply, in the order of the queries
+        self._batch = None  # commands waiting to be sent, when in a batch
+        self.num_sends = 0
+        self.num_replies = 0
+
+    @classmethod
+    def from_address(cls, address, timeout=2000):
+        """Open a session for a VISA socket address TCPIP0::<host>::<port>::SOCKET"""
+        host, port = parse_socket_address(address)
+        return cls(host, port, timeout)
+
+    def _send(self, data):
+        self.sock.sendall(data.encode())
+        self.num_sends += 1
+
+    def write(self, command):
+        """Send a command (no round trip - the call returns once the command is handed to the network stack)"""
+        if self._batch is not None:
+            self._batch.append(command)
+        else:
+            self._send(command + "\n")
+
+    def flush(self):
+        """Send the commands of the current batch"""
+        if self._batch:
+            self._send("\n".join(self._batch) + "\n")
+            self._batch = []
+
+    @contextmanager
+    def batch(self):
+        """Collect the commands written inside the block and send them in one packet at its end (or when a reply
+        is needed, whichever comes first)"""
+        outer = self._batch is not None
+        if not outer:
+            self._batch = []
+        try:
+            yield self
+        finally:
+            if not outer:
+                self.flush()
+                self._batch = None
+
+    def query_async(self, command):
+        """Send a query without waiting for the reply. returns a PendingReply"""
+        self.write(command)
+        reply = PendingReply(self, command)
+        self._pending.append(reply)
+        return reply
+
+    def query(self, command):
+        """Send a query and wait for the reply text"""
+        return self.query_async(command).result()
+
+    def queries(self, commands):
+        """Send several queries in one packet and wait for all the replies. returns the list of replies"""
+        with self.batch():
+            replies = [self.query_async(command) for command in commands]
+        return [reply.result() for reply in replies]
+
+    def read_raw(self):
+        """Read the next message which does not belong to a pending query, as bytes including the termination
+        (e.g. after writing a query with write)"""
+        self._read_replies(None)
+        return self._next_message()
+
+    def read(self):
+        """Read the next message as text without the termination"""
+        return self.read_raw().decode().rstrip("\r\n")
+
+    def _read_replies(self, until):
+        """Read the replies of the pending queries, in order, up to the reply until (all of them if until is None)"""
+        self.flush()
+        while self._pending:
+            reply = self._pending.popleft()
+            reply.raw = self._next_message()
+            reply.done = True
+            self.num_replies += 1
+            if reply is until:
+                return
+
+    def _message_length(self):
+        """Length of the first complete message in the received bytes, or None if it is not complete yet"""
+        data = self._received
+        if data[:1] == b"#":
+            if len(data) < 2:
+                return None
+            num_digits = int(data[1:2])
+            if num_digits == 0:
+                raise Exception("SCPISocket: indefinite length blocks are not supported")
+            if len(data) < 2 + num_digits:
+                return None
+            length = 2 + num_digits + int(data[2:2 + num_digits])
+            if len(data) <= length:
+                return None  # wait for the termination after the block too
+            return length + 1 if data[length:length + 1] == b"\n" else length
+        end = data.find(b"\n")
+        return None if end < 0 else end + 1
+
+    def _next_message(self):
+        while True:
+            length = self._message_length()
+            if length is not None:
+                message = self._received[:length]
+                self._received = self._received[length:]
+                return message
+            self.sock.settimeout(self.timeout / 1000.0)
+            try:
+                data = self.sock.recv(self.chunk_size)
+            except socket.timeout:
+                raise Exception("SCPISocket: timeout reading from %s:%d" % (self.host, self.port))
+            if not data:
+                raise Exception("SCPISocket: connection to %s:%d was closed" % (self.host, self.port))
+            self._received += data
+
+    def clear(self):
+        """Drop the pending replies and anything received but not read"""
+        self._pending.clear()
+        self._received = b""
+        self._batch = None if self._batch is None else []
+
+    def close(self):
+        self.sock.close()
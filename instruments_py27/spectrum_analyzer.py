@@ -1,55 +1,213 @@
-from time import sleep
-import visa
+from time import time
+from .tracing import sleep
+import numpy as np
+from . import visa_registry
 from .instrument import Instrument
+from .ieee488 import read_definite_length_block
 
 
-class N9010A_SA:
+class N9010A_SA(Instrument):
     """"A class for controlling Agilent N9010A spectrum analyzer using GPIB"""
 
-    def __init__(self, address, set_best_speed=True):
-        """Initizalize the instrument, using a given VISA address"""
-        rm = visa.ResourceManager()
-        self.SA = rm.open_resource(address)
-        self.SA.write(":FORM:DATA ASC,8")  # data formating = ASCII
+    SETUP_WAIT = 1.0  # seconds to wait after reconfiguring the SA when not synchronized
+    READ_WAIT = 0.1  # seconds a caller without synchronized sweeps sleeps before reading the marker or trace
+
+    def __init__(self, address, set_best_speed=True, synchronized=False, sync_timeout=10000, binary_data=False):
+        """Initizalize the instrument, using a given VISA address.
+        If synchronized is True use single sweeps and wait for sweep completion instead of fixed sleeps.
+        sync_timeout is the maximal time [ms] to wait for a single sweep to complete.
+        If binary_data is True transfer traces as binary REAL,32 blocks"""
+        Instrument.__init__(self)
+        self.SA = visa_registry.open_resource(address)
+        self.set_data_format(binary_data)
         # turn on markers
         self.SA.write(":CALC:MARK1:STAT ON")
         if set_best_speed:
             self.SA.write("SWE:TYPE:AUTO:RUL SPE")  # set sweep type rules to "best speed"
+        self.sync_timeout = sync_timeout
+        self.wait_time_saved = 0.0  # seconds saved by synchronized waits compared with fixed sleeps
+        self.num_synchronized_sweeps = 0
+        self._fresh_sweep = False  # True if a sweep was completed since the last marker read
+        self.synchronized = False
+        if synchronized:
+            self.set_synchronized(True)
         self.update_functions = {
             "center_freq": lambda f: self.setup_spectrum_analyzer(center_freq=f),
             "span": lambda s: self.setup_spectrum_analyzer(span=s),
             "BW": lambda bw: self.setup_spectrum_analyzer(BW=bw),
             "points": lambda p: self.setup_spectrum_analyzer(points=p),
             "averaging": lambda on: self.setup_averaging(on),
-            "avg_count": lambda c: self.setup_averaging(True, c)
+            "avg_count": lambda c: self.setup_averaging(True, c),
+            "sweep_time": lambda t: self.set_sweep_time(t),
+            "trigger_source": lambda source: self.set_trigger(source)
         }
 
+    def set_data_format(self, binary=False):
+        """Transfer trace data as little endian REAL,32 blocks (binary=True) or as ASCII text (binary=False)"""
+        if binary:
+            self.SA.write(":FORM:DATA REAL,32")
+            self.SA.write(":FORM:BORD SWAP")  # little endian, no byte swapping on the PC
+        else:
+            self.SA.write(":FORM:DATA ASC,8")  # data formating = ASCII
+        self.binary_data = binary
+
+    def set_synchronized(self, on=True):
+        """Use single sweeps which are waited for with *OPC? (on=True) or continuous sweeps and fixed sleeps (on=False)"""
+        if on:
+            self.SA.write(":INIT:CONT OFF")
+        else:
+            self.SA.write(":INIT:CONT ON")
+        self.synchronized = on
+        self._fresh_sweep = False
+
+    def wait_for_sweep(self, fixed_wait):
+        """Wait until the trace reflects the current state of the measured signal.
+        When synchronized, trigger a single sweep (including all averages) and block until it is complete,
+        otherwise sleep fixed_wait seconds. Returns the time spent waiting [s]"""
+        if not self.synchronized:
+            sleep(fixed_wait)
+            return fixed_wait
+
+        elapsed = self._single_sweep()
+        self.wait_time_saved += fixed_wait - elapsed
+        return elapsed
+
+    def _single_sweep(self, then_query=None):
+        """Trigger a single sweep and wait for its completion. Returns the elapsed time [s].
+        If then_query is given it is sent in the same message, to be answered right after the sweep (saving a
+        round trip), and (elapsed time, its reply) is returned"""
+        start = time()
+        timeout = self.SA.timeout
+        self.SA.timeout = self.sync_timeout
+        try:
+            if then_query is None:
+                self.SA.query(":INIT:IMM;*OPC?")
+            else:
+                reply = self.SA.query(":INIT:IMM;*OPC?;%s" % then_query).split(";", 1)[1]
+        finally:
+            self.SA.timeout = timeout
+        self.num_synchronized_sweeps += 1
+        self._fresh_sweep = True
+        if then_query is None:
+            return time() - start
+        return time() - start, reply
+
+    def sync_report(self):
+        """Get a summary of the time saved by synchronized sweeps"""
+        return "N9010A_SA: %d synchronized sweeps, %f seconds saved compared with fixed sleeps" % (
+            self.num_synchronized_sweeps, self.wait_time_saved)
+
     def setup_spectrum_analyzer(self, center_freq=None, span=None, BW=None, points=None):
-        """"Set spectrum analyzer span (Hz), center frequency (MHz), IF BW (Hz) and number of points"""
-        if center_freq is not None:
-            self.SA.write(":FREQ:CENTER %fE6" % center_freq)
-        if span is not None:
-            self.SA.write(":FREQ:SPAN %f" % span)
-        if BW is not None:
-            self.SA.write(":BAND %f" % BW)
-        if points is not None:
-            self.SA.write(":SWE:POIN %d" % points)
-        sleep(1.0)
+        """"Set spectrum analyzer span (Hz), center frequency (MHz), IF BW (Hz) and number of points.
+        Values which are already set are not written, and if nothing was written there is no wait.
+        Returns True if anything was written"""
+        commands = {
+            "center_freq": ":FREQ:CENTER %fE6",
+            "span": ":FREQ:SPAN %f",
+            "BW": ":BAND %f",
+            "points": ":SWE:POIN %d"
+        }
+        values = {"center_freq": center_freq, "span": span, "BW": BW, "points": points}
+        changed = False
+        for property in ["center_freq", "span", "BW", "points"]:
+            value = values[property]
+            if value is not None and not self.is_cached(property, value):
+                self.SA.write(commands[property] % value)
+                self.cache_property(property, value)
+                changed = True
+        if changed:
+            self.wait_for_sweep(self.SETUP_WAIT)
+        return changed
+
+    def setup_zero_span(self, center_freq=None, BW=None, sweep_time=None, points=None):
+        """Setup a zero span (time domain) measurement at center frequency (MHz), with IF BW (Hz),
+        sweep time (s) and number of points. The trace x axis is then the time since the sweep start.
+        The sweep time stays manual until set_sweep_time(None) - call it when leaving zero span"""
+        changed = sweep_time is not None and self._write_sweep_time(sweep_time)
+        if not self.setup_spectrum_analyzer(center_freq=center_freq, span=0, BW=BW, points=points) and changed:
+            self.wait_for_sweep(self.SETUP_WAIT)
+
+    def set_sweep_time(self, sweep_time=None):
+        """Set a manual sweep time (s), or the automatic sweep time if sweep_time is None.
+        A manual sweep time too short for the span and BW gives uncalibrated readings"""
+        if self._write_sweep_time(sweep_time):
+            self.wait_for_sweep(self.SETUP_WAIT)
+
+    def _write_sweep_time(self, sweep_time):
+        """Write the sweep time (None = auto). Returns True if the sweep changed"""
+        if sweep_time is None:
+            # always written - the driver can't know the sweep time was left manual, e.g. by another script
+            self.SA.write(":SWE:TIME:AUTO ON")
+            changed = self.get_cached("sweep_time") is not None
+            self.invalidate("sweep_time")
+        elif not self.is_cached("sweep_time", sweep_time):
+            self.SA.write(":SWE:TIME %e" % sweep_time)
+            self.cache_property("sweep_time", sweep_time)
+            changed = True
+        else:
+            changed = False
+        if changed:
+            self._fresh_sweep = False
+        return changed
+
+    def set_trigger(self, source="IMM", level=None):
+        """Set the sweep trigger source: "IMM" (free run), "EXT1", "EXT2" (rising edge of a rear panel trigger
+        input) or "VID". level is the trigger level in V for external triggers (dBm for video).
+        After a change there is a wait for a sweep with the new trigger"""
+        if source not in ["IMM", "EXT1", "EXT2", "VID"]:
+            raise Exception("N9010A_SA.set_trigger: Unknown trigger source %s" % source)
+        if level is not None and source == "IMM":
+            raise Exception("N9010A_SA.set_trigger: A free run trigger has no level")
+        changed = False
+        if not self.is_cached("trigger_source", source):
+            self.SA.write(":TRIG:SOUR %s" % source)
+            if source.startswith("EXT"):
+                self.SA.write(":TRIG:%s:SLOP POS" % source)
+            self.cache_property("trigger_source", source)
+            changed = True
+        if level is not None:
+            if source == "VID":
+                self.SA.write(":TRIG:VID:LEV %f" % level)
+            else:
+                self.SA.write(":TRIG:%s:LEV %f" % (source, level))
+            changed = True
+        if changed:
+            self._fresh_sweep = False
+            self.wait_for_sweep(self.SETUP_WAIT)
 
     def setup_averaging(self, on, avg_count=100):
         """"Setup averaging. on=True/False. count=number of averages"""
         if on:
-            self.SA.write(":TRAC:TYPE AVER")
-            self.SA.write("AVER:COUN %d" % avg_count)
-        else:
+            if not self.is_cached("averaging", True):
+                self.SA.write(":TRAC:TYPE AVER")
+                self.cache_property("averaging", True)
+                self._fresh_sweep = False
+            if not self.is_cached("avg_count", avg_count):
+                self.SA.write("AVER:COUN %d" % avg_count)
+                self.cache_property("avg_count", avg_count)
+                self._fresh_sweep = False
+        elif not self.is_cached("averaging", False):
             self.SA.write("TRAC:TYPE WRIT")
+            self.cache_property("averaging", False)
+            self._fresh_sweep = False
 
     def restart_averaging(self):
+        """Restart averaging (always written, never skipped by the cache)"""
         self.SA.write(":TRAC:TYPE AVER")
+        self.cache_property("averaging", True)
+        self._fresh_sweep = False
 
-    def get_marker(self):
-        """Get the value at the marker"""
-        return float(self.SA.query(":CALC:MARK:Y?;"))
+    def get_marker(self, fixed_wait=None):
+        """Get the value at the marker.
+        When synchronized and no sweep was completed since the last read, a new sweep is taken first. It replaces
+        a sleep of fixed_wait seconds (READ_WAIT if None), which is counted in the time saved"""
+        if self.synchronized and not self._fresh_sweep:
+            elapsed, value = self._single_sweep(":CALC:MARK:Y?")
+            self.wait_time_saved += (self.READ_WAIT if fixed_wait is None else fixed_wait) - elapsed
+        else:
+            value = self.SA.query(":CALC:MARK:Y?;")
+        self._fresh_sweep = False
+        return float(value)
 
     def set_marker_max(self):
         """Put the marker at maximum"""
@@ -59,10 +217,37 @@ class N9010A_SA:
         """Put the marker at the given position [MHz]"""
         self.SA.write(":CALC:MARK1:X %fE6" % freq)
 
-    def get_data(self):
-        """Get the traca data as text with pairs of frequency,power [dBm]"""
+    def get_data(self, fixed_wait=None):
+        """Get the traca data as pairs of frequency,power [dBm].
+        Returns text in ASCII mode and a numpy array of shape (points, 2) in binary mode.
+        A sweep taken first (see get_marker) replaces a sleep of fixed_wait seconds (READ_WAIT if None)"""
+        if self.synchronized and not self._fresh_sweep:
+            self.wait_time_saved += (self.READ_WAIT if fixed_wait is None else fixed_wait) - self._single_sweep()
+        self._fresh_sweep = False
+        if self.binary_data:
+            # only the power is sent as REAL,32 - frequencies would lose resolution in single precision
+            start, stop, points = self.SA.query(":FREQ:STAR?;:FREQ:STOP?;:SWE:POIN?").split(";")
+            self.SA.write(":TRAC:DATA? TRACE1")
+            power = read_definite_length_block(self.SA, "<f4")
+            data = np.empty((len(power), 2))
+            data[:, 0] = np.linspace(float(start), float(stop), int(points))
+            data[:, 1] = power
+            return data
         return (self.SA.query("CALC:DATA?"))
 
+    def get_trace(self, fixed_wait=None):
+        """Get the trace data as a numpy array of shape (points, 2) with columns frequency, power [dBm]"""
+        data = self.get_data(fixed_wait)
+        if self.binary_data:
+            return data
+        return np.array(data.split(","), dtype=float).reshape(-1, 2)
+
+    def get_time_trace(self):
+        """Get a zero span trace. Returns (times [s] since the sweep start, power [dBm]) as numpy arrays"""
+        power = self.get_trace()[:, 1]
+        sweep_time = float(self.SA.query(":SWE:TIME?"))
+        return np.linspace(0.0, sweep_time, len(power)), power
+
     def update_property(self, property, value):
         """Update the given property of the instrument to the given value"""
 
@@ -0,0 +1,182 @@
+"""A generic N-dimensional sweep over instrument properties (Instrument.update_property).
+Changing a property costs settling time (e.g. retuning a MG ~100 ms, reconfiguring a SA ~1 s), so the order of
+the points matters: the axes are nested with the most expensive one outermost, and in a snake order every inner
+axis runs back and forth instead of jumping back to its first value - each step then changes exactly one axis.
+Results are written into numpy arrays in the axes' original order as they arrive."""
+
+from itertools import permutations
+from time import time
+import numpy as np
+
+# default settling time [s] per change of a property, used when an axis has no cost of its own
+DEFAULT_COSTS = {
+    "freq": 0.1,
+    "power": 0.1,
+    "on": 0.1,
+    "center_freq": 1.0,
+    "span": 1.0,
+    "BW": 1.0,
+    "points": 1.0,
+    "averaging": 0.1,
+    "avg_count": 0.1,
+    "attenuation": 0.01
+}
+MAX_PERMUTATIONS_AXES = 6  # with more axes, nest by the mean cost of a change instead of trying all nestings
+
+
+class SweepAxis:
+    """An axis of a sweep: the values written to the properties of instruments.
+    targets is an (instrument, property) pair or a list of such pairs which are all set to the same value
+    (e.g. a MG frequency and the center frequency of a SA, both in MHz).
+    cost is the settling time [s] of a change - a number, a function cost(old_value, new_value), or None to use
+    DEFAULT_COSTS of the (first) property"""
+
+    def __init__(self, targets, values, cost=None, name=None):
+        if isinstance(targets, tuple):
+            targets = [targets]
+        self.targets = list(targets)
+        self.values = list(values)
+        if len(self.values) == 0:
+            raise Exception("SweepAxis: an axis needs at least one value")
+        if cost is None:
+            cost = DEFAULT_COSTS.get(self.targets[0][1], 0.0)
+        self.cost = cost
+        self.name = name if name is not None else "/".join(property for (instrument, property) in self.targets)
+
+    def __len__(self):
+        return len(self.values)
+
+    def change_cost(self, old_idx, new_idx):
+        """Settling time [s] of changing the axis from value index old_idx to new_idx"""
+        if old_idx == new_idx:
+            return 0.0
+        if callable(self.cost):
+            return self.cost(self.values[old_idx], self.values[new_idx])
+        return self.cost
+
+    def set(self, idx):
+        for instrument, property in self.targets:
+            instrument.update_property(property, self.values[idx])
+
+
+def sweep_indices(sizes, snake=True):
+    """The indices of the points of a grid of the given sizes (outermost first), in sweep order.
+    returns an array of shape (num_points, len(sizes))"""
+    grid = np.indices(sizes).reshape(len(sizes), -1).T
+    if snake:
+        # an axis runs backwards when the combined index of the axes outside it is odd
+        outer = np.zeros(len(grid), dtype=int)
+        for axis, size in enumerate(sizes):
+            reverse = outer % 2 == 1
+            grid[reverse, axis] = size - 1 - grid[reverse, axis]
+            outer = outer * size + grid[:, axis]
+    return grid
+
+
+class Sweep:
+    """A sweep over the grid of the given SweepAxis axes.
+    The nesting of the axes (and the snake order) is chosen to minimize the total settling time unless nesting
+    (a list of axis numbers, outermost first) is given. measure() is called at every point"""
+
+    def __init__(self, axes, snake=True, nesting=None, timer=time):
+        self.axes = list(axes)
+        self.snake = snake
+        self.timer = timer
+        self.nesting = list(nesting) if nesting is not None else self.best_nesting()
+        if sorted(self.nesting) != list(range(len(self.axes))):
+            raise Exception("Sweep: nesting must be a permutation of the axis numbers")
+        self.shape = tuple(len(axis) for axis in self.axes)
+        self.results = None
+        self.done = np.zeros(self.shape, dtype=bool)
+        self.num_changes = [0] * len(self.axes)
+        self.settle_times = [0.0] * len(self.axes)  # time spent in update_property per axis
+        self.measure_time = 0.0
+
+    def order(self, nesting=None):
+        """The points in sweep order as an array of indices into the axes (in their original order)"""
+        nesting = self.nesting if nesting is None else nesting
+        indices = sweep_indices([len(self.axes[axis]) for axis in nesting], self.snake)
+        ret = np.empty_like(indices)
+        ret[:, nesting] = indices
+        return ret
+
+    def estimate_cost(self, nesting=None):
+        """Total settling time [s] of the sweep with the given nesting, including setting the first point"""
+        indices = self.order(nesting)
+        total = 0.0
+        for axis_num, axis in enumerate(self.axes):
+            column = indices[:, axis_num]
+            steps = np.flatnonzero(np.diff(column) != 0)
+            if callable(axis.cost):
+                total += sum(axis.change_cost(column[idx], column[idx + 1]) for idx in steps)
+            else:
+                total += axis.cost * (len(steps) + 1)
+        return total
+
+    def _mean_cost(self, axis):
+        if not callable(axis.cost):
+            return axis.cost
+        if len(axis) < 2:
+            return 0.0
+        return np.mean([axis.change_cost(idx, idx + 1) for idx in range(len(axis) - 1)])
+
+    def best_nesting(self):
+        """The nesting (outermost axis first) with the least total settling time.
+        With constant costs and a snake order the most expensive axes go outside - this is optimal, as swapping
+        two neighbouring axes only changes which of them moves (n_outer - 1) * n_inner times. Otherwise all
+        nestings are tried (up to MAX_PERMUTATIONS_AXES axes)"""
+        by_cost = sorted(range(len(self.axes)), key=lambda axis: -self._mean_cost(self.axes[axis]))
+        constant_costs = not any(callable(axis.cost) for axis in self.axes)
+        if (self.snake and constant_costs) or len(self.axes) > MAX_PERMUTATIONS_AXES:
+            return by_cost
+        return list(min(permutations(range(len(self.axes))), key=lambda nesting: self.estimate_cost(nesting)))
+
+    def record(self, index, result):
+        """Store the result (a number or an array) of the point index"""
+        result = np.asarray(result)
+        if self.results is None:
+            dtype = result.dtype if result.dtype.kind in "cf" else float
+            self.results = np.full(self.shape + result.shape, np.nan, dtype=dtype)
+        self.results[index] = result
+        self.done[index] = True
+
+    def points(self):
+        """A generator which sets the instruments to every point in turn and yields (index, values) -
+        index into the results array and a dict of axis name:value. Store results with record(index, result)"""
+        current = [None] * len(self.axes)
+        for index in self.order():
+            index = tuple(int(idx) for idx in index)
+            for position in range(len(self.axes)):
+                # outer axes first, as they would be set in nested loops
+                axis_num = self.nesting[position]
+                if index[axis_num] != current[axis_num]:
+                    start = self.timer()
+                    self.axes[axis_num].set(index[axis_num])
+                    self.settle_times[axis_num] += self.timer() - start
+                    self.num_changes[axis_num] += 1
+                    current[axis_num] = index[axis_num]
+            yield index, dict((axis.name, axis.values[idx]) for axis, idx in zip(self.axes, index))
+
+    def run(self, measure, callback=None):
+        """Sweep all points, calling measure() at each one and storing its result.
+        callback(index, values, result) is called after every point (e.g. to update a plot of self.results).
+        returns the results array, of shape (len(axis) for each axis) + the shape of a result"""
+        for index, values in self.points():
+            start = self.timer()
+            result = measure()
+            self.measure_time += self.timer() - start
+            self.record(index, result)
+            if callback is not None:
+                callback(index, values, result)
+        return self.results
+
+    def report(self):
+        """Get a summary of the changes and settling time per axis"""
+        lines = ["Sweep of %d points, nesting (outermost first): %s, %s order" % (
+            int(np.prod(self.shape)), ", ".join(self.axes[axis].name for axis in self.nesting),
+            "snake" if self.snake else "raster")]
+        for axis_num, axis in enumerate(self.axes):
+            lines.append("%20s: %d changes, %f seconds" % (axis.name, self.num_changes[axis_num],
+                                                           self.settle_times[axis_num]))
+        lines.append("%20s: %f seconds" % ("measurement", self.measure_time))
+        return "\n".join(lines)
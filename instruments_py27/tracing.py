@@ -0,0 +1,200 @@
+"""Tracing of where the instrument time goes: every write/query/read of the driver sessions, every traced QM call
+(set_output_dc_offset_by_element, set_mixer_correction, execute, ...) and every driver sleep is timed, and the
+latencies are kept per command as counts, totals and a histogram.
+Tracing is off by default. Call enable() before creating the drivers (visa_registry.open_resource then returns
+traced sessions) and wrap the quantum machine with trace_qm. When tracing is off the drivers use their sessions
+directly and sleep only checks a flag, so there is no overhead.
+At the end of a script print tracer.summary() and/or save tracer.export_json(path) / tracer.export_csv(path)."""
+
+import csv
+import json
+import sys
+import threading
+from bisect import bisect
+from time import sleep as _sleep, time
+
+HISTOGRAM_EDGES = [10 ** (e / 4.0) for e in range(-20, 5)]  # s, 10 us to 10 s, 4 bins per decade
+QM_METHODS = ["set_output_dc_offset_by_element", "set_dc_offset_by_qe", "set_mixer_correction",
+              "set_intermediate_frequency", "execute"]
+
+
+class CommandStats:
+    """Latencies [s] of one command"""
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = 0.0
+        self.histogram = [0] * (len(HISTOGRAM_EDGES) + 1)  # bin i counts latencies in [edge i-1, edge i)
+
+    def add(self, duration):
+        self.count += 1
+        self.total += duration
+        self.min = duration if self.min is None else min(self.min, duration)
+        self.max = max(self.max, duration)
+        self.histogram[bisect(HISTOGRAM_EDGES, duration)] += 1
+
+    def as_dict(self):
+        return {"count": self.count, "total": self.total, "mean": self.total / max(self.count, 1),
+                "min": self.min, "max": self.max, "histogram": self.histogram}
+
+
+class Tracer:
+    """Collects the command latencies of the whole process"""
+
+    def __init__(self, timer=time):
+        self.enabled = False
+        self.timer = timer
+        self.commands = {}  # command name: CommandStats
+        self.start_time = timer()
+        self._lock = threading.Lock()
+
+    def record(self, name, duration):
+        """Add a latency [s] of the given command"""
+        with self._lock:
+            stats = self.commands.get(name)
+            if stats is None:
+                stats = self.commands[name] = CommandStats()
+            stats.add(duration)
+
+    def reset(self):
+        """Forget all latencies and restart the wall clock of the summary"""
+        with self._lock:
+            self.commands = {}
+            self.start_time = self.timer()
+
+    def to_dict(self):
+        """The profile as a dict of elapsed wall time, histogram edges and the statistics of every command"""
+        with self._lock:
+            commands = dict((name, stats.as_dict()) for name, stats in self.commands.items())
+        return {"elapsed": self.timer() - self.start_time, "histogram_edges": HISTOGRAM_EDGES, "commands": commands}
+
+    def export_json(self, path):
+        with open(path, "w") as f:
+            json.dump(self.to_dict(), f, indent=1)
+
+    def export_csv(self, path):
+        """One row per command: name, count, total, mean, min, max [s] and the histogram counts"""
+        profile = self.to_dict()
+        with open(path, "w") as f:
+            writer = csv.writer(f)
+            writer.writerow(["command", "count", "total", "mean", "min", "max"] +
+                            ["< %g" % edge for edge in HISTOGRAM_EDGES] + [">= %g" % HISTOGRAM_EDGES[-1]])
+            for name, stats in sorted(profile["commands"].items()):
+                writer.writerow([name, stats["count"], stats["total"], stats["mean"], stats["min"], stats["max"]] +
+                                stats["histogram"])
+
+    def summary(self, max_rows=30):
+        """Get a table of the commands which took the most time"""
+        profile = self.to_dict()
+        elapsed = profile["elapsed"]
+        rows = sorted(profile["commands"].items(), key=lambda item: -item[1]["total"])
+        traced = sum(stats["total"] for name, stats in rows)
+        lines = ["Traced %.3f s of %.3f s (%.1f%%) in %d calls" % (
+            traced, elapsed, 100.0 * traced / max(elapsed, 1e-12), sum(stats["count"] for name, stats in rows)),
+            "%-45s %8s %10s %7s %10s %10s %10s" % ("command", "count", "total [s]", "%", "mean [ms]", "min [ms]",
+                                                 "max [ms]")]
+        for name, stats in rows[:max_rows]:
+            lines.append("%-45s %8d %10.3f %7.1f %10.3f %10.3f %10.3f" % (
+                name[:45], stats["count"], stats["total"], 100.0 * stats["total"] / max(elapsed, 1e-12),
+                stats["mean"] * 1e3, stats["min"] * 1e3, stats["max"] * 1e3))
+        if len(rows) > max_rows:
+            lines.append("... %d more commands" % (len(rows) - max_rows))
+        return "\n".join(lines)
+
+
+tracer = Tracer()
+
+
+def enable(reset=True):
+    """Start tracing (sessions opened from now on are traced)"""
+    if reset:
+        tracer.reset()
+    tracer.enabled = True
+
+
+def disable():
+    tracer.enabled = False
+
+
+def command_name(command):
+    """The command without its parameters, e.g. ":FREQ:CENTER 5000.0E6" -> ":FREQ:CENTER" and
+    ":INIT:IMM;*OPC?;:CALC:MARK:Y?" as is, so all the values of a setting are counted together"""
+    return ";".join(part.strip().split(" ")[0] for part in command.split(";") if part.strip())
+
+
+def sleep(seconds):
+    """time.sleep, accounted as "sleep <class>.<function>" of the caller when tracing is enabled"""
+    if not tracer.enabled:
+        return _sleep(seconds)
+    start = tracer.timer()
+    _sleep(seconds)
+    frame = sys._getframe(1)
+    caller = frame.f_locals.get("self")
+    name = frame.f_code.co_name if caller is None else "%s.%s" % (caller.__class__.__name__, frame.f_code.co_name)
+    tracer.record("sleep %s" % name, tracer.timer() - start)
+
+
+class TracedSession(object):
+    """A VISA (or SCPISocket) session whose write, query, read and read_raw calls are timed.
+    Everything else, including setting the timeout, goes to the session"""
+
+    def __init__(self, session, address):
+        object.__setattr__(self, "session", session)
+        object.__setattr__(self, "address", address)
+
+    def __getattr__(self, name):
+        return getattr(self.session, name)
+
+    def __setattr__(self, name, value):
+        setattr(self.session, name, value)
+
+    def _timed(self, name, function, *args):
+        start = tracer.timer()
+        try:
+            return function(*args)
+        finally:
+            tracer.record(name, tracer.timer() - start)
+
+    def write(self, command):
+        return self._timed("write %s" % command_name(command), self.session.write, command)
+
+    def query(self, command):
+        return self._timed("query %s" % command_name(command), self.session.query, command)
+
+    def read(self):
+        return self._timed("read", self.session.read)
+
+    def read_raw(self):
+        return self._timed("read_raw", self.session.read_raw)
+
+
+class TracedQM(object):
+    """A quantum machine whose QM_METHODS calls are timed, as "qm <method>" """
+
+    def __init__(self, qm):
+        object.__setattr__(self, "qm", qm)
+
+    def __getattr__(self, name):
+        attribute = getattr(self.qm, name)
+        if name not in QM_METHODS:
+            return attribute
+
+        def timed(*args, **kwargs):
+            start = tracer.timer()
+            try:
+                return attribute(*args, **kwargs)
+            finally:
+                tracer.record("qm %s" % name, tracer.timer() - start)
+        return timed
+
+
+def trace_session(session, address):
+    """The session traced if tracing is enabled, otherwise the session itself"""
+    return TracedSession(session, address) if tracer.enabled else session
+
+
+def trace_qm(qm):
+    """The quantum machine traced if tracing is enabled, otherwise qm itself"""
+    return TracedQM(qm) if tracer.enabled and not isinstance(qm, TracedQM) else qm
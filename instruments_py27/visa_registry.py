@@ -0,0 +1,57 @@
+"""A process wide registry of VISA sessions.
+All drivers share one ResourceManager and open sessions are reused by address, so e.g. the two DDS channels
+of an M9347A share one HiSLIP session, and re-creating drivers in the same process does not reconnect.
+Raw socket addresses (TCPIP0::<host>::<port>::SOCKET) are opened with scpi_socket.SCPISocket instead of VISA.
+When tracing is enabled (see tracing.py) the sessions are returned wrapped in a tracing.TracedSession."""
+
+from . import tracing
+
+_resource_manager = None
+_sessions = {}  # address:open session
+_resource_list = None
+
+
+def get_resource_manager():
+    """Get the shared ResourceManager, creating it on first use"""
+    global _resource_manager
+    if _resource_manager is None:
+        import visa
+        _resource_manager = visa.ResourceManager()
+    return _resource_manager
+
+
+def open_resource(address):
+    """Get an open session for the given VISA address, reusing an existing one"""
+    if address not in _sessions:
+        if address.upper().endswith("::SOCKET"):
+            from .scpi_socket import SCPISocket
+            _sessions[address] = SCPISocket.from_address(address)
+        else:
+            _sessions[address] = get_resource_manager().open_resource(address)
+    return tracing.trace_session(_sessions[address], address)
+
+
+def list_resources(refresh=False):
+    """List the available VISA resources. The (slow) bus scan is done once unless refresh is True"""
+    global _resource_list
+    if _resource_list is None or refresh:
+        _resource_list = get_resource_manager().list_resources()
+    return _resource_list
+
+
+def close_resource(address):
+    """Close the session of the given address (if open). The next open_resource opens a new session"""
+    session = _sessions.pop(address, None)
+    if session is not None:
+        session.close()
+
+
+def close_all():
+    """Close all sessions and the ResourceManager"""
+    global _resource_manager, _resource_list
+    for address in list(_sessions.keys()):
+        close_resource(address)
+    if _resource_manager is not None:
+        _resource_manager.close()
+    _resource_manager = None
+    _resource_list = None
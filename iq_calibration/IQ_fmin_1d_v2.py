@@ -5,7 +5,7 @@ import time
 from time import sleep
 from numpy import linspace
 from datetime import date
-import visa
+from instruments_py27 import visa_registry
 
 # import numpy as np
 from qm import QuantumMachinesManager
@@ -166,11 +166,9 @@ def findMinQ(I0, Q0, currRange, numPoints, qm, SA, plotRes=False):
 
 print("Make sure the Sweep type rule is \"Best speed\"!")
 # setup
-rm = visa.ResourceManager()
-res_list = rm.list_resources()
-# MG = rm.open_resource(MG_address)
+# MG = visa_registry.open_resource(MG_address)
 # setupMG(MG, LOFreq, LOAmp)
-SA = rm.open_resource('USB0::0x0957::0x0B0B::MY47191316::INSTR')
+SA = visa_registry.open_resource('USB0::0x0957::0x0B0B::MY47191316::INSTR')
 qm = open_qm()
 
 with program() as prog:
@@ -6,7 +6,7 @@ import time
 from time import sleep
 import numpy as np
 from numpy import linspace, arange
-import visa
+from instruments_py27 import visa_registry
 
 # import numpy as np
 from qm.QuantumMachinesManager import QuantumMachinesManager
@@ -179,13 +179,11 @@ def findMinQ(I0,Q0,currRange,numPoints,qm,SA,plotRes=False):
 
 print("Make sure the Sweep type rule is \"Best speed\"!")
 #setup
-rm = visa.ResourceManager()
-res_list = rm.list_resources()
-MG = rm.open_resource(MG_address)
+MG = visa_registry.open_resource(MG_address)
 setupMG(MG, LOFreq, LOAmp)
 print("Waiting %f seconds for warm-up" % warmup_time)
 sleep(warmup_time)
-SA = rm.open_resource("GPIB0::24::INSTR")
+SA = visa_registry.open_resource("GPIB0::24::INSTR")
 qm = open_qm()
 
 with program() as prog:
@@ -11,6 +11,7 @@ from numpy import linspace, arange
 # from instruments_py27.anritsu import Anritsu_MG
 from instruments_py27.E8241A import E8241A_MG
 from instruments_py27.spectrum_analyzer import N9010A_SA
+from instruments_py27 import tracing
 
 MG_class = E8241A_MG #Anritsu_MG #
 
@@ -24,6 +25,9 @@ from scipy import optimize
 BW = 100
 num_averages = 3
 wait_time = 1
+synchronized = False # wait for SA sweep completion instead of sleeping wait_time
+trace = False #time every instrument command, QM call and sleep, and print and save the profile
+trace_path = "IQ_fmin_trace.json"
 
 
 MG_address = "GPIB0::28::INSTR"#"GPIB0::5::INSTR" #
@@ -111,7 +115,7 @@ def open_qm():
 def setupSpectrumAnalyzer(SA, LOFreq, BW = 100, num_averages = 8):
     SA.setup_spectrum_analyzer(center_freq=LOFreq, span=10, BW=BW, points=1)
     SA.setup_averaging(True, num_averages)
-    sleep(1.0)
+    SA.wait_for_sweep(1.0)
     SA.set_marker_max()
 
 def getWithIQ(IQ,qm,SA,verbose=False, wait_time=1.0):
@@ -127,7 +131,7 @@ def getWithIQ(IQ,qm,SA,verbose=False, wait_time=1.0):
 
     # sleep(0.1)
     SA.restart_averaging()
-    sleep(wait_time)
+    SA.wait_for_sweep(wait_time)
 
     t = SA.get_marker()
 
@@ -182,12 +186,14 @@ def findMinQ(I0,Q0,currRange,numPoints,qm,SA, wait_time, plotRes=False):
 
 print("Make sure the Sweep type rule is \"Best speed\"!")
 #setup
+if trace:
+    tracing.enable()
 MG = MG_class(MG_address)
 MG.setup_MG(LOFreq, LOAmp)
 print("Waiting %f seconds for warm-up" % warmup_time)
 sleep(warmup_time)
-SA = N9010A_SA(SA_address)
-qm = open_qm()
+SA = N9010A_SA(SA_address, synchronized=synchronized)
+qm = tracing.trace_qm(open_qm())
 
 with program() as prog:
     with infinite_loop_():
@@ -223,6 +229,8 @@ getWithIQ(ret.x,qm,SA,True)
 end = time.time()
 
 print("Elapsed time is %f seconds" % (end-start))
+if synchronized:
+    print(SA.sync_report())
 
 #measure drifts
 if measure_drift:
@@ -236,6 +244,10 @@ if measure_drift:
 
 # turn MG off
 MG.set_on(False)
+if trace:
+    print(tracing.tracer.summary())
+    tracing.tracer.export_json(trace_path)
+    print("Saved the trace to %s" % trace_path)
 
 
 if plotFigs:
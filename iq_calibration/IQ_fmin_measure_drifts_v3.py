@@ -12,6 +12,7 @@ from numpy import linspace, arange
 # from instruments_py27.E8241A import E8241A_MG
 from instruments_py27.M9347A import M9347A_MG #<-- uncomment if needed
 from instruments_py27.spectrum_analyzer import N9010A_SA
+from instruments_py27 import tracing
 
 MG_class = M9347A_MG#Anritsu_MG #E8241A_MG # - choose relevant signal generator (M9347A_MG/Anritsu_MG)
 
@@ -21,10 +22,20 @@ from qm.QuantumMachinesManager import QuantumMachinesManager
 from qm.qua import *
 
 from scipy import optimize
+from calibration.multi_fidelity import MultiFidelityMinimizer
+from calibration.evaluation_cache import QuantizedEvaluationCache
+from calibration.batch_optimizer import PipelinedEvaluator, QuadraticBatchSearch
 
 BW = 100
 num_averages = 3
 wait_time = 1
+synchronized = False # wait for SA sweep completion instead of sleeping wait_time
+multi_fidelity = False # start with a wide RBW and no averaging and tighten them in stages (see calibration/multi_fidelity.py)
+batch_search = False # fit a paraboloid to batches of grid points measured in a pipeline (see calibration/batch_optimizer.py)
+settle_time = 0.0 # seconds between setting the offsets and starting a measurement in batch mode
+cache_max_age = None # if set, repeated I,Q points (at the DAC resolution) are served from a cache for up to this many seconds
+trace = False #time every instrument command, QM call and sleep, and print and save the profile
+trace_path = "IQ_fmin_trace.json"
 
 
 MG_address = ("TCPIP0::DESKTOP-VT04ESJ::hislip1::INSTR",2)# #"GPIB0::28::INSTR"#"GPIB0::5::INSTR" #- for Anritsu #
@@ -112,7 +123,7 @@ def open_qm():
 def setupSpectrumAnalyzer(SA, LOFreq, BW = 100, num_averages = 8):
     SA.setup_spectrum_analyzer(center_freq=LOFreq, span=10, BW=BW, points=1)
     SA.setup_averaging(True, num_averages)
-    sleep(1.0)
+    SA.wait_for_sweep(1.0)
     SA.set_marker_max()
 
 def getWithIQ(IQ,qm,SA,verbose=False, wait_time=1.0):
@@ -128,7 +139,7 @@ def getWithIQ(IQ,qm,SA,verbose=False, wait_time=1.0):
 
     # sleep(0.1)
     SA.restart_averaging()
-    sleep(wait_time)
+    SA.wait_for_sweep(wait_time)
 
     t = SA.get_marker()
 
@@ -183,12 +194,14 @@ def findMinQ(I0,Q0,currRange,numPoints,qm,SA, wait_time, plotRes=False):
 
 print("Make sure the Sweep type rule is \"Best speed\"!")
 #setup
+if trace:
+    tracing.enable()
 MG = MG_class(MG_address)
 MG.setup_MG(LOFreq, LOAmp)
 print("Waiting %f seconds for warm-up" % warmup_time)
 sleep(warmup_time)
-SA = N9010A_SA(SA_address)
-qm = open_qm()
+SA = N9010A_SA(SA_address, synchronized=synchronized)
+qm = tracing.trace_qm(open_qm())
 
 with program() as prog:
     with infinite_loop_():
@@ -214,8 +227,30 @@ start = time.time()
 #     currMin, Q0 = findMinQ(I0,Q0,currRange,numPoints,qm,SA,wait_time,plotFigs) #Scan Q
 #     print ("Range = %f, I0 = %f, Q0 = %f, currMin = %f " % (currRange,I0,Q0,currMin))
 #     currRange = currRange/2
-ret = optimize.minimize(getWithIQ, x0=[I0,Q0], method="Nelder-Mead", args=(qm, SA, True, wait_time),options={"xatol":1e-4,"fatol":2,"disp":True,
-    "initial_simplex":np.array([[-0.02,0.02],[0.02,0.02],[0,-0.02]])})
+measure = getWithIQ if cache_max_age is None else QuantizedEvaluationCache(getWithIQ, max_age=cache_max_age)
+if multi_fidelity:
+    # readings of different stages are not comparable, so the cache is cleared at each stage
+    clear_cache = None if cache_max_age is None else (lambda stage: measure.clear())
+    minimizer = MultiFidelityMinimizer(SA, lambda IQ, stage_wait_time: measure(IQ, qm, SA, True, stage_wait_time),
+                                       verbose=True, on_stage=clear_cache)
+    ret = minimizer.minimize([I0,Q0])
+    print(minimizer.report())
+elif batch_search:
+    def set_point(IQ):
+        qm.set_output_dc_offset_by_element("RR1","single",float(IQ[0]))
+        qm.set_output_dc_offset_by_element("RR2","single",float(IQ[1]))
+
+    def acquire():
+        SA.restart_averaging()
+        SA.wait_for_sweep(wait_time)
+
+    # with a synchronized SA the trace is frozen after the sweep, so the next point can settle during the read
+    evaluator = PipelinedEvaluator(set_point, acquire, SA.get_marker, settle_time, overlap=synchronized)
+    ret = QuadraticBatchSearch(evaluator).minimize([I0,Q0], currRange, minimum=minimum)
+    print(evaluator.report())
+else:
+    ret = optimize.minimize(measure, x0=[I0,Q0], method="Nelder-Mead", args=(qm, SA, True, wait_time),options={"xatol":1e-4,"fatol":2,"disp":True,
+        "initial_simplex":np.array([[-0.02,0.02],[0.02,0.02],[0,-0.02]])})
 # ret = optimize.minimize(getWithIQ, x0=[I0,Q0], method="Nelder-Mead", args=(qm, SA, True, wait_time),options={"xatol":1e-4,"fatol":2,"disp":True,
 #     "initial_simplex":np.array([[-0.1,0.1],[0.1,0.1],[0,-0.1]])})
 print(ret)
@@ -224,6 +259,10 @@ getWithIQ(ret.x,qm,SA,True)
 end = time.time()
 
 print("Elapsed time is %f seconds" % (end-start))
+if synchronized:
+    print(SA.sync_report())
+if cache_max_age is not None:
+    print(measure.report())
 
 #measure drifts
 if measure_drift:
@@ -237,6 +276,10 @@ if measure_drift:
 
 # turn MG off
 MG.set_on(False)
+if trace:
+    print(tracing.tracer.summary())
+    tracing.tracer.export_json(trace_path)
+    print("Saved the trace to %s" % trace_path)
 
 
 if plotFigs:
@@ -5,11 +5,27 @@ from time import sleep
 from matplotlib import pyplot as plt
 import instruments_py27.spectrum_analyzer as SA
 import instruments_py27.anritsu as MG
+from instruments_py27 import tracing
+from calibration.ellipse_fit import fit_ellipse, format_fit
+from OPX.config_generator import ConfigGenerator
+import OPX.rotating_phasor as phasor
 
 #parameters
 num_points = 101 #angular points to test response
+use_ellipse_fit = False #fit the model to all the angular points instead of measuring six more angles (then e.g. 12 points are enough)
 averaging = False
+synchronized = False #wait for SA sweep completion instead of fixed sleeps
+trace = False #time every instrument command, QM call and sleep, and print and save the profile
+trace_path = "IQmixer_response_trace.json"
 amp = 0.01 #I,Q amplitude
+#fast mode - get the (uncalibrated) response from a rotating phasor in a single zero span sweep instead of num_points DC settings
+rotating_phasor = False
+phasor_period = 16000 #ns per rotation
+phasor_blank = 1000 #ns at the start of each rotation without the phasor - marks theta=0 in the trace
+phasor_rotations = 10 #rotations per sweep
+phasor_BW = 3e6 #SA RBW [Hz] - has to follow the rotation
+phasor_points = 10001
+trigger_port = None #OPX digital output connected to the SA external trigger input (EXT1), None for free run
 
 
 mg_address = "GPIB0::7::INSTR"
@@ -29,55 +45,18 @@ Q0 = 0.069609
 
 
 def open_qm():
-    qmManager = QuantumMachinesManager()
+    cg = ConfigGenerator(output_offsets={I_port: 0.0, Q_port: 0.0})
+    cg.add_single_input_element("RR1", 0.0, I_port)
+    cg.add_single_input_element("RR2", 0.0, Q_port)
+    cg.add_constant_waveform("zero_wave", 0.0)
+    cg.add_single_control_pulse("my_pulse", 2000, "zero_wave")
+    cg.add_operation("RR1", "pulse", "my_pulse")
+    cg.add_operation("RR2", "pulse", "my_pulse")
+    if rotating_phasor:
+        phasor.add_phasor_pulses(cg, "RR1", "RR2", amp, phasor_period, phasor_blank, trigger_port)
 
-    return qmManager.open_qm({
-        "version" : 1 ,
-        "controllers": {
-            "con1": {
-                "type": "opx1",
-                "analog_outputs": {
-                    I_port: {"offset": 0.0},
-                    Q_port: {"offset": 0.0}
-                }
-            }
-        },
-        "elements": {
-            "RR1": {
-                "singleInput": {
-                    "port": ("con1", I_port)
-                },
-                "intermediate_frequency": 0.0,
-                "operations": {
-                    "pulse": "my_pulse"
-                }
-            },
-            "RR2": {
-                "singleInput": {
-                    "port": ("con1", Q_port)
-                },
-                "intermediate_frequency": 0.0,
-                "operations": {
-                    "pulse": "my_pulse"
-                }
-            }
-        },
-        "pulses": {
-            "my_pulse": {
-                "operation": "control",
-                "length": 2000,
-                "waveforms": {
-                    "single": "zero_wave"
-                }
-            }
-        },
-        "waveforms": {
-            "zero_wave": {
-                "type": "constant",
-                "sample": 0.0
-            }
-        }
-    })
+    qmManager = QuantumMachinesManager()
+    return qmManager.open_qm(cg.get_config())
 
 
 def getWithIQ(IQ,qm,sa, averaging = False, verbose=False):
@@ -88,9 +67,9 @@ def getWithIQ(IQ,qm,sa, averaging = False, verbose=False):
     qm.set_output_dc_offset_by_element("RR2","single",float(IQ[1]))
     if averaging:
         sa.restart_averaging()
-        sleep(1.0)
+        sa.wait_for_sweep(1.0)
     else:
-        sleep(0.2)
+        sa.wait_for_sweep(0.2)
     sa.set_marker_max()
     t = sa.get_marker()
 
@@ -117,10 +96,12 @@ def plot_ellipse(plt, theta, volt, title, figs=[None, None]):
 #-------------------program-----------------
 plt.ion()
 
+if trace:
+    tracing.enable()
 mg = MG.Anritsu_MG(mg_address)
 mg.setup_MG(lo_freq,lo_amp)
 #init spectrum analyzer
-sa = SA.N9010A_SA(sa_address)
+sa = SA.N9010A_SA(sa_address, synchronized=synchronized)
 sa.setup_spectrum_analyzer(center_freq=lo_freq,span=1,BW=100,points=1)
 if averaging:
     sa.setup_averaging(True, 4)
@@ -128,7 +109,7 @@ else:
     sa.setup_averaging(False)
 
 
-qm = open_qm()
+qm = tracing.trace_qm(open_qm())
 
 with program() as prog:
     with infinite_loop_():
@@ -147,17 +128,32 @@ Q = amp*np.sin(theta)
 # I = amp*np.cos(theta)
 # Q = amp*np.sin(theta)
 
-print("Getting response...")
-getWithIQ([I0,Q0],qm,sa) #to prevent problems
-for idx in range(len(theta)):
-    iq = [I[idx]+I0,Q[idx]+Q0]
-    # iq = [I[idx], Q[idx]]
-    power[idx] = getWithIQ(iq,qm,sa,averaging=averaging)
+if rotating_phasor:
+    print("Getting response from a rotating phasor...")
+    getWithIQ([I0,Q0],qm,sa) #the phasor rotates around the DC offsets
+    job = qm.execute(phasor.build_phasor_program("RR1", "RR2"), experimental_calculations=False)
+    phasor.setup_capture(sa, lo_freq, phasor_period, phasor_rotations, phasor_BW, phasor_points,
+                         None if trigger_port is None else "EXT1")
+    times, trace = sa.get_time_trace()
+    theta_p, power_p = phasor.trace_to_response(times, trace, phasor_period, phasor_blank)
+    volt_p = np.sqrt(10**(power_p/10.0)*50)
+    plot_ellipse(plt, theta_p, volt_p, "Uncalibrated (rotating phasor)",[1,2])
+    #back to DC offsets for the rest of the measurement
+    phasor.end_capture(sa)
+    sa.setup_spectrum_analyzer(center_freq=lo_freq,span=1,BW=100,points=1)
+    job = qm.execute(prog, experimental_calculations=False)
+else:
+    print("Getting response...")
+    getWithIQ([I0,Q0],qm,sa) #to prevent problems
+    for idx in range(len(theta)):
+        iq = [I[idx]+I0,Q[idx]+Q0]
+        # iq = [I[idx], Q[idx]]
+        power[idx] = getWithIQ(iq,qm,sa,averaging=averaging)
 
-volt = np.sqrt(10**(power/10.0)*50)
+    volt = np.sqrt(10**(power/10.0)*50)
 
-#plot
-plot_ellipse(plt, theta, volt, "Uncalibrated",[1,2])
+    #plot
+    plot_ellipse(plt, theta, volt, "Uncalibrated",[1,2])
 
 # #calibrate angle - set maximal voltage to theta=0
 # theta0 = theta[volt.argmax()]
@@ -198,21 +194,32 @@ plot_ellipse(plt, theta, volt, "Uncalibrated",[1,2])
 # plot_ellipse(plt, theta, volt, "Corrected",[5, 6])
 
 # #test model
-theta_m = np.array([0,np.pi,np.pi/2,3*np.pi/2,np.pi/4,7*np.pi/4])
-power_m = np.zeros(theta_m.shape)
-I_m = amp*np.cos(theta_m)
-Q_m = amp*np.sin(theta_m)
-print("Getting response...")
-getWithIQ([I0,Q0],qm,sa) #to prevent problems
-for idx in range(len(theta_m)):
-    iq = [I_m[idx]+I0,Q_m[idx]+Q0]
-    power_m[idx] = getWithIQ(iq,qm,sa,averaging=averaging)
-
-volt_m = np.sqrt(10**(power_m/10.0)*50)
-g_I = np.mean([volt_m[0],volt_m[1]])
-g_Q = np.mean([volt_m[2],volt_m[3]])
-x = volt_m[4]**2-volt_m[5]**2
-phi = np.arcsin(x/(2*g_I*g_Q))
+if rotating_phasor:
+    fit = fit_ellipse(theta_p, volt_p, amp)
+    print("Ellipse fit (rotating phasor): " + format_fit(fit))
+    print("Residual offset: the null is at I=%f, Q=%f" % (I0-fit["delta_I"], Q0-fit["delta_Q"]))
+    g_I, g_Q, phi = fit["g_I"], fit["g_Q"], fit["phi"]
+elif use_ellipse_fit:
+    fit = fit_ellipse(theta, volt, amp)
+    print("Ellipse fit: " + format_fit(fit))
+    print("Residual offset: the null is at I=%f, Q=%f" % (I0-fit["delta_I"], Q0-fit["delta_Q"]))
+    g_I, g_Q, phi = fit["g_I"], fit["g_Q"], fit["phi"]
+else:
+    theta_m = np.array([0,np.pi,np.pi/2,3*np.pi/2,np.pi/4,7*np.pi/4])
+    power_m = np.zeros(theta_m.shape)
+    I_m = amp*np.cos(theta_m)
+    Q_m = amp*np.sin(theta_m)
+    print("Getting response...")
+    getWithIQ([I0,Q0],qm,sa) #to prevent problems
+    for idx in range(len(theta_m)):
+        iq = [I_m[idx]+I0,Q_m[idx]+Q0]
+        power_m[idx] = getWithIQ(iq,qm,sa,averaging=averaging)
+
+    volt_m = np.sqrt(10**(power_m/10.0)*50)
+    g_I = np.mean([volt_m[0],volt_m[1]])
+    g_Q = np.mean([volt_m[2],volt_m[3]])
+    x = volt_m[4]**2-volt_m[5]**2
+    phi = np.arcsin(x/(2*g_I*g_Q))
 model = np.sqrt(g_I**2*np.cos(theta)**2+g_Q**2*np.sin(theta)**2+g_I*g_Q*np.sin(phi)*np.sin(2*theta))
 plt.figure(1)
 plt.polar(theta,model,'k')
@@ -247,8 +254,14 @@ volt = np.sqrt(10**(power/10.0)*50)
 #plot
 plot_ellipse(plt, theta, volt, "Calibarted",[7,8])
 
+if synchronized:
+    print(sa.sync_report())
 
 mg.set_on(False)
+if trace:
+    print(tracing.tracer.summary())
+    tracing.tracer.export_json(trace_path)
+    print("Saved the trace to %s" % trace_path)
 
 
 
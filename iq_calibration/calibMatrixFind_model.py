@@ -9,13 +9,21 @@ from matplotlib import pyplot as plt
 from time import sleep
 import instruments_py27.spectrum_analyzer as SA
 import instruments_py27.anritsu as MG
+from instruments_py27 import tracing
 from scipy import optimize
+from calibration.ellipse_fit import fit_ellipse, format_fit
+from calibration.evaluation_cache import QuantizedEvaluationCache, correction_key
+from calibration.mixer_model import model_corr_mat
 
 #parameters
 
 #instruments
 mg_address = "GPIB0::5::INSTR" #"GPIB0::7::INSTR"
 sa_address = "GPIB0::24::INSTR"
+synchronized = False #wait for SA sweep completion instead of fixed sleeps
+trace = False #time every instrument command, QM call and sleep, and print and save the profile
+trace_path = "calibMatrixFind_trace.json"
+cache_max_age = None #if set, repeated (g,phi) points (same correction matrix at the hardware resolution) are served from a cache for up to this many seconds
 
 #OPX ports to which the I,Q ports of the IQ mixer are connected
 I_channel = 1
@@ -33,6 +41,7 @@ if_freq = 0e6#20e6
 
 #IQ response
 num_points_IQ = 101 #angular points to test response
+use_ellipse_fit = False #fit the model to all the angular points instead of measuring six more angles (then e.g. 12 points are enough)
 response_amp = 0.1 #I,Q amplitude
 
 #SBM
@@ -57,7 +66,7 @@ def getWithIQ(IQ, qm, sa, element_name, verbose=False):
         print("Setting I=%f, Q=%f" % (IQ[0],IQ[1]))
     qm.set_output_dc_offset_by_element(element_name,"I",float(IQ[0]))
     qm.set_output_dc_offset_by_element(element_name,"Q",float(IQ[1]))
-    sleep(0.5)#sleep(0.2)
+    sa.wait_for_sweep(0.5)#sleep(0.2)
     sa.set_marker_max()
     t = sa.get_marker()
 
@@ -76,20 +85,11 @@ def plot_ellipse(plt, theta, volt, title, figs=[None, None]):
     plt.ylabel("Voltage ($\sqrt{10^{P/10}\cdot 50}$)")
     plt.title(title)
 
-def model_corr_mat(g, phi):
-    """See my OneNote documentation (Naftali)"""
-    scaling_m = np.array([[g, 0], [0, 1]])
-    rot_m = (1 / (np.cos(phi / 2) ** 2 - np.sin(phi / 2) ** 2)) * np.array(
-        [[np.cos(phi / 2), -np.sin(phi / 2)], [-np.sin(phi / 2), np.cos(phi / 2)]])
-    mm = scaling_m @ rot_m
-
-    return mm.flatten()
-
 def check_with_model_corr(corr_params, qm, mixer_name, sa, lo_freq, if_freq, sleep_time=1.0, averaging = True):
-    qm.set_mixer_correction(mixer_name, int(if_freq), int(lo_freq), tuple(model_corr_mat(*corr_params)))
+    qm.set_mixer_correction(mixer_name, int(if_freq), int(lo_freq), tuple(model_corr_mat(*corr_params).flatten()))
     if averaging:
         sa.restart_averaging()
-    sleep(sleep_time)
+    sa.wait_for_sweep(sleep_time)
     neg = sa.get_marker()
     print("setting g=%f, phi=%f. negative=%f" % (corr_params[0],corr_params[1], neg))
     return neg
@@ -111,16 +111,18 @@ with program() as SBM_prog:
 #setup
 plt.ion()
 
+if trace:
+    tracing.enable()
 mg = MG.Anritsu_MG(mg_address)
 mg.setup_MG(lo_freq/1e6,lo_amp)
 #init spectrum analyzer
-sa = SA.N9010A_SA(sa_address)
+sa = SA.N9010A_SA(sa_address, synchronized=synchronized)
 sa.setup_spectrum_analyzer(center_freq=lo_freq/1e6,span=1,BW=100,points=1)
 sa.setup_averaging(False)
 
 
 qmManager = QuantumMachinesManager()
-qm = qmManager.open_qm(cg.get_config())
+qm = tracing.trace_qm(qmManager.open_qm(cg.get_config()))
 
 #----IQ response----
 job = qm.execute(IQ_response_prog, experimental_calculations=False)
@@ -143,21 +145,27 @@ volt = np.sqrt(10**(power/10.0)*50)
 plot_ellipse(plt, theta, volt, "Uncalibrated",[1,2])
 
 #Extract model parameters
-theta_m = np.array([0,np.pi,np.pi/2,3*np.pi/2,np.pi/4,7*np.pi/4])
-power_m = np.zeros(theta_m.shape)
-I_m = response_amp*np.cos(theta_m)
-Q_m = response_amp*np.sin(theta_m)
-print("Getting response for model...")
-getWithIQ([I_offset,Q_offset],qm,sa,"mixer") #to prevent problems
-for idx in range(len(theta_m)):
-    iq = [I_m[idx]+I_offset,Q_m[idx]+Q_offset]
-    power_m[idx] = getWithIQ(iq,qm,sa,"mixer")
-
-volt_m = np.sqrt(10**(power_m/10.0)*50)
-g_I = np.mean([volt_m[0],volt_m[1]])
-g_Q = np.mean([volt_m[2],volt_m[3]])
-x = volt_m[4]**2-volt_m[5]**2
-phi = np.arcsin(x/(2*g_I*g_Q))
+if use_ellipse_fit:
+    fit = fit_ellipse(theta, volt, response_amp)
+    print("Ellipse fit: " + format_fit(fit))
+    print("Residual offset: the null is at I=%f, Q=%f" % (I_offset-fit["delta_I"], Q_offset-fit["delta_Q"]))
+    g_I, g_Q, phi = fit["g_I"], fit["g_Q"], fit["phi"]
+else:
+    theta_m = np.array([0,np.pi,np.pi/2,3*np.pi/2,np.pi/4,7*np.pi/4])
+    power_m = np.zeros(theta_m.shape)
+    I_m = response_amp*np.cos(theta_m)
+    Q_m = response_amp*np.sin(theta_m)
+    print("Getting response for model...")
+    getWithIQ([I_offset,Q_offset],qm,sa,"mixer") #to prevent problems
+    for idx in range(len(theta_m)):
+        iq = [I_m[idx]+I_offset,Q_m[idx]+Q_offset]
+        power_m[idx] = getWithIQ(iq,qm,sa,"mixer")
+
+    volt_m = np.sqrt(10**(power_m/10.0)*50)
+    g_I = np.mean([volt_m[0],volt_m[1]])
+    g_Q = np.mean([volt_m[2],volt_m[3]])
+    x = volt_m[4]**2-volt_m[5]**2
+    phi = np.arcsin(x/(2*g_I*g_Q))
 model = np.sqrt(g_I**2*np.cos(theta)**2+g_Q**2*np.sin(theta)**2+g_I*g_Q*np.sin(phi)*np.sin(2*theta))
 plt.figure(1)
 plt.polar(theta,model,'k')
@@ -183,17 +191,18 @@ getWithIQ([I_offset,Q_offset],qm,sa,"mixer")  #reset offsets
 sa.setup_spectrum_analyzer(center_freq=(lo_freq+if_freq)/1e6,span=10e3,BW=10,points=10000)
 # sa.setup_spectrum_analyzer(center_freq=(lo_freq-if_freq)/1e6,span=10e3,BW=10,points=1000)
 job = qm.execute(SBM_prog, experimental_calculations=False)
-sleep(1.0)
+sa.wait_for_sweep(1.0)
 sa.set_marker_max()
 qm.set_mixer_correction("mixer", int(if_freq), int(lo_freq), tuple((scaling_m@rot_m).flatten()))
 g = g_Q/g_I
 eps = 0.2
-ret = optimize.minimize(check_with_model_corr, x0=[g,phi], method="Nelder-Mead", args=(qm, "mixer", sa, lo_freq, if_freq),
+check = check_with_model_corr if cache_max_age is None else QuantizedEvaluationCache(check_with_model_corr, correction_key, cache_max_age)
+ret = optimize.minimize(check, x0=[g,phi], method="Nelder-Mead", args=(qm, "mixer", sa, lo_freq, if_freq),
                         options = {"xatol": 1e-4, "fatol": 2,
                                     "initial_simplex": np.array([[np.max([g-eps,0]), phi+eps], [np.min([g+eps,1]), phi+eps], [g, phi-eps]])})
 
 print("Setting matrix to optimal:")
-qm.set_mixer_correction("mixer", int(if_freq), int(lo_freq), tuple(model_corr_mat(*ret.x)))
+qm.set_mixer_correction("mixer", int(if_freq), int(lo_freq), tuple(model_corr_mat(*ret.x).flatten()))
 
 #plot calibrated model
 g_Q_cal = g_Q
@@ -204,7 +213,16 @@ plt.figure(1)
 plt.polar(theta,model_cal,'--')
 plt.legend(["Measurement","Model","Optimized model"])
 
+if synchronized:
+    print(sa.sync_report())
+if cache_max_age is not None:
+    print(check.report())
+
 #turn MG off
 mg.set_on(False)
+if trace:
+    print(tracing.tracer.summary())
+    tracing.tracer.export_json(trace_path)
+    print("Saved the trace to %s" % trace_path)
 
 
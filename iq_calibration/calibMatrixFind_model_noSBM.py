@@ -10,13 +10,18 @@ from matplotlib import pyplot as plt
 from time import sleep
 import instruments_py27.spectrum_analyzer as SA
 import instruments_py27.anritsu as MG
+from instruments_py27 import tracing
 from scipy import optimize
+from calibration.mixer_model import model_corr_mat
 
 #parameters
 
 #instruments
 mg_address = "GPIB0::5::INSTR" #"GPIB0::7::INSTR"
 sa_address = "GPIB0::24::INSTR"
+synchronized = False #wait for SA sweep completion instead of fixed sleeps
+trace = False #time every instrument command, QM call and sleep, and print and save the profile
+trace_path = "calibMatrixFind_noSBM_trace.json"
 
 averaging = True
 num_averages = 10
@@ -57,7 +62,7 @@ def getWithIQ(IQ, qm, sa, element_name, verbose=False, averaging = True):
     qm.set_output_dc_offset_by_element(element_name,"Q",float(IQ[1]))
     if averaging:
         sa.restart_averaging()
-    sleep(1.0)#sleep(0.2)
+    sa.wait_for_sweep(1.0)#sleep(0.2)
     sa.set_marker_max()
     t = sa.get_marker()
 
@@ -76,15 +81,6 @@ def plot_ellipse(plt, theta, volt, title, figs=[None, None]):
     plt.ylabel("Voltage ($\sqrt{10^{P/10}\cdot 50}$)")
     plt.title(title)
 
-def model_corr_mat(g, phi):
-    """See my OneNote documentation (Naftali)"""
-    scaling_m = np.array([[g, 0], [0, 1]])
-    rot_m = (1 / (np.cos(phi / 2) ** 2 - np.sin(phi / 2) ** 2)) * np.array(
-        [[np.cos(phi / 2), -np.sin(phi / 2)], [-np.sin(phi / 2), np.cos(phi / 2)]])
-    mm = scaling_m @ rot_m
-
-    return mm.flatten()
-
 #---QM programs---
 #IQ response
 with program() as IQ_response_prog:
@@ -96,17 +92,19 @@ with program() as IQ_response_prog:
 #setup
 plt.ion()
 
+if trace:
+    tracing.enable()
 mg = MG.Anritsu_MG(mg_address)
 mg.setup_MG(lo_freq/1e6,lo_amp)
 #init spectrum analyzer
-sa = SA.N9010A_SA(sa_address)
+sa = SA.N9010A_SA(sa_address, synchronized=synchronized)
 sa.setup_spectrum_analyzer(center_freq=lo_freq/1e6,span=1,BW=1000,points=1)
 sa.setup_averaging(True,10)
 # sa.setup_averaging(False)
 
 
 qmManager = QuantumMachinesManager()
-qm = qmManager.open_qm(cg.get_config())
+qm = tracing.trace_qm(qmManager.open_qm(cg.get_config()))
 
 #----IQ response----
 job = qm.execute(IQ_response_prog, experimental_calculations=False)
@@ -168,7 +166,14 @@ plot_ellipse(plt, theta, volt, "Calibarted",[7,8])
 
 plt.legend(["Measurement","Model"])
 
+if synchronized:
+    print(sa.sync_report())
+
 #turn MG off
 mg.set_on(False)
+if trace:
+    print(tracing.tracer.summary())
+    tracing.tracer.export_json(trace_path)
+    print("Saved the trace to %s" % trace_path)
 
 
@@ -0,0 +1,151 @@
+#Calibrate an IQ mixer (LO leakage offsets and the (g, phi) imbalance model) over a grid of LO frequencies and IFs
+#using calibration/frequency_sweep.py. Each point starts from the nearest calibrated one, and the sweep can be
+#interrupted and rerun - it resumes from the checkpoint file.
+
+import json
+from qm.QuantumMachinesManager import QuantumMachinesManager
+from qm.qua import *
+import OPX.config_generator as config_generator
+import numpy as np
+from scipy import optimize
+import instruments_py27.spectrum_analyzer as SA
+import instruments_py27.anritsu as MG
+from calibration.mixer_model import model_corr_mat
+from calibration.frequency_sweep import CalibrationSweep
+from calibration.calibration_db import CalibrationDB
+from instruments_py27 import tracing
+
+#parameters
+
+#instruments
+mg_address = "GPIB0::5::INSTR"
+sa_address = "GPIB0::24::INSTR"
+synchronized = True #wait for SA sweep completion instead of fixed sleeps
+wait_time = 0.5 #seconds per measurement when not synchronized
+
+#OPX ports to which the I,Q ports of the IQ mixer are connected
+I_channel = 1
+Q_channel = 3
+
+#grid
+lo_freqs = np.arange(4.5e9, 6.0e9 + 1, 100e6) #Hz
+if_freqs = [-100e6, -50e6, 50e6, 100e6] #Hz
+lo_amp = 18.0
+
+#starting simplex sizes - for a cold start (first point) and for a start from a neighbour
+cold_simplex = {"offsets": 0.05, "imbalance": 0.2}
+warm_simplex = {"offsets": 0.005, "imbalance": 0.02}
+max_evaluations = 60 #per calibration
+
+#SBM
+ampl = 0.1
+pulse_length = 100000
+
+#output
+checkpoint_path = "frequency_grid_checkpoint.json"
+corrections_path = "frequency_grid_corrections.json"
+db_path = None #e.g. "calibrations.db" to also store the results in a CalibrationDB
+mixer_name = "mixer_I%d_Q%d" % (I_channel, Q_channel)
+trace = False #time every instrument command, QM call and sleep, and save the profile
+trace_path = "frequency_grid_trace.json"
+
+#---functions---
+def make_config(lo_freq):
+    """OPX config for one LO - the element's LO can not be changed in a running quantum machine"""
+    cg = config_generator.ConfigGenerator(output_offsets={I_channel:0.0,Q_channel:0.0},input_offsets={1:0.0, 2:0.0})
+    cg.add_mixer("mixer",{(lo_freq, if_freq):[1.0,0.0,0.0,1.0] for if_freq in if_freqs})
+    cg.add_mixed_input_element("mixer",lo_freq+if_freqs[0],lo_freq,I_channel,Q_channel,"mixer")
+    cg.add_constant_waveform("const", ampl)
+    cg.add_constant_waveform("zeros", 0.0)
+    cg.add_mixed_control_pulse("const_pulse",pulse_length,["const","zeros"])
+    cg.add_operation("mixer", "control_const", "const_pulse")
+    cg.add_mixed_control_pulse("zero_pulse",pulse_length,["zeros","zeros"])
+    cg.add_operation("mixer", "control_zero", "zero_pulse")
+    return cg.get_config()
+
+def measure(center_freq):
+    sa.setup_spectrum_analyzer(center_freq=center_freq/1e6,span=10e3,BW=100,points=1)
+    sa.set_marker_max()
+    sa.wait_for_sweep(wait_time)
+    return sa.get_marker()
+
+def start_point(guess, default, stage):
+    x0 = np.array(default if guess is None else guess, dtype=float)
+    size = (cold_simplex if guess is None else warm_simplex)[stage]
+    return x0, np.array([x0, x0 + [size, 0.0], x0 + [0.0, size]])
+
+def set_lo(lo_freq):
+    global qm
+    mg.setup_MG(lo_freq/1e6,lo_amp)
+    if qm is not None:
+        qm.close()
+    qm = tracing.trace_qm(qmManager.open_qm(make_config(lo_freq)))
+
+def set_offsets(IQ):
+    qm.set_output_dc_offset_by_element("mixer","I",float(IQ[0]))
+    qm.set_output_dc_offset_by_element("mixer","Q",float(IQ[1]))
+
+def calibrate_offsets(lo_freq, guess):
+    qm.execute(zero_prog, experimental_calculations=False)
+    x0, simplex = start_point(guess, [0.0, 0.0], "offsets")
+    def leakage(IQ):
+        set_offsets(IQ)
+        return measure(lo_freq)
+    ret = optimize.minimize(leakage, x0, method="Nelder-Mead",
+                            options={"xatol": 1e-5, "fatol": 1, "maxfev": max_evaluations, "initial_simplex": simplex})
+    return ret.x
+
+def calibrate_imbalance(lo_freq, if_freq, offsets, guess):
+    set_offsets(offsets)
+    qm.set_intermediate_frequency("mixer", if_freq)
+    qm.execute(SBM_prog, experimental_calculations=False)
+    x0, simplex = start_point(guess, [1.0, 0.0], "imbalance")
+    def image(corr_params):
+        qm.set_mixer_correction("mixer", int(if_freq), int(lo_freq), tuple(model_corr_mat(*corr_params).flatten()))
+        return measure(lo_freq-if_freq)
+    ret = optimize.minimize(image, x0, method="Nelder-Mead",
+                            options={"xatol": 1e-4, "fatol": 1, "maxfev": max_evaluations, "initial_simplex": simplex})
+    return ret.x
+
+#---QM programs---
+with program() as zero_prog:
+    with infinite_loop_():
+        play("control_zero","mixer")
+
+with program() as SBM_prog:
+    with infinite_loop_():
+        play("control_const","mixer")
+
+#----main program---
+if trace:
+    tracing.enable()
+mg = MG.Anritsu_MG(mg_address)
+sa = SA.N9010A_SA(sa_address, synchronized=synchronized)
+sa.setup_averaging(False)
+qmManager = QuantumMachinesManager()
+qm = None
+
+db = None if db_path is None else CalibrationDB(db_path)
+sweep = CalibrationSweep(lo_freqs, if_freqs, set_lo, calibrate_offsets, calibrate_imbalance, checkpoint_path, db,
+                         mixer_name, lo_amp)
+corrections = sweep.run()
+print(sweep.report())
+
+#the corrections for ConfigGenerator.add_mixer and the offsets per LO
+with open(corrections_path, "w") as f:
+    json.dump({"corrections": [[lo_freq, if_freq, correction] for (lo_freq, if_freq), correction in corrections.items()],
+               "offsets": [[lo_freq, I_offset, Q_offset] for lo_freq, (I_offset, Q_offset) in sweep.offsets.items()]},
+              f, indent=1)
+print("Saved corrections to %s" % corrections_path)
+
+if synchronized:
+    print(sa.sync_report())
+if db is not None:
+    db.close()
+
+#turn MG off
+mg.set_on(False)
+if trace:
+    print(tracing.tracer.summary())
+    tracing.tracer.export_json(trace_path)
+    print("Saved the trace to %s" % trace_path)
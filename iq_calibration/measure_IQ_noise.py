@@ -4,15 +4,53 @@ import numpy as np
 from qm.QuantumMachinesManager import QuantumMachinesManager
 from qm.qua import *
 import OPX.config_generator as config_generator
+from OPX.qm_results import QMResults, stream_variables
+from calibration.streaming_stats import StreamingCovariance, Histogram2D
 import instruments_py27.anritsu as MG
 from matplotlib import pyplot as plt
 from scipy.optimize import least_squares
 
 
+#-----------functions------------
+MODES = ["I1+", "Q1+", "I1-", "Q1-", "I2+", "Q2+", "I2-", "Q2-"]
+#pairs of modes plotted in each figure
+FIGURE_PAIRS = [[("I1+", "Q1+"), ("I1-", "Q1-"), ("I1+", "I1-"), ("Q1+", "Q1-")],
+                [("I2+", "Q2+"), ("I2-", "Q2-"), ("I2+", "I2-"), ("Q2+", "Q2-")],
+                [("I1+", "I2-"), ("Q1+", "Q2-")]]
+
+
+def sideband_modes(II, QI, IQ, QQ):
+    """I,Q of the positive and negative sidebands from the demodulated inputs. returns I_p, Q_p, I_m, Q_m"""
+    return II - QQ, -QI - IQ, II + QQ, IQ - QI
+
+
+def mode_label(mode):
+    return r"$%s_%s$" % (mode[:-1], mode[-1])
+
+
+def plot_pairs(fig_num, pairs, title, data=None, hists=None):
+    """Plot pairs of modes - scatter plots of data (dict mode->values) or the 2D histograms hists (dict pair->Histogram2D)"""
+    plt.figure(fig_num)
+    plt.clf()
+    for k, (x, y) in enumerate(pairs):
+        plt.subplot(2 if len(pairs) > 2 else 1, 2, k + 1)
+        if hists is None:
+            plt.plot(data[x], data[y], '.')
+            plt.axis('square')
+        else:
+            plt.imshow(hists[(x, y)].counts.T, origin="lower", extent=hists[(x, y)].extent, aspect="auto")
+        plt.xlabel(mode_label(x))
+        plt.ylabel(mode_label(y))
+    plt.suptitle(title)
+
+
 #-----------Parameters-------------
 
 repetitions = 50000
 verbose = False
+streaming = False #process the results in chunks while the job runs (constant memory, for long runs)
+chunk_size = 20000
+hist_bins = 100
 
 
 #NOTE: the pulse doesn't really needs to be sent since we measure noise
@@ -98,95 +136,40 @@ qm = qmManager.open_qm(cg.get_config())
 
 #run program
 job = qm.execute(measurement_prog, duration_limit=0, data_limit=0)
-job.wait_for_all_results()
-results = job.get_results()
-print("Got results")
-
-
-#analyze
-# t = list(zip(*results.raw_results.input1))[0]
-# data = [np.array(list(zip(*results.raw_results.input1))[1]),np.array(list(zip(*results.raw_results.input2))[1])]
-# I_all = data[I_readout_channel-1]
-# Q_all = data[Q_readout_channel-1]
-II = np.array(list(zip(*results.variable_results.II))[1])
-QI = np.array(list(zip(*results.variable_results.QI))[1])
-IQ = np.array(list(zip(*results.variable_results.IQ))[1])
-QQ = np.array(list(zip(*results.variable_results.QQ))[1])
-II2 = np.array(list(zip(*results.variable_results.II2))[1])
-QI2 = np.array(list(zip(*results.variable_results.QI2))[1])
-IQ2 = np.array(list(zip(*results.variable_results.IQ2))[1])
-QQ2 = np.array(list(zip(*results.variable_results.QQ2))[1])
-
-# plt.figure(1)
-# plt.plot(II,QI,'.')
-# plt.axis('square')
-
-I_p = II-QQ
-Q_p = -QI-IQ
-I_m = II+QQ
-Q_m = IQ-QI
-
-plt.figure(1)
-plt.subplot(221)
-plt.plot(I_p,Q_p,'.')
-plt.xlabel(r"$I1_+$")
-plt.ylabel(r"$Q1_+$")
-plt.axis('square')
-plt.subplot(222)
-plt.plot(I_m,Q_m,'.')
-plt.xlabel(r"$I1_-$")
-plt.ylabel(r"$Q1_-$")
-plt.axis('square')
-plt.subplot(223)
-plt.plot(I_p,I_m,'.')
-plt.xlabel(r"$I1_+$")
-plt.ylabel(r"$I1_-$")
-plt.axis('square')
-plt.subplot(224)
-plt.plot(Q_p,Q_m,'.')
-plt.xlabel(r"$Q1_+$")
-plt.ylabel(r"$Q1_-$")
-plt.axis('square')
-plt.suptitle("IF frequency=%f MHz" % (if_freq/1e6))
-
-I_p2 = II2-QQ2
-Q_p2 = -QI2-IQ2
-I_m2 = II2+QQ2
-Q_m2 = IQ2-QI2
-
-plt.figure(2)
-plt.subplot(221)
-plt.plot(I_p2,Q_p2,'.')
-plt.xlabel(r"$I2_+$")
-plt.ylabel(r"$Q2_+$")
-plt.axis('square')
-plt.subplot(222)
-plt.plot(I_m2,Q_m2,'.')
-plt.xlabel(r"$I2_-$")
-plt.ylabel(r"$Q2_-$")
-plt.axis('square')
-plt.subplot(223)
-plt.plot(I_p2,I_m2,'.')
-plt.xlabel(r"$I2_+$")
-plt.ylabel(r"$I2_-$")
-plt.axis('square')
-plt.subplot(224)
-plt.plot(Q_p2,Q_m2,'.')
-plt.xlabel(r"$Q2_+$")
-plt.ylabel(r"$Q2_-$")
-plt.axis('square')
-plt.suptitle("IF frequency=%f MHz" % (if_freq2/1e6))
-
-
-plt.figure(3)
-plt.subplot(121)
-plt.plot(I_p,I_m2,'.')
-plt.xlabel(r"$I1_+$")
-plt.ylabel(r"$I2_-$")
-plt.axis('square')
-plt.subplot(122)
-plt.plot(Q_p,Q_m2,'.')
-plt.xlabel(r"$Q1_+$")
-plt.ylabel(r"$Q2_-$")
-plt.axis('square')
-plt.suptitle("Checking correlations between different modes")
\ No newline at end of file
+titles = ["IF frequency=%f MHz" % (if_freq/1e6), "IF frequency=%f MHz" % (if_freq2/1e6),
+          "Checking correlations between different modes"]
+
+if streaming:
+    stats = StreamingCovariance(len(MODES), MODES)
+    hists = None
+    for II, QI, IQ, QQ, II2, QI2, IQ2, QQ2 in stream_variables(job, ["II", "QI", "IQ", "QQ", "II2", "QI2", "IQ2", "QQ2"],
+                                                             chunk_size):
+        chunk = dict(zip(MODES, sideband_modes(II, QI, IQ, QQ) + sideband_modes(II2, QI2, IQ2, QQ2)))
+        stats.update(np.column_stack([chunk[mode] for mode in MODES]))
+        if hists is None:
+            #the histogram ranges are fixed by the first chunk
+            hists = {pair: Histogram2D.from_sample(chunk[pair[0]], chunk[pair[1]], hist_bins)
+                     for pairs in FIGURE_PAIRS for pair in pairs}
+        for (x, y), hist in hists.items():
+            hist.update(chunk[x], chunk[y])
+        print("%d/%d repetitions" % (stats.count, repetitions))
+        for k, pairs in enumerate(FIGURE_PAIRS):
+            plot_pairs(k + 1, pairs, titles[k], hists=hists)
+        plt.pause(0.01)
+    print(stats.report())
+else:
+    job.wait_for_all_results()
+    results = job.get_results()
+    print("Got results")
+
+    #analyze
+    results = QMResults(results)
+    II, QI, IQ, QQ = results.variable_values("II", "QI", "IQ", "QQ")
+    II2, QI2, IQ2, QQ2 = results.variable_values("II2", "QI2", "IQ2", "QQ2")
+    data = dict(zip(MODES, sideband_modes(II, QI, IQ, QQ) + sideband_modes(II2, QI2, IQ2, QQ2)))
+    stats = StreamingCovariance(len(MODES), MODES)
+    stats.update(np.column_stack([data[mode] for mode in MODES]))
+    print(stats.report())
+
+    for k, pairs in enumerate(FIGURE_PAIRS):
+        plot_pairs(k + 1, pairs, titles[k], data=data)
@@ -3,20 +3,15 @@
 from qm.QuantumMachinesManager import QuantumMachinesManager
 from qm.qua import *
 import OPX.config_generator as config_generator
+from OPX.qm_results import QMResults
+from calibration.demodulation import sideband_coefficients
+from calibration.mixer_model import model_corr_mat
 import numpy as np
 from time import sleep
 import instruments_py27.anritsu as MG
 from matplotlib import pyplot as plt
 
 #-----------functions------------
-def model_corr_mat(g, phi):
-    """See my OneNote documentation (Naftali)"""
-    scaling_m = np.array([[g, 0], [0, 1]])
-    rot_m = (1 / (np.cos(phi / 2) ** 2 - np.sin(phi / 2) ** 2)) * np.array(
-        [[np.cos(phi / 2), -np.sin(phi / 2)], [-np.sin(phi / 2), np.cos(phi / 2)]])
-
-    return scaling_m @ rot_m
-
 def test_amplitude_and_phase(qm, if_freqs, amp_factor, phase, M_i):
     """ Measure two sidebands of if_freqs with desired amplitude ration and phase difference (not including electrical delay)
     M_i is the demodulation calibration matrix
@@ -33,34 +28,60 @@ def test_amplitude_and_phase(qm, if_freqs, amp_factor, phase, M_i):
 
     job = qm.execute(measurement_prog, duration_limit=0, data_limit=0)
     job.wait_for_all_results()
-    results = job.get_results()
+    results = QMResults(job.get_results())
     # analyze
-    t = list(zip(*results.raw_results.input1))[0][0:pulse_length]
-    I = np.array(list(zip(*results.raw_results.input2))[1][0:pulse_length])
-    Q = np.array(list(zip(*results.raw_results.input1))[1][0:pulse_length])
-    freqs = np.fft.fftfreq(pulse_length, 1e-9)
-
-    I_ = I - np.mean(I)
-    Q_ = Q - np.mean(Q)
-    s = I_ - 1j * Q_
-    s = s - np.mean(s)
-    f_s = np.fft.fft(s)
-    IQ = np.array([I_, Q_])
-    IQ2 = M_i @ IQ
-    IQ2_c = IQ2[0, :] - 1j * IQ2[1, :]
-    f_s2 = np.fft.fft(IQ2_c)
-
-    ret = []
-    for if_freq in if_freqs:
-        idx_p = np.abs(freqs - if_freq).argmin()
-        idx_n = np.abs(freqs + if_freq).argmin()
-        c_p = f_s[idx_p]
-        c_n = f_s[idx_n]
-        c_p_cal = f_s2[idx_p]
-        c_n_cal = f_s2[idx_n]
-        ret.append((c_p, c_n, c_p_cal, c_n_cal))
-
-    return ret
+    I = results.raw_values(2, pulse_length)
+    Q = results.raw_values(1, pulse_length)
+    # only the +-IF bins are needed, so demodulate at them instead of computing full FFTs
+    coefficients = sideband_coefficients(I, Q, if_freqs, M_i)
+
+    return [tuple(c) for c in coefficients]
+
+
+def test_amplitude_and_phase_sweep(qm, if_freqs, amp_factors, phases, M_i, samples_per_point=None):
+    """ Same as test_amplitude_and_phase for each point (amp_factors[k], phases[k]), all in a single job.
+    The points are looped over in QUA and the raw captures of all points are demodulated together.
+    samples_per_point is the length of the raw capture of each measure - the length of the readout pulse
+    (const_readout, pulse_length samples) if None
+
+    returns: list with the return value of test_amplitude_and_phase for each point
+    """
+    num_points = len(amp_factors)
+    if len(phases) != num_points:
+        raise Exception("test_amplitude_and_phase_sweep: amp_factors and phases must have the same length")
+    if samples_per_point is None:
+        samples_per_point = pulse_length
+    if samples_per_point < pulse_length:
+        raise Exception("test_amplitude_and_phase_sweep: captures of %d samples are shorter than the pulse (%d samples)"
+                        % (samples_per_point, pulse_length))
+
+    # measurement program
+    with program() as sweep_prog:
+        amp_vec = declare(fixed, value=[float(a) for a in amp_factors])
+        phase_vec = declare(fixed, value=[float(p) for p in phases])
+        k = declare(int)
+
+        with for_(k, 0, k < num_points, k + 1):
+            align("SB1", "SB2")
+            reset_frame("SB2")
+            z_rotation(phase_vec[k], "SB2")
+            play("control_const", "SB1")
+            measure("readout" * amp(amp_vec[k]), "SB2", "samples")
+
+    job = qm.execute(sweep_prog, duration_limit=0, data_limit=0)
+    job.wait_for_all_results()
+    results = QMResults(job.get_results())
+    # analyze - the raw stream holds the captures of all points one after the other
+    I = results.raw_values(2)
+    Q = results.raw_values(1)
+    if len(I) != num_points * samples_per_point or len(Q) != num_points * samples_per_point:
+        raise Exception("test_amplitude_and_phase_sweep: got %d,%d raw samples, expected %d points of %d samples"
+                        % (len(I), len(Q), num_points, samples_per_point))
+    I = I.reshape(num_points, samples_per_point)[:, :pulse_length]
+    Q = Q.reshape(num_points, samples_per_point)[:, :pulse_length]
+    coefficients = sideband_coefficients(I, Q, if_freqs, M_i)
+
+    return [[tuple(c) for c in point] for point in coefficients]
 
 
 #--------------------------
@@ -96,6 +117,8 @@ pulse_length = 22000
 pos_amp_factors = np.logspace(-2,0,20) #for positive sideband
 phases = np.linspace(0,np.pi,20) #relative
 
+batched = True #run each sweep in a single job
+
 #readout
 trigger_delay = 0
 trigger_length = 10
@@ -154,12 +177,12 @@ qm.set_mixer_correction("mixer2", int(if_freq), int(lo_freq),
 print("Running calibration program")
 job = qm.execute(SSB_measurement_prog, duration_limit=0, data_limit=0)
 job.wait_for_all_results()
-results = job.get_results()
+results = QMResults(job.get_results())
 print("Got results")
 # analyze and plot
-t = list(zip(*results.raw_results.input1))[0][0:pulse_length]
-I_c = np.array(list(zip(*results.raw_results.input2))[1][0:pulse_length])
-Q_c = np.array(list(zip(*results.raw_results.input1))[1][0:pulse_length])
+t = results.raw_timestamps(1, pulse_length)
+I_c = results.raw_values(2, pulse_length)
+Q_c = results.raw_values(1, pulse_length)
 s_c = I_c-1j*Q_c
 s_c = s_c-np.mean(s_c)
 f_s_c = np.fft.fft(s_c)
@@ -197,9 +220,14 @@ plt.show()
 
 
 ret = []
-for amp_factor in pos_amp_factors:
-    print("phase = 0, amp_factor=%f" % amp_factor)
-    ret.append(test_amplitude_and_phase(qm, [if_freq], amp_factor, 0.0, M_i)[0])
+if batched:
+    print("phase = 0, %d amp_factors" % len(pos_amp_factors))
+    ret = [r[0] for r in test_amplitude_and_phase_sweep(qm, [if_freq], pos_amp_factors,
+                                                         np.zeros(len(pos_amp_factors)), M_i)]
+else:
+    for amp_factor in pos_amp_factors:
+        print("phase = 0, amp_factor=%f" % amp_factor)
+        ret.append(test_amplitude_and_phase(qm, [if_freq], amp_factor, 0.0, M_i)[0])
 
 rets = list(zip(*ret))
 #plot
@@ -231,9 +259,13 @@ plt.show()
 
 
 ret = []
-for phase in phases:
-    print("phase = %f, amp_factor=1" % phase)
-    ret.append(test_amplitude_and_phase(qm, [if_freq], 1, phase, M_i)[0])
+if batched:
+    print("%d phases, amp_factor=1" % len(phases))
+    ret = [r[0] for r in test_amplitude_and_phase_sweep(qm, [if_freq], np.ones(len(phases)), phases, M_i)]
+else:
+    for phase in phases:
+        print("phase = %f, amp_factor=1" % phase)
+        ret.append(test_amplitude_and_phase(qm, [if_freq], 1, phase, M_i)[0])
 
 rets = list(zip(*ret))
 #plot
@@ -7,16 +7,8 @@ import numpy as np
 from time import sleep
 import instruments_py27.anritsu as MG
 from matplotlib import pyplot as plt
-
-#-----------functions------------
-def model_corr_mat(g, phi):
-    """See my OneNote documentation (Naftali)"""
-    scaling_m = np.array([[g, 0], [0, 1]])
-    rot_m = (1 / (np.cos(phi / 2) ** 2 - np.sin(phi / 2) ** 2)) * np.array(
-        [[np.cos(phi / 2), -np.sin(phi / 2)], [-np.sin(phi / 2), np.cos(phi / 2)]])
-
-    return scaling_m @ rot_m
-#--------------------------
+from calibration.calibration_db import CalibrationDB
+from calibration.mixer_model import model_corr_mat
 
 
 #parameters
@@ -43,6 +35,14 @@ lo_amp = 18.0
 #IF
 if_freq = 20e6#20e6
 
+#calibration store - if set, offsets and calibration matrix are looked up for lo_freq, if_freq instead of the constants above
+calibration_db_path = None
+mixer_name = "mixer_I3_Q1"
+if calibration_db_path is not None:
+    cal = CalibrationDB(calibration_db_path).lookup(mixer_name, lo_freq, if_freq, lo_amp)
+    I_offset, Q_offset, g, phi = cal["I_offset"], cal["Q_offset"], cal["g"], cal["phi"]
+    print("Using calibration: I_offset=%f, Q_offset=%f, g=%f, phi=%f" % (I_offset, Q_offset, g, phi))
+
 #SBM
 ampl = 0.01
 amp_factor = 0.0 #for positive sideband
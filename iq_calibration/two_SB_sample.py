@@ -3,21 +3,14 @@
 from qm.QuantumMachinesManager import QuantumMachinesManager
 from qm.qua import *
 import OPX.config_generator as config_generator
+from OPX.qm_results import QMResults
+from calibration.capture_file import CaptureWriter
+from calibration.mixer_model import model_corr_mat
 import numpy as np
 from time import sleep
 import instruments_py27.anritsu as MG
 from matplotlib import pyplot as plt
 
-#-----------functions------------
-def model_corr_mat(g, phi):
-    """See my OneNote documentation (Naftali)"""
-    scaling_m = np.array([[g, 0], [0, 1]])
-    rot_m = (1 / (np.cos(phi / 2) ** 2 - np.sin(phi / 2) ** 2)) * np.array(
-        [[np.cos(phi / 2), -np.sin(phi / 2)], [-np.sin(phi / 2), np.cos(phi / 2)]])
-
-    return scaling_m @ rot_m
-#--------------------------
-
 
 #parameters
 
@@ -53,6 +46,9 @@ phase = 0.0 #relative
 trigger_delay = 0
 trigger_length = 10
 
+#recording
+capture_path = None #if set, the raw captures are appended to this capture file (see calibration/capture_file.py)
+
 #OPX config
 cg = config_generator.ConfigGenerator(output_offsets={I_channel:I_offset,Q_channel:Q_offset},input_offsets={1:0.0, 2:0.0})
 cg.add_mixer("mixer1",{(lo_freq, if_freq):[1.0,0.0,0.0,1.0]})
@@ -127,12 +123,12 @@ qm.set_mixer_correction("mixer2", int(if_freq), int(lo_freq),
 print("Running calibration program")
 job = qm.execute(SSB_measurement_prog, duration_limit=0, data_limit=0)
 job.wait_for_all_results()
-results = job.get_results()
+results = QMResults(job.get_results())
 print("Got results")
 # analyze and plot
-t = list(zip(*results.raw_results.input1))[0][0:pulse_length]
-I_c = np.array(list(zip(*results.raw_results.input2))[1][0:pulse_length])
-Q_c = np.array(list(zip(*results.raw_results.input1))[1][0:pulse_length])
+t = results.raw_timestamps(1, pulse_length)
+I_c = results.raw_values(2, pulse_length)
+Q_c = results.raw_values(1, pulse_length)
 s_c = I_c-1j*Q_c
 s_c = s_c-np.mean(s_c)
 f_s_c = np.fft.fft(s_c)
@@ -168,15 +164,22 @@ plt.ylabel(r"$20\log_{10}\left(|F(s(t))|\right)$ - corrected")
 plt.title("Single sideband - calibrated")
 plt.show()
 
+#open the capture file before the run, so a file with other settings is refused before measuring
+writer = None if capture_path is None else CaptureWriter(capture_path, pulse_length, {"I": 2, "Q": 1}, "int16",
+                                                         lo_freq, if_freq, pulse_length)
+
 #run program
 job = qm.execute(measurement_prog, duration_limit=0, data_limit=0)
 job.wait_for_all_results()
-results = job.get_results()
+results = QMResults(job.get_results())
 print("Got results")
 # analyze and plot
-t = list(zip(*results.raw_results.input1))[0][0:pulse_length]
-I = np.array(list(zip(*results.raw_results.input2))[1][0:pulse_length])
-Q = np.array(list(zip(*results.raw_results.input1))[1][0:pulse_length])
+t = results.raw_timestamps(1, pulse_length)
+I = results.raw_values(2, pulse_length)
+Q = results.raw_values(1, pulse_length)
+if writer is not None:
+    writer.append([I, Q])
+    writer.close()
 s = I-1j*Q
 s = s-np.mean(s)
 f_s = np.fft.fft(s)
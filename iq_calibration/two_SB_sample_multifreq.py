@@ -3,21 +3,13 @@
 from qm.QuantumMachinesManager import QuantumMachinesManager
 from qm.qua import *
 import OPX.config_generator as config_generator
+from OPX.qm_results import QMResults
+from calibration.mixer_model import model_corr_mat
 import numpy as np
 from time import sleep
 import instruments_py27.anritsu as MG
 from matplotlib import pyplot as plt
 
-#-----------functions------------
-def model_corr_mat(g, phi):
-    """See my OneNote documentation (Naftali)"""
-    scaling_m = np.array([[g, 0], [0, 1]])
-    rot_m = (1 / (np.cos(phi / 2) ** 2 - np.sin(phi / 2) ** 2)) * np.array(
-        [[np.cos(phi / 2), -np.sin(phi / 2)], [-np.sin(phi / 2), np.cos(phi / 2)]])
-
-    return scaling_m @ rot_m
-#--------------------------
-
 
 #parameters
 
@@ -137,12 +129,12 @@ qm.set_mixer_correction("mixer2", int(if_freq2), int(lo_freq),
 print("Running calibration program")
 job = qm.execute(SSB_measurement_prog, duration_limit=0, data_limit=0)
 job.wait_for_all_results()
-results = job.get_results()
+results = QMResults(job.get_results())
 print("Got results")
 # analyze and plot
-t = list(zip(*results.raw_results.input1))[0][0:pulse_length]
-I_c = np.array(list(zip(*results.raw_results.input2))[1][0:pulse_length])
-Q_c = np.array(list(zip(*results.raw_results.input1))[1][0:pulse_length])
+t = results.raw_timestamps(1, pulse_length)
+I_c = results.raw_values(2, pulse_length)
+Q_c = results.raw_values(1, pulse_length)
 s_c = I_c-1j*Q_c
 s_c = s_c-np.mean(s_c)
 f_s_c = np.fft.fft(s_c)
@@ -181,12 +173,12 @@ plt.show()
 #run program
 job = qm.execute(measurement_prog, duration_limit=0, data_limit=0)
 job.wait_for_all_results()
-results = job.get_results()
+results = QMResults(job.get_results())
 print("Got results")
 # analyze and plot
-t = list(zip(*results.raw_results.input1))[0][0:pulse_length]
-I = np.array(list(zip(*results.raw_results.input2))[1][0:pulse_length])
-Q = np.array(list(zip(*results.raw_results.input1))[1][0:pulse_length])
+t = results.raw_timestamps(1, pulse_length)
+I = results.raw_values(2, pulse_length)
+Q = results.raw_values(1, pulse_length)
 s = I-1j*Q
 s = s-np.mean(s)
 f_s = np.fft.fft(s)
@@ -0,0 +1,417 @@
+"""A simulated IQ mixer test bench: OPX (QM), signal generator and spectrum analyzer around a model IQ mixer.
+The simulated instruments expose the methods the calibration scripts use, so calibrations can be run and timed
+offline. Instrument latencies are spent on a clock which either really sleeps or only counts (virtual time).
+
+Mixer model - for OPX outputs I(t), Q(t) [V] on the mixer's channels the RF complex envelope is
+    s(t) = g_I*(I(t) - I_null) + 1j*g_Q*exp(1j*phi)*(Q(t) - Q_null)
+so the LO leakage is nulled by the DC offsets (I_null, Q_null), and g_I, g_Q, phi are the gain and phase imbalance.
+A tone played by a mixed element goes through the element's mixer correction matrix before reaching the mixer,
+and shows up at lo+if (desired sideband) and lo-if (image sideband).
+"""
+
+import time
+import numpy as np
+from instruments_py27.instrument import Instrument
+
+
+class SimulatedClock:
+    """A clock for simulated latencies. If real_time is False sleeping only advances the clock"""
+
+    def __init__(self, real_time=False):
+        self.real_time = real_time
+        self.elapsed = 0.0  # total simulated time [s]
+
+    def sleep(self, seconds):
+        if seconds <= 0:
+            return
+        if self.real_time:
+            time.sleep(seconds)
+        self.elapsed += seconds
+
+
+class SimulatedIQMixer:
+    """Model of an IQ mixer whose I,Q ports are connected to OPX channels I_channel, Q_channel"""
+
+    def __init__(self, I_channel=1, Q_channel=2, I_null=0.0213, Q_null=-0.0147, g_I=1.0, g_Q=0.86, phi=0.16,
+                 gain=-6.0, noise_density=-150.0):
+        """gain - conversion gain [dB], noise_density - SA noise floor [dBm/Hz]"""
+        self.I_channel = I_channel
+        self.Q_channel = Q_channel
+        self.I_null = I_null
+        self.Q_null = Q_null
+        self.g_I = g_I
+        self.g_Q = g_Q
+        self.phi = phi
+        self.gain = gain
+        self.noise_density = noise_density
+
+    def lo_leakage(self, I_dc, Q_dc):
+        """Complex envelope amplitude [V] at the LO frequency for the given DC offsets"""
+        return self.g_I * (I_dc - self.I_null) + 1j * self.g_Q * np.exp(1j * self.phi) * (Q_dc - self.Q_null)
+
+    def sidebands(self, amplitude, correction):
+        """Complex amplitudes [V] at (lo+if, lo-if) for a tone with complex amplitude a_I+1j*a_Q,
+        played through the correction matrix [c00, c01, c10, c11]"""
+        c00, c01, c10, c11 = correction
+        rot = 1j * self.g_Q * np.exp(1j * self.phi)
+        pos = (self.g_I * (c00 - 1j * c01) + rot * (c10 - 1j * c11)) / 2 * amplitude
+        neg = (self.g_I * (c00 + 1j * c01) + rot * (c10 + 1j * c11)) / 2 * np.conj(amplitude)
+        return pos, neg
+
+    def to_dbm(self, amplitude):
+        """Power [dBm] of a complex envelope amplitude [V] into 50 Ohm, including the conversion gain"""
+        return 10 * np.log10(np.abs(amplitude) ** 2 / 100.0 / 1e-3 + 1e-30) + self.gain
+
+    def noise_floor(self, BW):
+        """Noise power [mW] for a resolution bandwidth BW [Hz]"""
+        return 10 ** ((self.noise_density + 10 * np.log10(BW)) / 10)
+
+
+class SimulatedBench:
+    """Holds the mixer model, the clock, latencies and call counts shared by the simulated instruments.
+    latencies is a dict of call kind:seconds, see DEFAULT_LATENCIES"""
+
+    DEFAULT_LATENCIES = {
+        "set_dc_offset": 0.002,
+        "set_mixer_correction": 0.005,
+        "execute": 0.5,
+        "sa_write": 0.001,
+        "sa_query": 0.005,
+        "mg_write": 0.002,
+    }
+
+    def __init__(self, mixer=None, latencies=None, real_time=False, seed=None):
+        self.mixer = mixer if mixer is not None else SimulatedIQMixer()
+        self.latencies = dict(self.DEFAULT_LATENCIES)
+        if latencies is not None:
+            self.latencies.update(latencies)
+        self.clock = SimulatedClock(real_time)
+        self.random = np.random.RandomState(seed)
+        self.call_counts = {}
+        self.qm = None
+        self.mg = None
+
+    def call(self, name, kind=None):
+        """Count a call to an instrument method and spend the latency of its kind"""
+        self.call_counts[name] = self.call_counts.get(name, 0) + 1
+        if kind is not None:
+            self.clock.sleep(self.latencies[kind])
+
+    def open_qm(self, config):
+        """Open a simulated quantum machine with the given config (like QuantumMachinesManager.open_qm)"""
+        self.qm = SimulatedQM(self, config)
+        return self.qm
+
+    def open_mg(self, address=None):
+        """Create a simulated signal generator driving the mixer's LO"""
+        self.mg = SimulatedMG(self)
+        return self.mg
+
+    def open_sa(self, address=None, synchronized=False):
+        """Create a simulated N9010A spectrum analyzer"""
+        return SimulatedSA(self, synchronized)
+
+    def spectrum(self):
+        """The lines at the mixer output as arrays (frequencies [Hz], complex amplitudes [V])"""
+        if self.mg is None or not self.mg.on or self.qm is None:
+            return np.zeros(0), np.zeros(0, complex)
+        lo_freq = self.mg.freq * 1e6
+        I_dc = self.qm.channel_offsets.get(self.mixer.I_channel, 0.0)
+        Q_dc = self.qm.channel_offsets.get(self.mixer.Q_channel, 0.0)
+        lines = {lo_freq: self.mixer.lo_leakage(I_dc, Q_dc)}
+        for if_freq, amplitude, correction in self.qm.playing_tones():
+            pos, neg = self.mixer.sidebands(amplitude, correction)
+            if if_freq == 0:
+                lines[lo_freq] += pos + neg
+                continue
+            lines[lo_freq + if_freq] = lines.get(lo_freq + if_freq, 0.0) + pos
+            lines[lo_freq - if_freq] = lines.get(lo_freq - if_freq, 0.0) + neg
+        freqs = np.array(sorted(lines.keys()))
+        return freqs, np.array([lines[f] for f in freqs])
+
+    def report(self):
+        """Get a summary of the simulated time and the instrument call counts"""
+        lines = ["Simulated instrument time: %f seconds" % self.clock.elapsed]
+        for name in sorted(self.call_counts.keys()):
+            lines.append("%30s: %d" % (name, self.call_counts[name]))
+        return "\n".join(lines)
+
+
+class SimulatedJob:
+    """A running simulated QM job"""
+
+    def __init__(self, qm, program):
+        self.qm = qm
+        self.program = program
+
+    def halt(self):
+        if self.qm.job is self:
+            self.qm.job = None
+
+
+class SimulatedQM:
+    """A simulated quantum machine. Programs are opaque, so what a program plays continuously is declared with
+    register_program; unregistered programs only keep the DC offsets"""
+
+    def __init__(self, bench, config):
+        self.bench = bench
+        self.config = config
+        controller = config["controllers"]["con1"]
+        outputs = controller.get("analog_outputs", controller.get("analog", {}))
+        self.channel_offsets = {ch: outputs[ch].get("offset", 0.0) for ch in outputs}
+        self.corrections = {}  # (mixer, if_freq, lo_freq):correction
+        for mixer_name, entries in config.get("mixers", {}).items():
+            for entry in entries:
+                key = (mixer_name, int(entry.get("intermediate_frequency", entry.get("freq", 0))),
+                       int(entry.get("lo_frequency", entry.get("lo_freq", 0))))
+                self.corrections[key] = tuple(entry["correction"])
+        self.programs = {}  # id(program):list of (element, operation, amplitude factor)
+        self.job = None
+
+    def register_program(self, program, plays):
+        """Declare that program continuously plays the given list of (element, operation, amplitude factor)"""
+        self.programs[id(program)] = list(plays)
+
+    def _element_channel(self, element, input_name):
+        element_config = self.config["elements"][element]
+        if "singleInput" in element_config:
+            return element_config["singleInput"]["port"][1]
+        return element_config["mixInputs"][input_name][1]
+
+    def set_output_dc_offset_by_element(self, element, input, offset):
+        self.bench.call("set_output_dc_offset_by_element", "set_dc_offset")
+        self.channel_offsets[self._element_channel(element, input)] = float(offset)
+
+    def set_dc_offset_by_qe(self, element, input, offset):
+        self.bench.call("set_dc_offset_by_qe", "set_dc_offset")
+        self.channel_offsets[self._element_channel(element, input)] = float(offset)
+
+    def set_mixer_correction(self, mixer, intermediate_frequency, lo_frequency, values):
+        self.bench.call("set_mixer_correction", "set_mixer_correction")
+        self.corrections[(mixer, int(intermediate_frequency), int(lo_frequency))] = tuple(values)
+
+    def set_intermediate_frequency(self, element, freq):
+        self.bench.call("set_intermediate_frequency", "set_mixer_correction")
+        self.config["elements"][element]["intermediate_frequency"] = freq
+
+    def execute(self, program, *args, **kwargs):
+        self.bench.call("execute", "execute")
+        self.job = SimulatedJob(self, program)
+        return self.job
+
+    def playing_tones(self):
+        """List of (if_freq, complex amplitude, correction) of the tones played by the running job"""
+        if self.job is None:
+            return []
+        tones = []
+        for element, operation, amp_factor in self.programs.get(id(self.job.program), []):
+            element_config = self.config["elements"][element]
+            pulse = self.config["pulses"][element_config["operations"][operation]]
+            waveforms = [self._waveform_value(pulse["waveforms"][w]) for w in ("I", "Q")]
+            mix = element_config["mixInputs"]
+            if_freq = element_config.get("intermediate_frequency", 0)
+            correction = self.corrections.get((mix["mixer"], int(if_freq), int(mix["lo_frequency"])), (1, 0, 0, 1))
+            tones.append((if_freq, amp_factor * (waveforms[0] + 1j * waveforms[1]), correction))
+        return tones
+
+    def _waveform_value(self, waveform_name):
+        waveform = self.config["waveforms"][waveform_name]
+        if waveform["type"] == "constant":
+            return waveform["sample"]
+        return float(np.mean(waveform["samples"]))
+
+
+class SimulatedMG(Instrument):
+    """A simulated signal generator with the interface of the instruments_py27 MG drivers"""
+
+    SETTLE_TIME = 0.100
+
+    def __init__(self, bench):
+        Instrument.__init__(self)
+        self.bench = bench
+        self.freq = 0.0  # MHz
+        self.power = 0.0  # dBm
+        self.on = False
+        self.update_functions = {
+            "freq": lambda f: self.setup_MG(freq=f, set_on=False),
+            "power": lambda p: self.setup_MG(power=p, set_on=False),
+            "on": lambda on: self.set_on(on)
+        }
+
+    def setup_MG(self, freq=None, power=None, set_on=True):
+        self.bench.call("setup_MG")
+        if freq is not None and not self.is_cached("freq", freq):
+            self.bench.call("mg_write", "mg_write")
+            self.bench.clock.sleep(self.SETTLE_TIME)
+            self.freq = freq
+            self.cache_property("freq", freq)
+        if power is not None and not self.is_cached("power", power):
+            self.bench.call("mg_write", "mg_write")
+            self.bench.clock.sleep(self.SETTLE_TIME)
+            self.power = power
+            self.cache_property("power", power)
+        if set_on:
+            self.set_on(True)
+
+    def set_on(self, on=True):
+        self.bench.call("set_on")
+        if self.is_cached("on", on):
+            return
+        self.bench.call("mg_write", "mg_write")
+        self.bench.clock.sleep(self.SETTLE_TIME)
+        self.on = on
+        self.cache_property("on", on)
+
+    def update_property(self, property, value):
+        if property not in self.update_functions:
+            raise Exception("SimulatedMG.update_property: Property is not supported")
+        self.update_functions[property](value)
+
+
+class SimulatedSA(Instrument):
+    """A simulated N9010A spectrum analyzer with the interface of instruments_py27.spectrum_analyzer.N9010A_SA.
+    Markers report the lines of the bench's spectrum seen through a gaussian RBW filter plus noise"""
+
+    SETUP_WAIT = 1.0
+    READ_WAIT = 0.1
+    MIN_SWEEP_TIME = 1e-3  # s
+
+    def __init__(self, bench, synchronized=False):
+        Instrument.__init__(self)
+        self.bench = bench
+        self.synchronized = synchronized
+        self.center_freq = 5000.0  # MHz
+        self.span = 10.0  # Hz
+        self.BW = 100.0  # Hz
+        self.points = 1
+        self.averaging = False
+        self.avg_count = 1
+        self.marker_freq = None  # MHz, None = marker at maximum
+        self.wait_time_saved = 0.0
+        self.num_synchronized_sweeps = 0
+        self._fresh_sweep = False
+        self._sweep_spectrum = None
+        self.update_functions = {
+            "center_freq": lambda f: self.setup_spectrum_analyzer(center_freq=f),
+            "span": lambda s: self.setup_spectrum_analyzer(span=s),
+            "BW": lambda bw: self.setup_spectrum_analyzer(BW=bw),
+            "points": lambda p: self.setup_spectrum_analyzer(points=p),
+            "averaging": lambda on: self.setup_averaging(on),
+            "avg_count": lambda c: self.setup_averaging(True, c)
+        }
+
+    def sweep_time(self):
+        """Time [s] of a complete (averaged) sweep"""
+        single = max(self.MIN_SWEEP_TIME, 2.0 / self.BW + self.span / self.BW ** 2)
+        return single * (self.avg_count if self.averaging else 1)
+
+    def wait_for_sweep(self, fixed_wait):
+        if not self.synchronized:
+            self.bench.clock.sleep(fixed_wait)
+            return fixed_wait
+        elapsed = self._single_sweep()
+        self.wait_time_saved += fixed_wait - elapsed
+        return elapsed
+
+    def _single_sweep(self):
+        """A single sweep - the trace holds the spectrum at the end of the sweep until the next one"""
+        elapsed = self.sweep_time()
+        self.bench.call("sa_query", "sa_query")
+        self.bench.clock.sleep(elapsed)
+        self.num_synchronized_sweeps += 1
+        self._sweep_spectrum = self.bench.spectrum()
+        self._fresh_sweep = True
+        return elapsed
+
+    def _spectrum(self):
+        """The lines seen by the SA - when synchronized, those of the last single sweep"""
+        if self.synchronized and self._sweep_spectrum is not None:
+            return self._sweep_spectrum
+        return self.bench.spectrum()
+
+    def sync_report(self):
+        return "SimulatedSA: %d synchronized sweeps, %f seconds saved compared with fixed sleeps" % (
+            self.num_synchronized_sweeps, self.wait_time_saved)
+
+    def setup_spectrum_analyzer(self, center_freq=None, span=None, BW=None, points=None):
+        values = {"center_freq": center_freq, "span": span, "BW": BW, "points": points}
+        changed = False
+        for property in ["center_freq", "span", "BW", "points"]:
+            value = values[property]
+            if value is not None and not self.is_cached(property, value):
+                self.bench.call("sa_write", "sa_write")
+                setattr(self, property, value)
+                self.cache_property(property, value)
+                changed = True
+        if changed:
+            self.wait_for_sweep(self.SETUP_WAIT)
+
+    def setup_averaging(self, on, avg_count=100):
+        self.bench.call("sa_write", "sa_write")
+        self.averaging = on
+        if on:
+            self.avg_count = avg_count
+        self.cache_property("averaging", on)
+        self._fresh_sweep = False
+
+    def restart_averaging(self):
+        self.bench.call("sa_write", "sa_write")
+        self.averaging = True
+        self._fresh_sweep = False
+
+    def set_marker_max(self):
+        self.bench.call("sa_write", "sa_write")
+        self.marker_freq = None
+
+    def set_marker_position(self, freq):
+        self.bench.call("sa_write", "sa_write")
+        self.marker_freq = freq
+
+    def _measure(self, freqs):
+        """Measured power [dBm] at the given frequencies [Hz]"""
+        lines_freq, lines_amp = self._spectrum()
+        sigma = self.BW / 2.355  # gaussian RBW filter, BW is the FWHM
+        response = np.exp(-(np.asarray(freqs)[:, None] - lines_freq[None, :]) ** 2 / (4 * sigma ** 2))
+        signal = response @ lines_amp if len(lines_amp) else np.zeros(len(freqs), complex)
+        num_averages = self.avg_count if self.averaging else 1
+        noise_mw = self.bench.mixer.noise_floor(self.BW)
+        # noise added to the signal in the units of sqrt(mW), averaged over the sweeps in linear power
+        signal_mw = np.sqrt(10 ** (self.bench.mixer.to_dbm(signal) / 10)) * np.exp(1j * np.angle(signal))
+        noise = np.sqrt(noise_mw / 2) * (self.bench.random.randn(num_averages, len(freqs)) +
+                                         1j * self.bench.random.randn(num_averages, len(freqs)))
+        power_mw = np.mean(np.abs(signal_mw[None, :] + noise) ** 2, axis=0)
+        return 10 * np.log10(power_mw)
+
+    def _marker_freq(self):
+        if self.marker_freq is not None:
+            return self.marker_freq * 1e6
+        lines_freq, lines_amp = self._spectrum()
+        center = self.center_freq * 1e6
+        in_span = np.abs(lines_freq - center) <= self.span / 2 + self.BW
+        if not np.any(in_span):
+            return center
+        return lines_freq[in_span][np.argmax(np.abs(lines_amp[in_span]))]
+
+    def get_marker(self, fixed_wait=None):
+        if self.synchronized and not self._fresh_sweep:
+            self.wait_time_saved += (self.READ_WAIT if fixed_wait is None else fixed_wait) - self._single_sweep()
+        self._fresh_sweep = False
+        self.bench.call("get_marker", "sa_query")
+        return float(self._measure([self._marker_freq()])[0])
+
+    def get_trace(self, fixed_wait=None):
+        if self.synchronized and not self._fresh_sweep:
+            self.wait_time_saved += (self.READ_WAIT if fixed_wait is None else fixed_wait) - self._single_sweep()
+        self._fresh_sweep = False
+        self.bench.call("get_trace", "sa_query")
+        center = self.center_freq * 1e6
+        freqs = np.linspace(center - self.span / 2, center + self.span / 2, self.points)
+        return np.column_stack([freqs, self._measure(freqs)])
+
+    def get_data(self, fixed_wait=None):
+        return ",".join("%.8e" % v for v in self.get_trace(fixed_wait).flatten())
+
+    def update_property(self, property, value):
+        if property not in self.update_functions:
+            raise Exception("SimulatedSA.update_property: Property is not supported")
+        self.update_functions[property](value)
@@ -0,0 +1,328 @@
+"""Local TCP SCPI emulators of the instruments driven by instruments_py27: N9010A spectrum analyzer, E8241A and
+Anritsu signal generators and the M9347A dual DDS. They understand the commands the drivers send, so drivers,
+pipelining and caching can be exercised and timed without the hardware, through a TCPIP0::<host>::<port>::SOCKET
+address (see instruments_py27.scpi_socket).
+The emulators are backed by a SimulatedBench: the MGs tune the bench's LO and the SA reads the bench's spectrum,
+so a calibration script talking SCPI sees the simulated mixer.
+Timing - every received packet whose messages need replies is answered after latency + jitter * N(0, 1) seconds
+(a network and instrument round trip; pipelined queries arriving together share it), and a triggered SA sweep
+takes its sweep time if real_sweep_time is True.
+Run a server: python -m simulation.scpi_emulator --instrument N9010A --port 5025 --latency 0.001"""
+
+import argparse
+import re
+import socket
+import threading
+import time
+import numpy as np
+from instruments_py27.ieee488 import build_definite_length_block
+from simulation.iq_mixer_bench import SimulatedBench
+
+_bench_lock = threading.Lock()  # the simulated instruments are shared between connections and emulators
+
+
+class SCPIEmulator:
+    """Base class of the emulators. Subclasses register (regular expression, handler) pairs in self.commands;
+    a handler gets the match and returns the reply (str, bytes) of a query or None.
+    Commands are matched case insensitively against the whole command, without its leading colon.
+    Unknown commands go to the error queue (SYST:ERR?) and, as on an instrument, unknown queries are not answered"""
+
+    IDN = "Emulator"
+
+    def __init__(self, bench=None, latency=0.0, jitter=0.0, seed=None):
+        self.bench = bench if bench is not None else SimulatedBench(seed=seed)
+        self.latency = latency
+        self.jitter = jitter
+        self.random = np.random.RandomState(seed)
+        self.commands = []
+        self.errors = []
+        self.num_messages = 0
+        self.num_queries = 0
+        self.num_unknown = 0
+        self.server = None
+        self.add_command(r"\*IDN\?", lambda m: self.IDN)
+        self.add_command(r"\*OPC\?", lambda m: "1")
+        self.add_command(r"\*(RST|CLS|WAI)", lambda m: None)
+        self.add_command(r"SYST(EM)?:ERR(OR)?\?", lambda m: self._pop_error())
+
+    def add_command(self, pattern, handler):
+        self.commands.append((re.compile(pattern + "$", re.IGNORECASE), handler))
+
+    def _pop_error(self):
+        if not self.errors:
+            return '+0,"No error"'
+        return '-113,"Undefined header; %s"' % self.errors.pop(0)
+
+    def execute(self, message):
+        """Execute a program message (commands separated by ;). returns the reply bytes (with termination) or None"""
+        self.num_messages += 1
+        replies = []
+        for command in message.split(";"):
+            command = command.strip().lstrip(":")
+            if not command:
+                continue
+            for pattern, handler in self.commands:
+                match = pattern.match(command)
+                if match:
+                    if command.split(" ")[0].endswith("?"):
+                        self.num_queries += 1
+                    with _bench_lock:
+                        reply = handler(match)
+                    if reply is not None:
+                        replies.append(reply if isinstance(reply, bytes) else reply.encode())
+                    break
+            else:
+                self.errors.append(command)
+                self.num_unknown += 1
+        if not replies:
+            return None
+        return b";".join(replies) + b"\n"
+
+    def _serve_connection(self, connection):
+        connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        received = b""
+        try:
+            while True:
+                data = connection.recv(65536)
+                if not data:
+                    return
+                received += data
+                replies = []
+                while b"\n" in received:
+                    message, received = received.split(b"\n", 1)
+                    reply = self.execute(message.decode())
+                    if reply is not None:
+                        replies.append(reply)
+                if replies:
+                    delay = self.latency + self.jitter * self.random.randn()
+                    if delay > 0:
+                        time.sleep(delay)
+                    connection.sendall(b"".join(replies))
+        finally:
+            connection.close()
+
+    def _accept(self):
+        while True:
+            try:
+                connection, _ = self.server.accept()
+            except socket.error:
+                return  # closed
+            thread = threading.Thread(target=self._serve_connection, args=(connection,))
+            thread.daemon = True
+            thread.start()
+
+    def start(self, host="127.0.0.1", port=0):
+        """Start serving on host:port (port 0 picks a free port) in a background thread. returns the address"""
+        self.server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.server.bind((host, port))
+        self.server.listen(5)
+        thread = threading.Thread(target=self._accept)
+        thread.daemon = True
+        thread.start()
+        return self.address
+
+    @property
+    def address(self):
+        """The VISA socket address of the running server"""
+        host, port = self.server.getsockname()
+        return "TCPIP0::%s::%d::SOCKET" % (host, port)
+
+    def close(self):
+        if self.server is not None:
+            self.server.close()
+            self.server = None
+
+    def report(self):
+        return "%s: %d messages, %d queries, %d unknown commands" % (self.IDN, self.num_messages, self.num_queries,
+                                                                     self.num_unknown)
+
+
+class N9010AEmulator(SCPIEmulator):
+    """The N9010A_SA command set, on a SimulatedSA of the bench"""
+
+    IDN = "Agilent Technologies,N9010A,EMULATOR,A.00.00"
+
+    def __init__(self, bench=None, latency=0.0, jitter=0.0, real_sweep_time=True, seed=None):
+        SCPIEmulator.__init__(self, bench, latency, jitter, seed)
+        self.sa = self.bench.open_sa(synchronized=True)
+        self.sa.SETUP_WAIT = 0.0  # no simulated waits of the driver logic - the emulated driver waits itself
+        self.real_sweep_time = real_sweep_time
+        self.binary = False
+        self.continuous = True
+        self.sweep_time = None  # None = auto
+        self.trigger_source = "IMM"
+        number = r"\s+(?P<value>[-+0-9.eE]+)"
+        self.add_command(r"FORM(AT)?(:DATA)?\s+REAL,32", lambda m: self._set("binary", True))
+        self.add_command(r"FORM(AT)?(:DATA)?\s+ASC(II)?(,\d+)?", lambda m: self._set("binary", False))
+        self.add_command(r"FORM(AT)?:BORD(ER)?\s+\w+", lambda m: None)
+        self.add_command(r"CALC(ULATE)?:MARK(ER)?1?:STAT(E)?\s+\w+", lambda m: None)
+        self.add_command(r"SWE(EP)?:TYPE:AUTO:RUL(ES)?\s+\w+", lambda m: None)
+        self.add_command(r"INIT(IATE)?:CONT(INUOUS)?\s+(ON|OFF|1|0)",
+                         lambda m: self._set("continuous", m.group(3).upper() in ("ON", "1")))
+        self.add_command(r"INIT(IATE)?(:IMM(EDIATE)?)?", lambda m: self._sweep())
+        self.add_command(r"FREQ(UENCY)?:CENT(ER)?" + number,
+                         lambda m: self.sa.setup_spectrum_analyzer(center_freq=float(m.group("value")) / 1e6))
+        self.add_command(r"FREQ(UENCY)?:SPAN" + number, lambda m: self.sa.setup_spectrum_analyzer(
+            span=float(m.group("value"))))
+        self.add_command(r"BAND(WIDTH)?" + number, lambda m: self.sa.setup_spectrum_analyzer(BW=float(m.group("value"))))
+        self.add_command(r"SWE(EP)?:POIN(TS)?" + number,
+                         lambda m: self.sa.setup_spectrum_analyzer(points=int(float(m.group("value")))))
+        self.add_command(r"SWE(EP)?:TIME" + number, lambda m: self._set("sweep_time", float(m.group("value"))))
+        self.add_command(r"SWE(EP)?:TIME:AUTO\s+(ON|1)", lambda m: self._set("sweep_time", None))
+        self.add_command(r"SWE(EP)?:TIME:AUTO\s+(OFF|0)", lambda m: self._set("sweep_time", self._sweep_time()))
+        self.add_command(r"SWE(EP)?:TIME\?", lambda m: "%.6e" % self._sweep_time())
+        self.add_command(r"TRAC(E)?:TYPE\s+AVER(AGE)?", lambda m: self.sa.restart_averaging())
+        self.add_command(r"TRAC(E)?:TYPE\s+WRIT(E)?", lambda m: self.sa.setup_averaging(False))
+        self.add_command(r"AVER(AGE)?:COUN(T)?" + number,
+                         lambda m: self.sa.setup_averaging(True, int(float(m.group("value")))))
+        self.add_command(r"TRIG(GER)?:SOUR(CE)?\s+(\w+)", lambda m: self._set("trigger_source", m.group(3).upper()))
+        self.add_command(r"TRIG(GER)?:\w+:(SLOP(E)?|LEV(EL)?)\s+\S+", lambda m: None)
+        self.add_command(r"CALC(ULATE)?:MARK(ER)?1?:MAX", lambda m: self.sa.set_marker_max())
+        self.add_command(r"CALC(ULATE)?:MARK(ER)?1?:X" + number,
+                         lambda m: self.sa.set_marker_position(float(m.group("value")) / 1e6))
+        self.add_command(r"CALC(ULATE)?:MARK(ER)?1?:Y\?", lambda m: "%.6e" % self._marker())
+        self.add_command(r"FREQ(UENCY)?:STAR(T)?\?", lambda m: "%.9e" % self._frequencies()[0])
+        self.add_command(r"FREQ(UENCY)?:STOP\?", lambda m: "%.9e" % self._frequencies()[-1])
+        self.add_command(r"SWE(EP)?:POIN(TS)?\?", lambda m: "%d" % self.sa.points)
+        self.add_command(r"FREQ(UENCY)?:CENT(ER)?\?", lambda m: "%.9e" % (self.sa.center_freq * 1e6))
+        self.add_command(r"TRAC(E)?(:DATA)?\?\s+TRACE1", lambda m: self._trace(True))
+        self.add_command(r"CALC(ULATE)?:DATA\?", lambda m: self._trace(False))
+
+    def _set(self, attribute, value):
+        setattr(self, attribute, value)
+
+    def _sweep_time(self):
+        return self.sweep_time if self.sweep_time is not None else self.sa.sweep_time()
+
+    def _sweep(self):
+        """A single sweep - the trace is frozen until the next one (when not continuous)"""
+        if self.real_sweep_time:
+            time.sleep(self._sweep_time())
+        self.sa._single_sweep()
+
+    def _frequencies(self):
+        center = self.sa.center_freq * 1e6
+        return np.linspace(center - self.sa.span / 2.0, center + self.sa.span / 2.0, self.sa.points)
+
+    def _fresh(self):
+        # in continuous mode the analyzer always shows the current spectrum
+        if self.continuous:
+            self.sa._sweep_spectrum = None
+            self.sa._fresh_sweep = True
+
+    def _marker(self):
+        self._fresh()
+        self.sa._fresh_sweep = True  # a marker query never triggers a sweep on the instrument
+        return self.sa.get_marker()
+
+    def _trace(self, data_only):
+        self._fresh()
+        self.sa._fresh_sweep = True
+        trace = self.sa.get_trace()
+        if self.binary:
+            values = trace[:, 1] if data_only else trace.flatten()
+            return build_definite_length_block(values.astype("<f4").tobytes())[:-1]
+        values = trace[:, 1] if data_only else trace.flatten()
+        return ",".join("%.8e" % v for v in values)
+
+
+class SignalGeneratorEmulator(SCPIEmulator):
+    """Base of the MG emulators - a channel of the emulator drives the bench's SimulatedMG (the LO)"""
+
+    def __init__(self, bench=None, latency=0.0, jitter=0.0, seed=None):
+        SCPIEmulator.__init__(self, bench, latency, jitter, seed)
+        self.mg = self.bench.mg if self.bench.mg is not None else self.bench.open_mg()
+        self.mg.SETTLE_TIME = 0.0  # the drivers sleep after every write themselves
+
+    def _freq(self, hz):
+        self.mg.setup_MG(freq=hz / 1e6, set_on=False)
+
+    def _power(self, dbm):
+        self.mg.setup_MG(power=dbm, set_on=False)
+
+    def _on(self, value):
+        self.mg.set_on(value.upper() in ("1", "ON"))
+
+
+class E8241AEmulator(SignalGeneratorEmulator):
+    """The E8241A_MG command set"""
+
+    IDN = "Agilent Technologies,E8241A,EMULATOR,A.00.00"
+
+    def __init__(self, bench=None, latency=0.0, jitter=0.0, seed=None):
+        SignalGeneratorEmulator.__init__(self, bench, latency, jitter, seed)
+        self.add_command(r"FREQ(UENCY)?(:CW|:FIX(ED)?)?\s+([-+0-9.eE]+)", lambda m: self._freq(float(m.group(4))))
+        self.add_command(r"POW(ER)?(:AMPL(ITUDE)?)?\s+([-+0-9.eE]+)", lambda m: self._power(float(m.group(4))))
+        self.add_command(r"OUTP(UT)?(:STAT(E)?)?\s+(ON|OFF|1|0)", lambda m: self._on(m.group(4)))
+        self.add_command(r"FREQ(UENCY)?(:CW|:FIX(ED)?)?\?", lambda m: "%.9e" % (self.mg.freq * 1e6))
+        self.add_command(r"POW(ER)?(:AMPL(ITUDE)?)?\?", lambda m: "%f" % self.mg.power)
+        self.add_command(r"OUTP(UT)?(:STAT(E)?)?\?", lambda m: "1" if self.mg.on else "0")
+
+
+class AnritsuEmulator(SignalGeneratorEmulator):
+    """The Anritsu_MG (native GPIB) command set: F1 <f>MH, L1 <p>DM, RF 1/0"""
+
+    IDN = "ANRITSU,MG,EMULATOR,1.00"
+
+    def __init__(self, bench=None, latency=0.0, jitter=0.0, seed=None):
+        SignalGeneratorEmulator.__init__(self, bench, latency, jitter, seed)
+        self.add_command(r"F1\s*([-+0-9.eE]+)\s*MH", lambda m: self._freq(float(m.group(1)) * 1e6))
+        self.add_command(r"F1\s*([-+0-9.eE]+)\s*GH", lambda m: self._freq(float(m.group(1)) * 1e9))
+        self.add_command(r"L1\s*([-+0-9.eE]+)\s*DM", lambda m: self._power(float(m.group(1))))
+        self.add_command(r"RF\s*([01])", lambda m: self._on(m.group(1)))
+        self.add_command(r"OF1", lambda m: "%.6f" % self.mg.freq)  # output the frequency [MHz]
+
+
+class M9347AEmulator(SignalGeneratorEmulator):
+    """The M9347A_MG command set for both DDS channels. Channel lo_channel drives the bench's LO"""
+
+    IDN = "Keysight Technologies,M9347A,EMULATOR,A.00.00"
+
+    def __init__(self, bench=None, latency=0.0, jitter=0.0, lo_channel=1, seed=None):
+        SignalGeneratorEmulator.__init__(self, bench, latency, jitter, seed)
+        self.lo_channel = lo_channel
+        self.channels = {1: {"freq": 0.0, "power": 0.0, "on": False}, 2: {"freq": 0.0, "power": 0.0, "on": False}}
+        self.add_command(r"DDS([12]):FREQ(UENCY)?\s+([-+0-9.eE]+)", lambda m: self._set(m, "freq", float(m.group(3))))
+        self.add_command(r"DDS([12]):POW(ER)?\s+([-+0-9.eE]+)", lambda m: self._set(m, "power", float(m.group(3))))
+        self.add_command(r"DDS([12]):OUTP(UT)?\s+(ON|OFF|1|0)",
+                         lambda m: self._set(m, "on", m.group(3).upper() in ("1", "ON")))
+        self.add_command(r"DDS([12]):FREQ(UENCY)?\?", lambda m: "%.9e" % self.channels[int(m.group(1))]["freq"])
+        self.add_command(r"DDS([12]):POW(ER)?\?", lambda m: "%f" % self.channels[int(m.group(1))]["power"])
+        self.add_command(r"DDS([12]):OUTP(UT)?\?", lambda m: "1" if self.channels[int(m.group(1))]["on"] else "0")
+
+    def _set(self, match, property, value):
+        channel = int(match.group(1))
+        self.channels[channel][property] = value
+        if channel == self.lo_channel:
+            {"freq": self._freq, "power": self._power, "on": lambda on: self._on("1" if on else "0")}[property](value)
+
+
+EMULATORS = {
+    "N9010A": N9010AEmulator,
+    "E8241A": E8241AEmulator,
+    "Anritsu": AnritsuEmulator,
+    "M9347A": M9347AEmulator
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve an emulated SCPI instrument over TCP")
+    parser.add_argument("--instrument", choices=sorted(EMULATORS.keys()), default="N9010A")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=5025)
+    parser.add_argument("--latency", type=float, default=0.0, help="reply latency [s]")
+    parser.add_argument("--jitter", type=float, default=0.0, help="standard deviation of the reply latency [s]")
+    args = parser.parse_args()
+    emulator = EMULATORS[args.instrument](latency=args.latency, jitter=args.jitter)
+    print("Serving %s at %s" % (args.instrument, emulator.start(args.host, args.port)))
+    try:
+        while True:
+            time.sleep(1.0)
+    except KeyboardInterrupt:
+        print(emulator.report())
+        emulator.close()
+
+
+if __name__ == "__main__":
+    main()